@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the active challenge store of the Optical Illusion Telegram Bot.
+
+Measures the challenge lookup done by handle_callback_query (take_active_challenge) for
+challenges in the hot in-memory tier and for challenges that are only on disk (e.g. after
+a restart), and the memory held by the store compared to a plain dict.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.config import Settings
+from telegram_bot.game_logic import GameLogic
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1e6
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1e6
+    print(f'{name:<32} n={len(samples):<7} p50={p50:9.1f} us  p99={p99:9.1f} us')
+
+
+async def _take_all(game_logic: GameLogic, chat_ids: list[str]) -> list[float]:
+    samples = []
+    for chat_id in chat_ids:
+        start = time.perf_counter()
+        challenge = await game_logic.take_active_challenge(chat_id)
+        samples.append(time.perf_counter() - start)
+        assert challenge is not None
+    return samples
+
+
+async def run_benchmark(challenges: int, hot_capacity: int, image_size: int) -> None:
+    # Per-operation INFO logs would dominate the measurements
+    logging.disable(logging.INFO)
+    data_dir = tempfile.mkdtemp()
+    settings = Settings(challenge_cache_size=hot_capacity)
+    image = 'A' * image_size
+    chat_ids = [str(1_000_000 + i) for i in range(challenges)]
+
+    try:
+        # Baseline: the previous plain dict with images in memory
+        tracemalloc.start()
+        plain = {chat_id: ('prompt', 'left', 'explanation', image + chat_id) for chat_id in chat_ids}
+        plain_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        samples = []
+        for chat_id in chat_ids:
+            start = time.perf_counter()
+            plain.pop(chat_id)
+            samples.append(time.perf_counter() - start)
+        _report('dict (baseline)', samples)
+
+        game_logic = GameLogic(data_dir, settings=settings)
+        tracemalloc.start()
+        for chat_id in chat_ids:
+            await game_logic.start_challenge(chat_id, 'prompt', 'left', 'explanation', image + chat_id)
+        store_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # The most recent challenges are in the hot tier
+        hot_ids = chat_ids[-hot_capacity:]
+        _report('store, hot tier', await _take_all(game_logic, hot_ids))
+        await game_logic.close()
+
+        # A new instance has an empty hot tier, as after a restart
+        game_logic = GameLogic(data_dir, settings=settings)
+        cold_ids = chat_ids[: challenges - hot_capacity]
+        _report('store, after restart (disk)', await _take_all(game_logic, cold_ids))
+        await game_logic.close()
+
+        print(f'resident memory: dict={plain_memory / 1e6:.1f} MB, store={store_memory / 1e6:.1f} MB')
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--challenges', type=int, default=5000)
+    parser.add_argument('--hot-capacity', type=int, default=256)
+    parser.add_argument('--image-size', type=int, default=100_000, help='Length of the fake base64 image')
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.challenges, args.hot_capacity, args.image_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the in-memory statistics and challenge tables of the Optical Illusion Telegram Bot.
+
+Measures the memory held by the user statistics of many users and by many live challenges,
+and the time of a statistics update and of a challenge expiry check, for the slotted
+representations with monotonic timestamps compared to plain dataclasses with datetimes.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.challenge_store import Challenge, monotonic_ns
+from telegram_bot.config import Settings
+from telegram_bot.game_logic import GameLogic, UserStats
+
+
+@dataclass
+class PlainUserStats:
+    """The previous user statistics, with a per-instance dict"""
+
+    total_challenges: int = 0
+    correct_answers: int = 0
+    username: str = ''
+
+
+@dataclass
+class PlainChallenge:
+    """The previous challenge, with a per-instance dict and datetimes only"""
+
+    user_id: str
+    prompt: str
+    correct_answer: str
+    explanation: str
+    image_base64: str
+    created_at: datetime
+    source: str = 'ai'
+    expires_at: datetime | None = None
+    detail: str = ''
+
+
+def _plain_expired(challenge: PlainChallenge, timeout: timedelta) -> bool:
+    """The previous expiry check of GameLogic"""
+    now = datetime.now()
+    if challenge.expires_at is not None:
+        return now >= challenge.expires_at
+    return now - challenge.created_at >= timeout
+
+
+def _measure(build) -> tuple[object, int]:
+    """Build a table and return it with the memory it holds."""
+    gc.collect()
+    tracemalloc.start()
+    table = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, memory
+
+
+def _time_each(name: str, keys: list, operation) -> None:
+    samples = []
+    for key in keys:
+        start = time.perf_counter_ns()
+        operation(key)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f'{name:<32} n={len(samples):<8} p50={p50:7.0f} ns  p99={p99:7.0f} ns')
+
+
+def _report_memory(name: str, plain: int, compact: int, rows: int) -> None:
+    print(
+        f'{name:<32} plain={plain / 1e6:7.1f} MB ({plain / rows:5.0f} B/row)  '
+        f'slotted={compact / 1e6:7.1f} MB ({compact / rows:5.0f} B/row)  saved={1 - compact / plain:.0%}'
+    )
+
+
+def run_benchmark(users: int, challenges: int, lookups: int) -> None:
+    # Per-operation INFO logs would dominate the measurements
+    logging.disable(logging.INFO)
+    data_dir = tempfile.mkdtemp()
+    user_ids = [str(1_000_000 + i) for i in range(users)]
+    chat_ids = user_ids[:challenges]
+    now = datetime.now()
+    game_logic = GameLogic(data_dir, settings=Settings())
+
+    try:
+        # Statistics of every user, as cached by GameLogic.user_stats
+        plain_stats, plain_memory = _measure(
+            lambda: {user_id: PlainUserStats(i % 50, i % 30, f'user{i}') for i, user_id in enumerate(user_ids)}
+        )
+        compact_stats, compact_memory = _measure(
+            lambda: {user_id: UserStats(i % 50, i % 30, f'user{i}') for i, user_id in enumerate(user_ids)}
+        )
+        _report_memory(f'user stats ({users} users)', plain_memory, compact_memory, users)
+
+        # Live challenges without images, as kept in the hot tier of the challenge store
+        def plain_challenge(i: int) -> PlainChallenge:
+            created_at = now - timedelta(seconds=i % 600)
+            return PlainChallenge(chat_ids[i], f'prompt {i}', 'left', 'explanation', '', created_at, 'local')
+
+        def compact_challenge(i: int) -> Challenge:
+            created_ns = monotonic_ns(now - timedelta(seconds=i % 600))
+            return Challenge(chat_ids[i], f'prompt {i}', 'left', 'explanation', '', created_ns, 'local')
+
+        plain_challenges, plain_memory = _measure(lambda: {chat_ids[i]: plain_challenge(i) for i in range(challenges)})
+        compact_challenges, compact_memory = _measure(
+            lambda: {chat_ids[i]: compact_challenge(i) for i in range(challenges)}
+        )
+        _report_memory(f'challenges ({challenges} live)', plain_memory, compact_memory, challenges)
+
+        # Statistics updates, as done by record_answer for every answer
+        sample = user_ids[:: max(1, users // lookups)]
+
+        def update(table: dict, user_id: str) -> None:
+            stats = table[user_id]
+            stats.total_challenges += 1
+            stats.correct_answers += 1
+
+        _time_each('stats update, plain', sample, lambda user_id: update(plain_stats, user_id))
+        _time_each('stats update, slotted', sample, lambda user_id: update(compact_stats, user_id))
+
+        # Expiry checks, done for every challenge lookup
+        timeout = game_logic.challenge_timeout
+        sample = chat_ids[:: max(1, challenges // lookups)]
+        _time_each('expiry check, datetime', sample, lambda chat_id: _plain_expired(plain_challenges[chat_id], timeout))
+        _time_each(
+            'expiry check, monotonic',
+            sample,
+            lambda chat_id: game_logic._is_challenge_expired(compact_challenges[chat_id]),
+        )
+    finally:
+        asyncio.run(game_logic.close())
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--challenges', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=100_000, help='Timed updates and expiry checks')
+    args = parser.parse_args()
+    run_benchmark(args.users, args.challenges, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Export the user statistics of the Optical Illusion Telegram Bot as gzip-compressed CSV or NDJSON
+
+Safe to run next to the bot: the SQLite backend is read from a snapshot without blocking writers,
+and the event log backend is loaded read-only.
+
+Usage:
+    python src/export_stats.py --format ndjson --output user_stats.ndjson.gz
+    python src/export_stats.py > user_stats.csv.gz
+"""
+
+import argparse
+import asyncio
+import sys
+
+from telegram_bot.config import ConfigError, Settings
+from telegram_bot.export import EXPORT_FORMATS, StatsExport
+from telegram_bot.storage import STATS_BACKENDS, EventLogStatsStorage, SQLiteStatsStorage
+
+
+async def main():
+    """Main function to export the statistics"""
+    # Read and validate the configuration from the environment and the .env file
+    try:
+        settings = Settings.from_env()
+    except ConfigError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format (default: csv)')
+    parser.add_argument('--output', default='-', help='Output file, "-" for stdout (default)')
+    parser.add_argument('--data-dir', default='data', help='Directory of the statistics (default: data)')
+    parser.add_argument(
+        '--backend',
+        choices=sorted(STATS_BACKENDS),
+        default=settings.stats_backend,
+        help='Statistics storage backend (default: STATS_BACKEND or sqlite)',
+    )
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Users read at a time (default: 1000)')
+    args = parser.parse_args()
+
+    if args.backend == 'eventlog':
+        storage = EventLogStatsStorage(args.data_dir, read_only=True)
+    else:
+        # Exporting only reads, so the tables are not created or migrated
+        storage = SQLiteStatsStorage(args.data_dir)
+
+    stats_export = StatsExport(storage, args.format, args.chunk_size)
+    if args.output == '-':
+        rows = await stats_export.write_to(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, 'wb') as file:
+            rows = await stats_export.write_to(file)
+    print(f'Exported {rows} users', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -4,34 +4,37 @@ Main entry point for the Optical Illusion Telegram Bot
 """
 
 import asyncio
-import os
 import signal
 import sys
-from dotenv import load_dotenv
 from telegram_bot.bot import TelegramBot
-
-# Load environment variables
-load_dotenv()
+from telegram_bot.config import ConfigError, RuntimeConfig
 
 
 async def main():
     """Main function to run the bot"""
-    # Get configuration from environment
-    bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-    ai_api_key = os.getenv('AI_API_KEY')
+    # Read and validate the configuration from the environment and the .env file
+    try:
+        runtime_config = RuntimeConfig.load()
+    except ConfigError as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+    settings = runtime_config.settings
+    bot_token = settings.telegram_bot_token
+    ai_api_key = settings.ai_api_key
 
     if not bot_token:
         print('Error: TELEGRAM_BOT_TOKEN not found in environment variables')
         print('Please set TELEGRAM_BOT_TOKEN in your .env file')
         sys.exit(1)
 
-    if not ai_api_key:
+    # Replaying recorded AI responses needs no API key
+    if not ai_api_key and settings.ai_cassette != 'replay':
         print('Error: AI_API_KEY not found in environment variables')
         print('Please set AI_API_KEY in your .env file')
         sys.exit(1)
 
     # Create and start bot
-    bot = TelegramBot(bot_token, ai_api_key)
+    bot = TelegramBot(bot_token, ai_api_key, runtime_config)
 
     # Set up signal handlers for graceful shutdown
     def signal_handler(signum, frame):
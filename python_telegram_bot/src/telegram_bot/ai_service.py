@@ -1,46 +1,314 @@
+import asyncio
 import base64
+import json
 import logging
-import os
+import random
+import time
+from collections import defaultdict, deque
 from typing import Optional
 from dataclasses import dataclass
 from openai import AsyncOpenAI
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from .cassette import Cassette, CassetteClient
+from .config import Settings
+from .executor import CPUExecutor, decode_image_variants
+from .image_policy import AdaptiveImagePolicy, ImageSettings, build_tiers
+from .prompt_synthesizer import synthesize_prompt
+from .tracing import set_attributes, traced
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Instructions for the prompt model. They do not depend on the request, so they form a stable prefix
+# that providers can cache; the answers of each request go into the short user message below.
+PROMPT_GUIDELINES = """Create an optical illusion prompt for image generation with two objects (circles, squares, or rectangles) positioned side by side. The correct answer is given in the request: "left" (the left object is actually larger), "right" (the right object is actually larger) or "equal" (they are actually equal).
+
+CRITICAL RULES:
+1. The correct answer MUST reflect the ACTUAL physical size if you measure the objects with a ruler on the computer screen
+2. Design the illusion so the real measured size matches the correct answer but may APPEAR different to the eye due to visual tricks
+3. Use context, surroundings, perspective, or patterns to create the illusion
+
+Guidelines by answer type:
+- If "left": Make the left object ACTUALLY larger if measured with a ruler, but use visual context that might make it appear smaller or equal (e.g., surrounded by large objects, distant perspective, compressing patterns)
+- If "right": Make the right object ACTUALLY larger if measured with a ruler, but use visual context that might make it appear smaller or equal (e.g., surrounded by large objects, distant perspective, compressing patterns)
+- If "equal": Make both objects EXACTLY the same size when measured with a ruler, but use ASYMMETRIC surroundings that might make one appear larger (e.g., left surrounded by small circles, right by large circles - Ebbinghaus illusion)
+
+Examples:
+1. correct_answer="left": "Two circles side by side. The left circle is 20% larger in diameter when measured. The left circle is surrounded by very large circles (2x its size) making it appear smaller. The right circle is surrounded by tiny circles (0.3x its size) making it appear larger. Clean white background."
+2. correct_answer="right": "Two horizontal rectangles. The right rectangle is 15% longer when measured. Apply Ponzo illusion: draw converging lines in the background creating forced perspective, with the right rectangle placed in the 'distant' narrow part and left in the 'near' wide part, making the right appear smaller despite being larger."
+3. correct_answer="equal": "Two identical circles (same diameter when measured). Left circle surrounded by 6 large circles (2x diameter). Right circle surrounded by 6 small circles (0.5x diameter). This is the Ebbinghaus illusion - the right will appear larger but they are equal."
+
+"""
+
+PROMPT_INSTRUCTIONS = (
+    PROMPT_GUIDELINES
+    + """
+Respond ONLY with valid JSON in this exact format:
+{"prompt": "detailed prompt for image generator describing exact sizes and visual context", "explanation": "brief explanation in Russian describing the illusion and what is the true answer when measured with a ruler"}
+
+Remember: The explanation should clarify what happens when you measure with a ruler and how the illusion deceives the eye."""
+)
+
+# Instructions for batch requests: one prompt per requested answer, in one completion
+PROMPT_BATCH_INSTRUCTIONS = (
+    PROMPT_GUIDELINES
+    + """
+The request lists several correct answers. Create one prompt for each of them, in the same order, and make every prompt a different illusion or a clearly different variation (shapes, sizes, surroundings).
+
+Respond ONLY with a valid JSON array with one object per requested answer, in this exact format:
+[{"answer": "the requested correct answer: left, right or equal", "prompt": "detailed prompt for image generator describing exact sizes and visual context", "explanation": "brief explanation in Russian describing the illusion and what is the true answer when measured with a ruler"}]
+
+Remember: Each explanation should clarify what happens when you measure with a ruler and how the illusion deceives the eye."""
+)
+
+PROMPT_REQUEST_TEMPLATE = 'The correct answer must be: {answer} ({description}).'
+PROMPT_BATCH_REQUEST_TEMPLATE = 'Create {count} prompts. The correct answers must be, in order: {answers}.'
+
+ANSWERS = ('left', 'right', 'equal')
+
+PROMPT_ANSWERS = {
+    'left': {'answer': 'left', 'description': 'the left object is actually larger'},
+    'right': {'answer': 'right', 'description': 'the right object is actually larger'},
+    'equal': {'answer': 'equal', 'description': 'they are actually equal'},
+}
+
 
 @dataclass
 class PromptResponse:
     prompt: str
     correct_answer: str  # "left", "right", "equal"
     explanation: str  # Explanation of why the answer is correct
+    origin: str = ''  # "template" for prompts synthesized locally, otherwise the prompt model that wrote it
+
+
+@dataclass
+class PromptUsage:
+    """Token usage of the prompt model, with the input tokens served from the provider's prompt cache."""
+
+    requests: int = 0
+    prompts: int = 0  # Valid prompts received; a batch request returns several
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0  # Seconds spent in the chat completions API
+    cached_latency: float = 0.0  # Part of the latency of requests with a cache hit
+    cached_requests: int = 0
+    synthesized: int = 0  # Prompts synthesized locally from templates, without a request
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of input tokens served from the cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def mean_latency(self, cached: bool) -> float:
+        """Mean latency of the requests with (or without) a cache hit."""
+        if cached:
+            return self.cached_latency / self.cached_requests if self.cached_requests else 0.0
+        uncached = self.requests - self.cached_requests
+        return (self.latency - self.cached_latency) / uncached if uncached else 0.0
+
+    @property
+    def latency_per_prompt(self) -> float:
+        """Amortised seconds of completion latency per prompt."""
+        return self.latency / self.prompts if self.prompts else 0.0
+
+    @property
+    def tokens_per_prompt(self) -> float:
+        """Amortised input and output tokens per prompt."""
+        return (self.prompt_tokens + self.completion_tokens) / self.prompts if self.prompts else 0.0
+
+    def record(self, usage, latency: float, prompts: int = 1) -> None:
+        """
+        Add the usage field of a chat completion.
+
+        Cached input tokens are reported in prompt_tokens_details.cached_tokens (OpenAI-compatible APIs)
+        or prompt_cache_hit_tokens (DeepSeek).
+        """
+        self.requests += 1
+        self.prompts += prompts
+        self.latency += latency
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = (getattr(details, 'cached_tokens', None) if details else None) or getattr(
+            usage, 'prompt_cache_hit_tokens', None
+        )
+        prompt_tokens = usage.prompt_tokens or 0
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += usage.completion_tokens or 0
+        self.cached_tokens += cached or 0
+        if cached:
+            self.cached_requests += 1
+            self.cached_latency += latency
+        logger.info(
+            f'[AIService] Prompt usage: {prompt_tokens} input tokens ({cached or 0} cached), '
+            f'{usage.completion_tokens} output tokens, {latency:.1f}s; '
+            f'cache hit rate: {self.cache_hit_rate:.0%} over {self.requests} requests, mean latency '
+            f'{self.mean_latency(True):.1f}s with a cache hit, {self.mean_latency(False):.1f}s without; '
+            f'per prompt: {self.latency_per_prompt:.1f}s, {self.tokens_per_prompt:.0f} tokens'
+        )
+
+
+@dataclass
+class ImageUsage:
+    """Latency and cost of image requests with the same number of images per request."""
+
+    requests: int = 0
+    images: int = 0
+    latency: float = 0.0  # Seconds spent in the images API
+    output_tokens: int = 0  # Image tokens billed, if the API reports usage
+
+    @property
+    def latency_per_image(self) -> float:
+        return self.latency / self.images if self.images else 0.0
+
+    @property
+    def tokens_per_image(self) -> float:
+        return self.output_tokens / self.images if self.images else 0.0
+
+    def record(self, images: int, latency: float, usage: dict) -> None:
+        self.requests += 1
+        self.images += images
+        self.latency += latency
+        self.output_tokens += usage.get('output_tokens') or 0
+
+
+@dataclass
+class GeneratedImage:
+    image_base64: str
+    image_bytes: bytes  # Decoded image data
+    tier: str  # Name of the image settings tier the image was generated at
+    output_format: str  # "png", "jpeg" or "webp"
+    latency: float  # Seconds spent in the image API
+
+
+def answer_mix(count: int, rng: random.Random | None = None) -> list[str]:
+    """A shuffled mix of correct answers, as balanced as the count allows."""
+    rng = rng or random.Random()
+    answers = list(ANSWERS) * (count // len(ANSWERS)) + rng.sample(ANSWERS, count % len(ANSWERS))
+    rng.shuffle(answers)
+    return answers
+
+
+def parse_prompt_batch(content: str, answers: list[str], origin: str = '') -> list[PromptResponse]:
+    """
+    Parse the JSON array of a batch prompt response.
+
+    An entry is valid if it has a non-empty prompt, a string explanation and one of the requested answers
+    that is not taken by an earlier entry; invalid entries are logged and dropped.
+
+    Args:
+        content: The response of the prompt model
+        answers: Correct answers of the requested prompts
+        origin: The prompt model that wrote the response
+    """
+    content = content.strip()
+    start, end = content.find('['), content.rfind(']')
+    try:
+        entries = json.loads(content[start : end + 1]) if start != -1 and end > start else None
+    except json.JSONDecodeError:
+        entries = None
+    if not isinstance(entries, list):
+        logger.warning('[AIService] No JSON array in the batch prompt response')
+        return []
+
+    remaining = list(answers)
+    prompts = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            logger.warning(f'[AIService] Dropping batch entry that is not an object: {entry!r}')
+            continue
+        answer, prompt, explanation = entry.get('answer'), entry.get('prompt'), entry.get('explanation', '')
+        if answer not in remaining or not isinstance(prompt, str) or not prompt.strip():
+            logger.warning(f'[AIService] Dropping invalid batch entry: {entry!r}')
+            continue
+        if not isinstance(explanation, str):
+            explanation = ''
+        remaining.remove(answer)
+        prompts.append(
+            PromptResponse(prompt=prompt.strip(), correct_answer=answer, explanation=explanation, origin=origin)
+        )
+    return prompts
 
 
 class AIService:
-    def __init__(self, api_key: str = None, base_url: str = None):
-        # Use provided values or get from environment variables
-        self.api_key = api_key or os.getenv('AI_API_KEY')
-        self.base_url = (base_url or os.getenv('AI_BASE_URL', 'https://api.aitunnel.ru/v1')).rstrip('/')
-        self.prompt_model = os.getenv('PROMPT_MODEL', 'deepseek-r1')
-        self.image_model = os.getenv('IMAGE_MODEL', 'gpt-image-1-mini')
-
-        if not self.api_key:
+    def __init__(
+        self, api_key: str = None, base_url: str = None, executor: CPUExecutor = None, settings: Settings = None
+    ):
+        # Use provided values or the settings, read from the environment if not given
+        settings = settings or Settings.from_env()
+        self.api_key = api_key or settings.ai_api_key
+        self.base_url = (base_url or settings.ai_base_url).rstrip('/')
+        self.prompt_model = settings.prompt_model
+        # Built once, so every request starts with the same bytes
+        self._prompt_system_message = {'role': 'system', 'content': PROMPT_INSTRUCTIONS}
+        self._prompt_batch_system_message = {'role': 'system', 'content': PROMPT_BATCH_INSTRUCTIONS}
+        self.prompt_usage = PromptUsage()
+        # Prompts are requested PROMPT_BATCH_SIZE at a time; the spare ones wait in the pool for later challenges
+        self.prompt_batch_size = settings.prompt_batch_size
+        self.prompt_pool: deque[PromptResponse] = deque()
+        self._prompt_pool_lock = asyncio.Lock()
+        # Share of prompts synthesized locally instead of requested from the prompt model
+        self.prompt_template_ratio = settings.prompt_template_ratio
+        self.image_model = settings.image_model
+        # The policy steps the configured image settings down under load
+        self.image_settings = self._image_settings(settings)
+        self.image_policy = AdaptiveImagePolicy(
+            build_tiers(self.image_settings),
+            overload_queue_depth=settings.image_overload_queue_depth,
+            overload_latency=settings.image_overload_latency,
+            enabled=settings.image_adaptive,
+        )
+        # Image request statistics by number of images per request
+        self.image_usage: defaultdict[int, ImageUsage] = defaultdict(ImageUsage)
+        # Parsing and decoding multi-megabyte image responses is kept off the event loop
+        self.executor = executor or CPUExecutor(settings.cpu_executor, settings.cpu_executor_workers, name='cpu')
+
+        # Recorded responses can be replayed offline (AI_CASSETTE=replay) without an API key
+        self.cassette = Cassette.create(settings.ai_cassette, settings.ai_cassette_path, settings.ai_cassette_latency)
+        replaying = self.cassette is not None and self.cassette.mode == 'replay'
+        if not self.api_key and not replaying:
             raise ValueError('API key is required')
 
         # Configure OpenAI client
         self.client = AsyncOpenAI(
-            api_key=self.api_key,
+            api_key=self.api_key or 'replay',
             base_url=self.base_url,
         )
+        # Answers are drawn from a seeded generator when recording or replaying, so a replay requests
+        # the same answers in the same order and finds the recorded responses
+        self.random = random.Random(settings.ai_cassette_seed if self.cassette else None)
+        if self.cassette is not None:
+            self.client = CassetteClient(self.client, self.cassette)
 
         logger.info(f'[AIService] Initialized with base URL: {self.base_url}')
         logger.info(f'[AIService] Using prompt model: {self.prompt_model}')
         logger.info(f'[AIService] Using image model: {self.image_model}')
+        logger.info(f'[AIService] Image tiers: {[tier.name for tier in self.image_policy.tiers]}')
+
+    @staticmethod
+    def _image_settings(settings: Settings) -> ImageSettings:
+        return ImageSettings(
+            quality=settings.image_quality,
+            size=settings.image_size,
+            output_format=settings.image_format,
+            moderation=settings.image_moderation,
+        )
+
+    def apply_settings(self, settings: Settings) -> None:
+        """Switch to reloaded models and image settings; requests in flight finish with the old ones."""
+        self.prompt_model = settings.prompt_model
+        self.prompt_batch_size = settings.prompt_batch_size
+        self.prompt_template_ratio = settings.prompt_template_ratio
+        self.image_model = settings.image_model
+        self.image_settings = self._image_settings(settings)
+        self.image_policy.reconfigure(
+            build_tiers(self.image_settings),
+            settings.image_overload_queue_depth,
+            settings.image_overload_latency,
+            settings.image_adaptive,
+        )
 
     async def __aenter__(self):
         return self
@@ -49,57 +317,77 @@ class AIService:
         pass
 
     async def close(self):
-        """Close the client (no-op for OpenAI)"""
-        pass
+        """Close the client (no-op for OpenAI) and the cassette"""
+        if self.cassette is not None:
+            await self.cassette.close()
 
+    @traced()
     async def generate_prompt(self) -> PromptResponse:
-        """Generate an optical illusion prompt with two objects"""
-        logger.info(f'[AIService] Generating prompt with {self.prompt_model}')
-
-        # First, randomly select the correct answer
-        import random
+        """
+        Get an optical illusion prompt with two objects.
+
+        A share of PROMPT_TEMPLATE_RATIO of the prompts is synthesized locally from templates. With a batch
+        size above 1, the others come from the pool, which is refilled with one batch request when it is empty.
+        If the batch request fails, a single prompt is requested.
+        """
+        # No random draw without templates, so recorded answer sequences replay unchanged
+        if self.prompt_template_ratio and self.random.random() < self.prompt_template_ratio:
+            return self.synthesize_prompt()
+        if self.prompt_batch_size > 1:
+            async with self._prompt_pool_lock:
+                if not self.prompt_pool:
+                    try:
+                        self.prompt_pool.extend(
+                            await self.generate_prompts(answer_mix(self.prompt_batch_size, self.random))
+                        )
+                    except Exception as e:
+                        logger.warning(f'[AIService] Batch prompt generation failed, requesting a single prompt: {e}')
+                if self.prompt_pool:
+                    prompt = self.prompt_pool.popleft()
+                    set_attributes(pool_left=len(self.prompt_pool))
+                    logger.info(f'[AIService] Took prompt from the pool, {len(self.prompt_pool)} left')
+                    return prompt
+        return await self.generate_single_prompt()
+
+    def synthesize_prompt(self) -> PromptResponse:
+        """Synthesize a prompt locally from templates, for a random correct answer"""
+        synthesized = synthesize_prompt(self.random.choice(ANSWERS), self.random.getrandbits(64))
+        self.prompt_usage.synthesized += 1
+        set_attributes(prompt_source='template', illusion=synthesized.illusion)
+        logger.info(
+            f'[AIService] Synthesized {synthesized.illusion} prompt from templates '
+            f'({self.prompt_usage.synthesized} synthesized, {self.prompt_usage.prompts} from the prompt model)'
+        )
+        return PromptResponse(
+            prompt=synthesized.prompt,
+            correct_answer=synthesized.correct_answer,
+            explanation=synthesized.explanation,
+            origin='template',
+        )
 
-        correct_answer = random.choice(['left', 'right', 'equal'])
+    @traced()
+    async def generate_single_prompt(self) -> PromptResponse:
+        """Generate one optical illusion prompt with two objects"""
+        # Captured before the request, so a settings reload in between does not change the origin
+        prompt_model = self.prompt_model
+        logger.info(f'[AIService] Generating prompt with {prompt_model}')
 
-        # Create a more specific prompt based on the correct answer
-        if correct_answer == 'left':
-            answer_description = 'the left object is actually larger'
-        elif correct_answer == 'right':
-            answer_description = 'the right object is actually larger'
-        else:  # equal
-            answer_description = 'they are actually equal'
+        # First, randomly select the correct answer
+        correct_answer = self.random.choice(ANSWERS)
 
         try:
+            start = time.monotonic()
+            # The instructions are a constant system message, so providers can cache the prefix;
+            # only the short user message with the answer varies between requests
             chat_result = await self.client.chat.completions.create(
                 messages=[
-                    {
-                        'role': 'user',
-                        'content': f'''Create an optical illusion prompt for image generation with two objects (circles, squares, or rectangles) positioned side by side. The correct answer must be: {correct_answer} ({answer_description}).
-
-CRITICAL RULES:
-1. The correct answer MUST reflect the ACTUAL physical size if you measure the objects with a ruler on the computer screen
-2. Design the illusion so the real measured size matches "{correct_answer}" but may APPEAR different to the eye due to visual tricks
-3. Use context, surroundings, perspective, or patterns to create the illusion
-
-Guidelines by answer type:
-- If "left": Make the left object ACTUALLY larger if measured with a ruler, but use visual context that might make it appear smaller or equal (e.g., surrounded by large objects, distant perspective, compressing patterns)
-- If "right": Make the right object ACTUALLY larger if measured with a ruler, but use visual context that might make it appear smaller or equal (e.g., surrounded by large objects, distant perspective, compressing patterns)
-- If "equal": Make both objects EXACTLY the same size when measured with a ruler, but use ASYMMETRIC surroundings that might make one appear larger (e.g., left surrounded by small circles, right by large circles - Ebbinghaus illusion)
-
-Examples:
-1. correct_answer="left": "Two circles side by side. The left circle is 20% larger in diameter when measured. The left circle is surrounded by very large circles (2x its size) making it appear smaller. The right circle is surrounded by tiny circles (0.3x its size) making it appear larger. Clean white background."
-2. correct_answer="right": "Two horizontal rectangles. The right rectangle is 15% longer when measured. Apply Ponzo illusion: draw converging lines in the background creating forced perspective, with the right rectangle placed in the 'distant' narrow part and left in the 'near' wide part, making the right appear smaller despite being larger."
-3. correct_answer="equal": "Two identical circles (same diameter when measured). Left circle surrounded by 6 large circles (2x diameter). Right circle surrounded by 6 small circles (0.5x diameter). This is the Ebbinghaus illusion - the right will appear larger but they are equal."
-
-Respond ONLY with valid JSON in this exact format:
-{{"prompt": "detailed prompt for image generator describing exact sizes and visual context", "explanation": "brief explanation in Russian describing the illusion and what is the true answer when measured with a ruler"}}
-
-Remember: The explanation should clarify what happens when you measure with a ruler and how the illusion deceives the eye.''',
-                    }
+                    self._prompt_system_message,
+                    {'role': 'user', 'content': PROMPT_REQUEST_TEMPLATE.format(**PROMPT_ANSWERS[correct_answer])},
                 ],
-                model=self.prompt_model,
+                model=prompt_model,
                 max_tokens=50000,
             )
+            self.prompt_usage.record(chat_result.usage, time.monotonic() - start)
 
             content = chat_result.choices[0].message.content
             logger.info(f'[AIService] Received prompt response: {content}')
@@ -117,8 +405,6 @@ Remember: The explanation should clarify what happens when you measure with a ru
             # Try to parse the JSON content from the AI response
             try:
                 # Try to parse the entire content as JSON first
-                import json
-
                 json_content = json.loads(content)
 
                 # Check if it's an array of objects
@@ -191,31 +477,128 @@ Remember: The explanation should clarify what happens when you measure with a ru
                     correct_answer = 'equal'  # Default answer
                     explanation = ''  # Default explanation
 
-            return PromptResponse(prompt=prompt, correct_answer=correct_answer, explanation=explanation)
+            return PromptResponse(
+                prompt=prompt, correct_answer=correct_answer, explanation=explanation, origin=prompt_model
+            )
 
         except Exception as e:
             logger.error(f'[AIService] Error generating prompt: {str(e)}')
             raise
 
+    @traced()
+    async def generate_prompts(self, answers: list[str]) -> list[PromptResponse]:
+        """
+        Generate one prompt per requested answer in a single completion.
+
+        Args:
+            answers: Correct answers of the prompts ("left", "right" or "equal"), in any mix
+
+        Returns:
+            The valid prompts of the response; invalid entries are dropped
+
+        Raises:
+            ValueError: If the response contains no valid prompt
+        """
+        prompt_model = self.prompt_model
+        logger.info(f'[AIService] Generating {len(answers)} prompts with {prompt_model}')
+        start = time.monotonic()
+        chat_result = await self.client.chat.completions.create(
+            messages=[
+                self._prompt_batch_system_message,
+                {
+                    'role': 'user',
+                    'content': PROMPT_BATCH_REQUEST_TEMPLATE.format(count=len(answers), answers=', '.join(answers)),
+                },
+            ],
+            model=prompt_model,
+            max_tokens=50000,
+        )
+        latency = time.monotonic() - start
+        content = chat_result.choices[0].message.content
+        logger.info(f'[AIService] Received batch prompt response: {content}')
+
+        prompts = parse_prompt_batch(content, answers, prompt_model)
+        self.prompt_usage.record(chat_result.usage, latency, prompts=len(prompts))
+        logger.info(
+            f'[AIService] {len(prompts)} of {len(answers)} batch prompts valid, {latency:.1f}s '
+            f'({latency / max(len(prompts), 1):.1f}s per prompt)'
+        )
+        if not prompts:
+            raise ValueError('No valid prompts in the batch response')
+        return prompts
+
     async def generate_image(self, prompt: str) -> str:
         """Generate an image based on a prompt"""
-        logger.info(f'[AIService] Generating image with {self.image_model}')
-
+        result = await self.generate_image_result(prompt)
+        return result.image_base64
+
+    async def generate_image_result(self, prompt: str) -> GeneratedImage:
+        """Generate an image based on a prompt, with settings chosen by the adaptive image policy"""
+        images = await self.generate_image_variants(prompt, 1)
+        if images:
+            return images[0]
+        return GeneratedImage(image_base64='', image_bytes=b'', tier='', output_format='', latency=0.0)
+
+    @traced()
+    async def generate_image_variants(self, prompt: str, n: int) -> list[GeneratedImage]:
+        """
+        Generate n images of a prompt in one request, with settings chosen by the adaptive image policy.
+
+        Returns:
+            The non-empty images of the response, each with the latency of the whole request
+        """
+        tier = self.image_policy.acquire()
+        settings = tier.settings
+        set_attributes(n=n, tier=tier.name)
+        logger.info(f'[AIService] Generating {n} image(s) with {self.image_model} at tier {tier.name}: {settings}')
+
+        start = time.monotonic()
+        latency = None
         try:
-            # Generate image
-            result = await self.client.images.generate(
+            # Generate images; the raw response is parsed in the executor instead of on the event loop
+            compression = (
+                {} if settings.output_compression is None else {'output_compression': settings.output_compression}
+            )
+            response = await self.client.images.with_raw_response.generate(
                 model=self.image_model,
                 prompt=prompt,
-                quality=os.getenv('IMAGE_QUALITY', 'low'),
-                size=os.getenv('IMAGE_SIZE', '1024x1024'),
-                moderation=os.getenv('IMAGE_MODERATION', 'low'),
-                output_format=os.getenv('IMAGE_FORMAT', 'png'),
+                n=n,
+                quality=settings.quality,
+                size=settings.size,
+                moderation=settings.moderation,
+                output_format=settings.output_format,
+                **compression,
             )
-
-            image_base64 = result.data[0].b64_json
-            logger.info(f'[AIService] Received image data, length: {len(image_base64) if image_base64 else 0}')
-            return image_base64 or ''
+            latency = time.monotonic() - start
+
+            variants, usage = await self.executor.run(decode_image_variants, response.content)
+            self.image_usage[n].record(len(variants), latency, usage)
+            logger.info(
+                f'[AIService] Received {len(variants)} image(s), data length: '
+                f'{sum(len(image_base64) for image_base64, _ in variants)}, latency: {latency:.1f}s; '
+                f'{self.image_usage_summary()}'
+            )
+            return [
+                GeneratedImage(
+                    image_base64=image_base64,
+                    image_bytes=image_bytes,
+                    tier=tier.name,
+                    output_format=settings.output_format,
+                    latency=latency,
+                )
+                for image_base64, image_bytes in variants
+            ]
 
         except Exception as e:
             logger.error(f'[AIService] Error generating image: {str(e)}')
             raise
+        finally:
+            self.image_policy.release(latency)
+
+    def image_usage_summary(self) -> str:
+        """Per-image latency and output tokens of the image requests, by number of images per request."""
+        return '; '.join(
+            f'n={n}: {usage.images} images in {usage.requests} requests, {usage.latency_per_image:.1f}s and '
+            f'{usage.tokens_per_image:.0f} output tokens per image'
+            for n, usage in sorted(self.image_usage.items())
+        )
@@ -1,32 +1,138 @@
-import logging
+import asyncio
 import base64
-import random
+import logging
+import os
 import pathlib
+import datetime
+import tempfile
+import time
 import typing
 import aiogram
+import aiogram.exceptions
 import aiogram.filters
 import aiogram.types
 from . import ai_service
+from . import broadcast
+from . import challenge_source
+from . import config
+from . import executor
+from . import export
 from . import game_logic
+from . import illusion_catalog
+from . import job_queue
+from . import loop_monitor
+from . import profiler
+from . import send_scheduler
+from . import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LEADERBOARD_CALLBACK_PREFIX = 'lb:'
+LEADERBOARD_CACHE_SIZE = 1024
+
+GROUP_CHAT_TYPES = ('group', 'supergroup')
+ANSWER_LABELS = {'left': 'Левый больше', 'right': 'Правый больше', 'equal': 'Они равны'}
+# Names listed in a group round summary; the rest are only counted
+GROUP_SUMMARY_NAMES = 20
+
+# Caption of the challenge photo by challenge source
+CHALLENGE_CAPTIONS = {
+    'ai': '🤖 Какой объект, по мнению нейросети, кажется больше?',
+    'local': '📏 Какой объект на самом деле больше?',
+}
+DAILY_CAPTION_PREFIX = '📅 Иллюзия дня\n\n'
+# Days of the recent accuracy in /stats and of the illusion type report
+RECENT_STATS_DAYS = 7
+ILLUSION_STATS_DAYS = 30
+# Default duration of an on-demand profile, in seconds
+PROFILE_SECONDS = 30
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+# Seconds between purges of delivered generation jobs
+JOB_PURGE_INTERVAL = 60 * 60
+
 
 class TelegramBot:
-    def __init__(self, token: str, api_key: str):
+    def __init__(self, token: str, api_key: str, runtime_config: typing.Optional[config.RuntimeConfig] = None):
+        # Settings are read once; the reloadable ones are applied to the components on SIGHUP
+        self.config = runtime_config or config.RuntimeConfig.load()
+        settings = self.config.settings
         self.bot = aiogram.Bot(token=token)
         self.dp = aiogram.Dispatcher()
-        self.ai_service = ai_service.AIService(api_key)
-        self.game_logic = game_logic.GameLogic('data')
-        self._illusion_urls_cache: typing.Optional[typing.List[typing.Tuple[str, str]]] = None
+        # Every update is a trace of spans (handler, AI, GameLogic queries, Bot API calls) written to TRACE_FILE
+        self.tracer = tracing.Tracer.from_settings(settings)
+        if self.tracer is not None:
+            self.dp.update.outer_middleware(tracing.TracingMiddleware())
+            # Registered before the scheduler, so the Bot API spans include the time in the send queue
+            self.bot.session.middleware(tracing.TracingRequestMiddleware())
+        # All requests to chats go through one scheduler enforcing Telegram's rate limits
+        self.send_scheduler = send_scheduler.SendScheduler.from_settings(settings)
+        self.bot.session.middleware(self.send_scheduler)
+        # Shared pool for CPU-bound payload and image work, so handlers never block the event loop
+        self.cpu_executor = executor.CPUExecutor(settings.cpu_executor, settings.cpu_executor_workers, name='cpu')
+        self.ai_service = ai_service.AIService(api_key, executor=self.cpu_executor, settings=settings)
+        self.lag_monitor = loop_monitor.LoopLagMonitor.from_settings(settings)
+        self.game_logic = game_logic.GameLogic('data', settings=settings)
+        self.challenge_source = challenge_source.create_challenge_source(
+            settings.challenge_source, self.ai_service, settings
+        )
+        # With GENERATION_MODE=queue, /illusion challenges are generated by worker processes (src/worker.py)
+        self.job_queue: typing.Optional[job_queue.JobQueue] = None
+        if settings.generation_mode == 'queue':
+            self.job_queue = job_queue.JobQueue('data', settings.job_lease_seconds, settings.job_max_attempts)
+            self.job_events = job_queue.JobEvents(settings.job_socket, self._handle_job_event)
+        self.job_poll_interval = settings.job_poll_interval
+        self._jobs_finished = asyncio.Event()
+        self._job_deliveries: typing.Dict[int, asyncio.Task] = {}
+        self._job_task: typing.Optional[asyncio.Task] = None
+        self.illusion_catalog = illusion_catalog.IllusionCatalog(
+            str(pathlib.Path(__file__).resolve().parents[2] / 'data' / 'illusion_urls.txt'),
+            check_interval=settings.illusion_catalog_check_interval,
+        )
+        # Rendered leaderboard pages, valid until the next stats write or a change of the page size
+        self.leaderboard_page_size = settings.leaderboard_size
+        self._leaderboard_cache: typing.Dict[str, typing.Tuple[typing.List[str], typing.List[str], typing.Any]] = {}
+        self._leaderboard_cache_version = -1
+        # Leaderboard positions of users below the first page, valid until the next stats write
+        self._user_rank_cache: typing.Dict[str, typing.Optional[tuple]] = {}
+        # Group chats with a challenge being generated, and timers closing group rounds
+        self._group_generations: typing.Set[str] = set()
+        self._group_round_tasks: typing.Dict[str, asyncio.Task] = {}
+        # Daily illusion sent to subscribers at DAILY_BROADCAST_TIME (local time, HH:MM)
+        self.broadcast_store = broadcast.BroadcastStore('data')
+        self.broadcaster = broadcast.Broadcaster(
+            self.bot,
+            self.broadcast_store,
+            self.game_logic,
+            self._create_answer_keyboard(),
+        )
+        self.daily_broadcast_time = settings.daily_broadcast_time
+        self._broadcast_task: typing.Optional[asyncio.Task] = None
+        # On-demand profiles of the running bot, written to data/profiles/
+        self.profiler = profiler.Profiler('data')
+        self._profile_task: typing.Optional[asyncio.Task] = None
 
         # Register handlers
         self._register_handlers()
+        self.config.subscribe(self._apply_settings)
 
         logger.info(f'[TelegramBot] Initialized with token: {token[:10]}...')
 
+    def _apply_settings(self, settings: config.Settings):
+        """Apply reloaded settings to the components; work in progress finishes with the old values"""
+        self.send_scheduler.apply_settings(settings)
+        self.ai_service.apply_settings(settings)
+        self.challenge_source.apply_settings(settings)
+        self.game_logic.apply_settings(settings)
+        if self.lag_monitor is not None:
+            self.lag_monitor.apply_settings(settings)
+        self.illusion_catalog.check_interval = settings.illusion_catalog_check_interval
+        if settings.leaderboard_size != self.leaderboard_page_size:
+            self.leaderboard_page_size = settings.leaderboard_size
+            self._leaderboard_cache.clear()
+
     def _register_handlers(self):
         """Register command and message handlers"""
         self.dp.message(aiogram.filters.Command('start'))(self.handle_start)
@@ -34,37 +140,25 @@ class TelegramBot:
         self.dp.message(aiogram.filters.Command('illusion'))(self.handle_illusion)
         self.dp.message(aiogram.filters.Command('stats'))(self.handle_stats)
         self.dp.message(aiogram.filters.Command('leaderboard'))(self.handle_leaderboard)
+        self.dp.message(aiogram.filters.Command('subscribe'))(self.handle_subscribe)
+        self.dp.message(aiogram.filters.Command('unsubscribe'))(self.handle_unsubscribe)
         self.dp.message(aiogram.filters.Command('clear_x9k2m7p4w8n5q1r3v6z0j8h4g2f5d7s9a1c3e6b8'))(
             self.handle_reset_leaderboard
         )
+        self.dp.message(aiogram.filters.Command('illusions_x9k2m7p4w8n5q1r3v6z0j8h4g2f5d7s9a1c3e6b8'))(
+            self.handle_illusion_stats
+        )
+        self.dp.message(aiogram.filters.Command('export_x9k2m7p4w8n5q1r3v6z0j8h4g2f5d7s9a1c3e6b8'))(self.handle_export)
+        self.dp.message(aiogram.filters.Command('profile_x9k2m7p4w8n5q1r3v6z0j8h4g2f5d7s9a1c3e6b8'))(
+            self.handle_profile
+        )
         self.dp.message()(self.handle_message)  # Handle text messages for button presses
+        self.dp.callback_query(aiogram.F.data.startswith(LEADERBOARD_CALLBACK_PREFIX))(self.handle_leaderboard_page)
         self.dp.callback_query()(self.handle_callback_query)
 
     def _get_random_illusion_urls(self) -> typing.List[typing.Tuple[str, str]]:
-        """Get all illusion URLs and descriptions from the file (cached in memory)."""
-        if self._illusion_urls_cache is not None:
-            return self._illusion_urls_cache
-
-        illusions: typing.List[typing.Tuple[str, str]] = []
-        try:
-            data_file_path = pathlib.Path(__file__).resolve().parents[2] / 'data' / 'illusion_urls.txt'
-            with data_file_path.open('r', encoding='utf-8') as file:
-                for line in file:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        # Split URL and description if both are present
-                        if '|' in line:
-                            url, description = line.split('|', 1)
-                            illusions.append((url.strip(), description.strip()))
-                        else:
-                            # No description provided
-                            illusions.append((line, ''))
-        except FileNotFoundError:
-            logger.warning('[TelegramBot] illusion_urls.txt not found')
-        except Exception as e:
-            logger.error(f'[TelegramBot] Error reading illusion URLs: {e}')
-        self._illusion_urls_cache = illusions
-        return self._illusion_urls_cache
+        """Get all illusion URLs and descriptions of the loaded catalog."""
+        return [(entry.url, entry.description) for entry in self.illusion_catalog.entries]
 
     def _create_main_menu(self) -> aiogram.types.ReplyKeyboardMarkup:
         """Create main menu keyboard with all commands"""
@@ -73,10 +167,20 @@ class TelegramBot:
             [aiogram.types.KeyboardButton(text='🎲 Случайная иллюзия')],
             [aiogram.types.KeyboardButton(text='📊 Просмотр статистики')],
             [aiogram.types.KeyboardButton(text='🏆 Таблица лидеров')],
+            [aiogram.types.KeyboardButton(text='📅 Иллюзия дня')],
             [aiogram.types.KeyboardButton(text='ℹ️ Помощь')],
         ]
         return aiogram.types.ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=False)
 
+    def _create_answer_keyboard(self) -> aiogram.types.InlineKeyboardMarkup:
+        """Create inline keyboard with the answer options of a challenge"""
+        return aiogram.types.InlineKeyboardMarkup(
+            inline_keyboard=[
+                [aiogram.types.InlineKeyboardButton(text=label, callback_data=answer)]
+                for answer, label in ANSWER_LABELS.items()
+            ]
+        )
+
     async def handle_start(self, message: aiogram.types.Message):
         """Handle /start command"""
         logger.info(f'[TelegramBot] Received /start from user {message.from_user.id}')
@@ -97,6 +201,7 @@ class TelegramBot:
             '🎲 Случайная иллюзия - Показать случайную иллюзию из коллекции\n'
             '📊 Просмотр статистики - Показать вашу статистику\n'
             '🏆 Таблица лидеров - Показать топ-10 участников\n'
+            '📅 Иллюзия дня - Подписаться на ежедневную иллюзию или отписаться (/subscribe, /unsubscribe)\n'
             'ℹ️ Помощь - Показать это сообщение помощи\n\n'
             'Просто используйте кнопки ниже для навигации!'
         )
@@ -119,6 +224,12 @@ class TelegramBot:
         elif message.text == '🏆 Таблица лидеров':
             # Call the leaderboard handler
             await self.handle_leaderboard(message)
+        elif message.text == '📅 Иллюзия дня':
+            # Toggle the daily illusion subscription
+            if await self.broadcast_store.is_subscribed(str(message.chat.id)):
+                await self.handle_unsubscribe(message)
+            else:
+                await self.handle_subscribe(message)
         elif message.text == 'ℹ️ Помощь':
             # Call the help handler
             await self.handle_help(message)
@@ -133,30 +244,30 @@ class TelegramBot:
         """Handle random illusion request"""
         logger.info(f'[TelegramBot] Received random illusion request from user {message.from_user.id}')
 
-        # Get random illusion URLs and descriptions
-        illusions = self._get_random_illusion_urls()
+        # The user's next illusion, in an order without repeats until the whole catalog has been shown
+        illusion = await self.illusion_catalog.draw(str(message.from_user.id))
 
-        if not illusions:
+        if illusion is None:
             await message.answer(
                 'Извините, в данный момент иллюзии недоступны. Пожалуйста, попробуйте позже.',
                 reply_markup=self._create_main_menu(),
             )
             return
 
-        # Select a random illusion
-        random_illusion = random.choice(illusions)
-        url, description = random_illusion
-
-        # Create caption with description if available
+        # Create caption with the title, description and author if available
         caption = 'Вот случайная оптическая иллюзия для вас! 🎲'
-        if description:
-            caption += f'\n\n{description}'
+        if illusion.title:
+            caption += f'\n\n{illusion.title}'
+        if illusion.description:
+            caption += f'\n\n{illusion.description}'
+        if illusion.author:
+            caption += f'\n\nАвтор: {illusion.author}'
 
         try:
             # Send the image with description
             await self.bot.send_photo(
                 chat_id=message.chat.id,
-                photo=url,
+                photo=illusion.url,
                 caption=caption,
                 reply_markup=self._create_main_menu(),
                 has_spoiler=False,
@@ -189,6 +300,13 @@ class TelegramBot:
                 f'Правильных ответов: {stats.correct_answers}\n'
                 f'Точность: {accuracy:.1f}%'
             )
+            recent = await self.game_logic.get_daily_stats(user_id, RECENT_STATS_DAYS)
+            recent_answers = sum(day.answers for day in recent)
+            if recent_answers:
+                recent_accuracy = sum(day.correct for day in recent) / recent_answers * 100
+                stats_text += (
+                    f'\n\nЗа {RECENT_STATS_DAYS} дней: {recent_answers} задач, точность {recent_accuracy:.1f}%'
+                )
 
         await message.answer(stats_text, reply_markup=self._create_main_menu())
 
@@ -197,41 +315,159 @@ class TelegramBot:
         user_id = str(message.from_user.id)
         logger.info(f'[TelegramBot] Received /leaderboard from user {user_id}')
 
-        # Get leaderboard data
-        leaderboard_data = await self.game_logic.get_leaderboard(user_id, limit=10)
-        top_users = leaderboard_data['top_users']
-        user_rank = leaderboard_data['user_rank']
+        leaderboard_text, keyboard = await self._render_leaderboard(LEADERBOARD_CALLBACK_PREFIX + 'first', user_id)
+        await message.answer(leaderboard_text, reply_markup=keyboard or self._create_main_menu())
 
-        # Build leaderboard message
-        if not top_users:
-            leaderboard_text = 'Таблица лидеров пока пуста. Будьте первым, кто решит задачи! 🏆'
+    async def handle_leaderboard_page(self, callback_query: aiogram.types.CallbackQuery):
+        """Handle leaderboard page navigation buttons"""
+        user_id = str(callback_query.from_user.id)
+        logger.info(f'[TelegramBot] Received leaderboard navigation from user {user_id}: {callback_query.data}')
+
+        # Buttons of an old or forged message may carry a cursor that does not decode
+        action = callback_query.data[len(LEADERBOARD_CALLBACK_PREFIX) :]
+        if action.startswith(('n:', 'p:')):
+            try:
+                game_logic.LeaderboardCursor.decode(action[2:])
+            except ValueError:
+                logger.warning(f'[TelegramBot] Invalid leaderboard cursor from user {user_id}: {callback_query.data}')
+                await callback_query.answer(
+                    'Таблица лидеров устарела, откройте её заново: /leaderboard', show_alert=True
+                )
+                return
+
+        rendered = await self._render_leaderboard(callback_query.data, user_id)
+        if rendered is None:
+            await callback_query.answer('Вы еще не в таблице лидеров. Решите хотя бы одну задачу!', show_alert=True)
+            return
+        await callback_query.answer()
+
+        leaderboard_text, keyboard = rendered
+        try:
+            await callback_query.message.edit_text(leaderboard_text, reply_markup=keyboard)
+        except aiogram.exceptions.TelegramBadRequest as e:
+            # Pressing the button of the page that is already shown does not modify the message
+            logger.info(f'[TelegramBot] Leaderboard message not updated: {e}')
+
+    async def _get_leaderboard_page(
+        self, request: str, user_id: str
+    ) -> typing.Optional[typing.Tuple[typing.List[str], typing.List[str], typing.Any]]:
+        """
+        Get a rendered leaderboard page from the cache or build it.
+
+        Args:
+            request: Callback data: "lb:first", "lb:n:<cursor>", "lb:p:<cursor>" or "lb:me"
+            user_id: Current user's Telegram user ID
+
+        Returns:
+            Tuple of text lines, user IDs of the lines and inline keyboard, or None for "lb:me"
+            if the user is not ranked
+        """
+        if self._leaderboard_cache_version != self.game_logic.stats_version:
+            self._leaderboard_cache.clear()
+            self._user_rank_cache.clear()
+            self._leaderboard_cache_version = self.game_logic.stats_version
+
+        action = request[len(LEADERBOARD_CALLBACK_PREFIX) :]
+        cache_key = f'{request}:{user_id}' if action == 'me' else request
+        if cache_key in self._leaderboard_cache:
+            return self._leaderboard_cache[cache_key]
+
+        if action == 'me':
+            page = await self.game_logic.get_user_leaderboard_page(user_id, self.leaderboard_page_size)
+            if page is None:
+                return None
+        elif action.startswith('n:'):
+            cursor = game_logic.LeaderboardCursor.decode(action[2:])
+            page = await self.game_logic.get_leaderboard_page(after=cursor, page_size=self.leaderboard_page_size)
+        elif action.startswith('p:'):
+            cursor = game_logic.LeaderboardCursor.decode(action[2:])
+            page = await self.game_logic.get_leaderboard_page(before=cursor, page_size=self.leaderboard_page_size)
         else:
-            leaderboard_text = '🏆 Таблица лидеров (Топ-10):\n\n'
-
-            for rank, user_id_db, username, correct_answers, accuracy in top_users:
-                # Use medal emojis for top 3
-                if rank == 1:
-                    prefix = '🥇'
-                elif rank == 2:
-                    prefix = '🥈'
-                elif rank == 3:
-                    prefix = '🥉'
-                else:
-                    prefix = f'{rank}.'
-
-                leaderboard_text += f'{prefix} {username}: {correct_answers} правильных ({accuracy:.1f}%)\n'
-
-            # Show user's position if not in top 10
+            page = await self.game_logic.get_leaderboard_page(page_size=self.leaderboard_page_size)
+
+        lines = []
+        for rank, _, username, correct_answers, accuracy in page.entries:
+            # Use medal emojis for top 3
+            if rank == 1:
+                prefix = '🥇'
+            elif rank == 2:
+                prefix = '🥈'
+            elif rank == 3:
+                prefix = '🥉'
+            else:
+                prefix = f'{rank}.'
+            lines.append(f'{prefix} {username}: {correct_answers} правильных ({accuracy:.1f}%)')
+
+        keyboard = None
+        if page.entries:
+            buttons = []
+            if page.has_prev:
+                buttons.append(
+                    aiogram.types.InlineKeyboardButton(
+                        text='◀️ Назад', callback_data=f'{LEADERBOARD_CALLBACK_PREFIX}p:{page.first.encode()}'
+                    )
+                )
+            buttons.append(
+                aiogram.types.InlineKeyboardButton(
+                    text='📍 Моя позиция', callback_data=f'{LEADERBOARD_CALLBACK_PREFIX}me'
+                )
+            )
+            if page.has_next:
+                buttons.append(
+                    aiogram.types.InlineKeyboardButton(
+                        text='Вперед ▶️', callback_data=f'{LEADERBOARD_CALLBACK_PREFIX}n:{page.last.encode()}'
+                    )
+                )
+            keyboard = aiogram.types.InlineKeyboardMarkup(inline_keyboard=[buttons])
+            season = self.game_logic.season
+            if page.first.rank == 1:
+                lines.insert(0, f'🏆 Таблица лидеров, сезон {season} (Топ-{self.leaderboard_page_size}):\n')
+            else:
+                lines.insert(0, f'🏆 Таблица лидеров, сезон {season} (места {page.first.rank}–{page.last.rank}):\n')
+
+        line_user_ids = ([''] + [entry[1] for entry in page.entries]) if page.entries else []
+        rendered = (lines, line_user_ids, keyboard)
+        if len(self._leaderboard_cache) >= LEADERBOARD_CACHE_SIZE:
+            self._leaderboard_cache.clear()
+        self._leaderboard_cache[cache_key] = rendered
+        return rendered
+
+    async def _render_leaderboard(
+        self, request: str, user_id: str
+    ) -> typing.Optional[typing.Tuple[str, typing.Optional[aiogram.types.InlineKeyboardMarkup]]]:
+        """
+        Render a leaderboard page for a user.
+
+        Returns:
+            Tuple of message text and inline keyboard, or None if the requested page does not exist
+        """
+        cached = await self._get_leaderboard_page(request, user_id)
+        if cached is None:
+            return None
+        lines, line_user_ids, keyboard = cached
+
+        if not lines:
+            return 'Таблица лидеров пока пуста. Будьте первым, кто решит задачи! 🏆', None
+
+        # Mark the current user's line
+        lines = [
+            line + ' ← Вы' if line_user_id == user_id else line for line, line_user_id in zip(lines, line_user_ids)
+        ]
+
+        # Show user's position if not on the first page, numbered like the pages and cached with them
+        if request == LEADERBOARD_CALLBACK_PREFIX + 'first' and user_id not in line_user_ids:
+            if user_id not in self._user_rank_cache:
+                if len(self._user_rank_cache) >= LEADERBOARD_CACHE_SIZE:
+                    self._user_rank_cache.clear()
+                self._user_rank_cache[user_id] = await self.game_logic.get_user_rank(user_id)
+            user_rank = self._user_rank_cache[user_id]
             if user_rank:
                 user_rank_num, _, user_username, user_correct, user_accuracy = user_rank
-                if user_rank_num > 10:
-                    leaderboard_text += '\n...\n'
-                    leaderboard_text += (
-                        f'{user_rank_num}. {user_username}: {user_correct} правильных ({user_accuracy:.1f}%) ← Вы\n'
-                    )
-                    leaderboard_text += '...\n'
+                lines.append('\n...')
+                lines.append(f'{user_rank_num}. {user_username}: {user_correct} правильных ({user_accuracy:.1f}%) ← Вы')
+                lines.append('...')
 
-        await message.answer(leaderboard_text, reply_markup=self._create_main_menu())
+        return '\n'.join(lines), keyboard
 
     async def handle_reset_leaderboard(self, message: aiogram.types.Message):
         """Handle secret command to reset leaderboard"""
@@ -244,7 +480,8 @@ class TelegramBot:
             logger.warning('[TelegramBot] Leaderboard has been reset!')
 
             await message.answer(
-                '🔄 Таблица лидеров успешно сброшена!\n\nВсе статистики удалены.',
+                f'🔄 Таблица лидеров сброшена: начался сезон {self.game_logic.season}!\n\n'
+                'Статистика прошлого сезона сохранена в архиве.',
                 reply_markup=self._create_main_menu(),
             )
         except Exception as e:
@@ -254,91 +491,396 @@ class TelegramBot:
                 reply_markup=self._create_main_menu(),
             )
 
+    async def handle_illusion_stats(self, message: aiogram.types.Message):
+        """Handle secret command showing the accuracy per illusion type"""
+        logger.info(f'[TelegramBot] Illusion stats requested by user {message.from_user.id}')
+        illusions = await self.game_logic.get_illusion_stats(ILLUSION_STATS_DAYS)
+        lines = [f'📈 Точность по типам иллюзий за {ILLUSION_STATS_DAYS} дней:']
+        for row in illusions:
+            lines.append(f'{row.source}/{row.detail or "—"}: {row.answers} ответов, {row.accuracy:.1f}% правильных')
+        if not illusions:
+            lines.append('Ответов пока нет.')
+        await message.answer('\n'.join(lines), reply_markup=self._create_main_menu())
+
+    async def handle_export(self, message: aiogram.types.Message, command: aiogram.filters.CommandObject):
+        """Handle secret command sending the user statistics as a gzip-compressed CSV (or NDJSON) file"""
+        fmt = (command.args or 'csv').strip().lower()
+        logger.warning(f'[TelegramBot] Stats export as {fmt} requested by user {message.from_user.id}')
+        if fmt not in export.EXPORT_FORMATS:
+            await message.answer(f'❌ Неизвестный формат: {fmt}. Доступны: {", ".join(export.EXPORT_FORMATS)}')
+            return
+
+        # Streamed through a temporary file, so neither the export nor the upload holds all users in memory
+        file_descriptor, path = tempfile.mkstemp(dir=self.game_logic.data_dir, suffix='.gz')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                rows = await export.StatsExport(self.game_logic.storage, fmt).write_to(file)
+            filename = f'user_stats_{datetime.date.today().isoformat()}.{fmt}.gz'
+            await message.answer_document(
+                aiogram.types.FSInputFile(path, filename=filename),
+                caption=f'📤 Статистика {rows} пользователей',
+            )
+        except Exception as e:
+            logger.error(f'[TelegramBot] Error exporting stats: {e}')
+            await message.answer(f'❌ Ошибка при экспорте статистики: {str(e)}')
+        finally:
+            os.remove(path)
+
+    async def handle_profile(self, message: aiogram.types.Message, command: aiogram.filters.CommandObject):
+        """
+        Handle secret command profiling the running bot.
+
+        Arguments in any order: the duration in seconds, "cprofile" (default) or "sample", and "memory" for
+        a tracemalloc comparison; "stop" ends the running profile early.
+        """
+        args = (command.args or '').lower().split()
+        logger.warning(f'[TelegramBot] Profile {args} requested by user {message.from_user.id}')
+        if 'stop' in args:
+            if self.profiler.stop():
+                await message.answer('⏹ Профилирование остановлено, готовлю отчёт...')
+            else:
+                await message.answer('Профилирование не запущено.')
+            return
+        if self.profiler.running:
+            await message.answer('⏱ Профилирование уже идёт. Остановить: stop')
+            return
+
+        seconds = PROFILE_SECONDS
+        mode = 'cprofile'
+        memory = False
+        for arg in args:
+            if arg.isdigit():
+                seconds = min(int(arg), profiler.MAX_PROFILE_SECONDS)
+            elif arg in profiler.PROFILE_MODES:
+                mode = arg
+            elif arg == 'memory':
+                memory = True
+            else:
+                await message.answer(
+                    f'❌ Неизвестный аргумент: {arg}. '
+                    f'Доступны: секунды, {", ".join(profiler.PROFILE_MODES)}, memory, stop'
+                )
+                return
+
+        await message.answer(f'🔬 Профилирование ({mode}{", память" if memory else ""}) на {seconds} с...')
+        self._profile_task = asyncio.create_task(self._run_profile(message.chat.id, seconds, mode, memory))
+
+    async def _run_profile(self, chat_id: int, seconds: int, mode: str, memory: bool):
+        """Run a profile and send its summary to the chat that requested it"""
+        try:
+            result = await self.profiler.run(seconds, mode, memory)
+        except Exception as e:
+            logger.error(f'[TelegramBot] Error profiling: {e}')
+            await self.bot.send_message(chat_id, f'❌ Ошибка профилирования: {str(e)}')
+            return
+        text = f'🔬 Профиль за {result.seconds:.0f} с: {result.path}\n\n{result.summary}'
+        if result.memory_path:
+            text += f'\n\n💾 {result.memory_path}\n{result.memory_summary}'
+        await self.bot.send_message(chat_id, text[:MAX_MESSAGE_LENGTH])
+
+    async def _stop_profile(self):
+        """Cancel a running profile, e.g. at shutdown"""
+        if self._profile_task is not None:
+            self._profile_task.cancel()
+            try:
+                await self._profile_task
+            except asyncio.CancelledError:
+                pass
+            self._profile_task = None
+
+    @tracing.traced()
     async def handle_illusion(self, message: aiogram.types.Message):
         """Handle /illusion command"""
         chat_id = str(message.chat.id)
+        is_group = message.chat.type in GROUP_CHAT_TYPES
+
+        # In a group one challenge serves everyone, so a new one waits until the current round is over
+        if is_group and (
+            chat_id in self.game_logic.group_rounds
+            or chat_id in self._group_generations
+            or (self.job_queue is not None and await self.job_queue.has_open_job(chat_id))
+        ):
+            await message.answer('⏱ В этом чате уже идёт раунд. Дождитесь результатов!')
+            return
+
         logger.info(f'[TelegramBot] Generating illusion challenge for chat {chat_id}')
+        if is_group:
+            self._group_generations.add(chat_id)
 
         try:
             # Send initial message
             status_message = await message.answer('🧠 Генерация оптической иллюзии...')
 
-            # Generate prompt
-            logger.info('[TelegramBot] Requesting prompt generation from AI service')
-            prompt_response = await self.ai_service.generate_prompt()
-            logger.info(f'[TelegramBot] Received prompt: {prompt_response.prompt}')
+            # Workers generate the challenge, and it is sent when the job is finished, even after a restart
+            if self.job_queue is not None:
+                await self.job_queue.enqueue(chat_id, status_message.message_id, is_group)
+                return
+
+            async def on_progress(stage: str):
+                if stage == 'image':
+                    await status_message.edit_text('🎨 Создание изображения иллюзии...')
 
-            # Check if prompt is empty
-            if not prompt_response.prompt:
-                logger.warning('[TelegramBot] Warning: Empty prompt received from AI service')
-                await status_message.edit_text(
-                    'Извините, я не смог сгенерировать подходящий запрос для иллюзии. Пожалуйста, попробуйте еще раз.'
-                )
+            try:
+                generated = await self.challenge_source.generate(on_progress)
+            except challenge_source.ChallengeGenerationError as e:
+                await status_message.edit_text(str(e))
                 return
+            await self._send_challenge(chat_id, is_group, generated, status_message.message_id)
+
+        except Exception as e:
+            logger.error(f'[TelegramBot] Error generating illusion: {str(e)}')
+            await message.answer(
+                f'Извините, при генерации иллюзии произошла ошибка: {str(e)}. Пожалуйста, попробуйте еще раз.'
+            )
+        finally:
+            self._group_generations.discard(chat_id)
+
+    async def _send_challenge(
+        self,
+        chat_id: str,
+        is_group: bool,
+        generated: challenge_source.GeneratedChallenge,
+        status_message_id: typing.Optional[int],
+    ):
+        """Store a generated challenge, send it with the answer buttons and replace the status message"""
+        base64_image = generated.image_base64
+        logger.info(
+            f'[TelegramBot] Challenge for chat {chat_id} generated by the {generated.source} source '
+            f'({generated.detail}), image data length: {len(base64_image)}'
+        )
+
+        # Update status message
+        if status_message_id is not None:
+            await self.bot.edit_message_text('✅ Отправка иллюзии...', chat_id=chat_id, message_id=status_message_id)
+
+        # Store challenge - use chat_id as key to match C++ implementation
+        logger.info(f'[TelegramBot] Storing challenge with correct answer: {generated.correct_answer}')
+        await self.game_logic.start_challenge(
+            chat_id,
+            generated.prompt,
+            generated.correct_answer,
+            generated.explanation,
+            base64_image,
+            generated.source,
+            generated.detail,
+        )
+        logger.info('[TelegramBot] Finished storing challenge')
+
+        # Create inline keyboard with options
+        keyboard = self._create_answer_keyboard()
 
-            # Update status message
-            await status_message.edit_text('🎨 Создание изображения иллюзии...')
+        # Send image with buttons
+        logger.info('[TelegramBot] Sending illusion challenge with buttons')
+        # Image data was decoded by the challenge source, off the event loop
+        image_file = aiogram.types.BufferedInputFile(
+            generated.image_bytes, filename=f'illusion.{generated.output_format}'
+        )
+
+        # AI challenges ask what the AI thinks, local ones have a measured answer
+        caption = CHALLENGE_CAPTIONS[generated.source]
+        window = int(self.game_logic.group_answer_window.total_seconds())
+        if is_group:
+            caption += f'\n\n⏱ Отвечают все! Результаты — через {window} сек.'
+
+        sent_message = await self.bot.send_photo(
+            chat_id=chat_id,
+            photo=image_file,
+            caption=caption,
+            reply_markup=keyboard,
+        )
 
-            # Generate image
-            logger.info('[TelegramBot] Requesting image generation from AI service')
-            base64_image = await self.ai_service.generate_image(prompt_response.prompt)
-            logger.info(f'[TelegramBot] Finished image generation, received image data, length: {len(base64_image)}')
+        if is_group:
+            self.game_logic.start_group_round(chat_id, sent_message.message_id)
+            self._group_round_tasks[chat_id] = asyncio.create_task(self._close_group_round_later(chat_id, window))
 
-            if not base64_image:
-                logger.warning('[TelegramBot] Warning: Empty image data received')
-                await status_message.edit_text(
-                    'Извините, я не смог сгенерировать изображение иллюзии. Пожалуйста, попробуйте еще раз.'
+        # Delete status message
+        if status_message_id is not None:
+            await self.bot.delete_message(chat_id=chat_id, message_id=status_message_id)
+        logger.info('[TelegramBot] Finished sending illusion challenge with buttons')
+
+    async def _handle_job_event(self, event: typing.Dict[str, typing.Any]):
+        """Show the progress of a queued generation, or deliver the finished jobs right away"""
+        if event.get('event') == 'finished':
+            self._jobs_finished.set()
+        elif event.get('event') == 'progress' and event.get('stage') == 'image' and event.get('message_id'):
+            try:
+                await self.bot.edit_message_text(
+                    '🎨 Создание изображения иллюзии...', chat_id=event['chat_id'], message_id=event['message_id']
+                )
+            except aiogram.exceptions.TelegramBadRequest as e:
+                logger.warning(f'[TelegramBot] Could not show the progress of job {event.get("job")}: {e}')
+
+    async def _run_job_deliveries(self):
+        """Send the challenges of finished jobs, when a worker reports them and every JOB_POLL_INTERVAL seconds"""
+        last_purge = 0.0
+        while True:
+            try:
+                for job in await self.job_queue.undelivered():
+                    if job.id not in self._job_deliveries:
+                        task = asyncio.create_task(self._deliver_job(job))
+                        self._job_deliveries[job.id] = task
+                        task.add_done_callback(lambda _, job_id=job.id: self._job_deliveries.pop(job_id, None))
+                if time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                    last_purge = time.monotonic()
+                    purged = await self.job_queue.purge_delivered()
+                    if purged:
+                        logger.info(f'[TelegramBot] Purged {purged} delivered generation jobs')
+            except Exception as e:
+                logger.error(f'[TelegramBot] Error checking generation jobs: {str(e)}')
+            try:
+                await asyncio.wait_for(self._jobs_finished.wait(), self.job_poll_interval)
+            except TimeoutError:
+                pass
+            self._jobs_finished.clear()
+
+    async def _deliver_job(self, job: job_queue.Job):
+        """Send the challenge of a finished job, or its error, to the chat that requested it"""
+        chat_id = job.chat_id
+        if job.is_group:
+            self._group_generations.add(chat_id)
+        try:
+            if job.challenge is not None:
+                generated = job.challenge
+                generated.image_base64 = await asyncio.to_thread(
+                    lambda: base64.b64encode(generated.image_bytes).decode('ascii')
+                )
+                await self._send_challenge(chat_id, job.is_group, generated, job.status_message_id)
+            elif job.status_message_id is not None:
+                await self.bot.edit_message_text(job.error, chat_id=chat_id, message_id=job.status_message_id)
+            else:
+                await self.bot.send_message(chat_id, job.error)
+        except Exception as e:
+            logger.error(f'[TelegramBot] Error delivering generation job {job.id}: {str(e)}')
+            try:
+                await self.bot.send_message(
+                    chat_id,
+                    f'Извините, при генерации иллюзии произошла ошибка: {str(e)}. Пожалуйста, попробуйте еще раз.',
                 )
+            except Exception as send_error:
+                logger.error(f'[TelegramBot] Could not report the error of job {job.id}: {str(send_error)}')
+        finally:
+            self._group_generations.discard(chat_id)
+        # A delivery interrupted by a shutdown or a crash is repeated after the next start
+        await self.job_queue.mark_delivered(job.id)
+
+    async def _close_group_round_later(self, chat_id: str, delay: float):
+        """Close a group round when its answer window is over and send the summary"""
+        await asyncio.sleep(delay)
+        self._group_round_tasks.pop(chat_id, None)
+        try:
+            result = await self.game_logic.close_group_round(chat_id)
+            if result is None:
                 return
+            if result.message_id is not None:
+                try:
+                    await self.bot.edit_message_reply_markup(
+                        chat_id=chat_id, message_id=result.message_id, reply_markup=None
+                    )
+                except aiogram.exceptions.TelegramBadRequest as e:
+                    logger.warning(f'[TelegramBot] Could not remove buttons of group round in chat {chat_id}: {e}')
+            await self.bot.send_message(chat_id, self._format_group_summary(result))
+        except Exception as e:
+            logger.error(f'[TelegramBot] Error closing group round in chat {chat_id}: {str(e)}')
 
-            # Update status message
-            await status_message.edit_text('✅ Отправка иллюзии...')
-
-            # Store challenge - use chat_id as key to match C++ implementation
-            logger.info(f'[TelegramBot] Storing challenge with correct answer: {prompt_response.correct_answer}')
-            self.game_logic.start_challenge(
-                chat_id,
-                prompt_response.prompt,
-                prompt_response.correct_answer,
-                prompt_response.explanation,
-                base64_image,
-            )
-            logger.info('[TelegramBot] Finished storing challenge')
-
-            # Create inline keyboard with options
-            keyboard = aiogram.types.InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [aiogram.types.InlineKeyboardButton(text='Левый больше', callback_data='left')],
-                    [aiogram.types.InlineKeyboardButton(text='Правый больше', callback_data='right')],
-                    [aiogram.types.InlineKeyboardButton(text='Они равны', callback_data='equal')],
-                ]
+    def _format_group_summary(self, result: game_logic.GroupRoundResult) -> str:
+        """Format the summary message of a group round"""
+        challenge = result.challenge
+        lines = ['⏱ Раунд окончен!', '']
+        if challenge.source == 'local':
+            lines.append(
+                f'📏 Правильный ответ: {ANSWER_LABELS.get(challenge.correct_answer, challenge.correct_answer)}'
             )
+        else:
+            lines.append(f'🤖 Ответ нейросети: {ANSWER_LABELS.get(challenge.correct_answer, challenge.correct_answer)}')
+        if challenge.explanation:
+            lines.append(f'💡 Объяснение: {challenge.explanation}')
+        lines.append('')
 
-            # Send image with buttons
-            logger.info('[TelegramBot] Sending illusion challenge with buttons')
-            # Convert base64 to InputFile
-            image_bytes = base64.b64decode(base64_image)
-            image_file = aiogram.types.BufferedInputFile(image_bytes, filename='illusion.png')
+        if result.total_users == 0:
+            lines.append('Никто не ответил.')
+            return '\n'.join(lines)
 
-            # Caption asks user to guess what the AI thinks
-            caption = '🤖 Какой объект, по мнению нейросети, кажется больше?'
+        lines.append(f'Ответили: {result.total_users}, правильно: {result.correct_users}')
+        lines.append(' · '.join(f'{ANSWER_LABELS[answer]}: {len(names)}' for answer, names in result.answers.items()))
+        winners = result.answers.get(challenge.correct_answer, [])
+        if winners:
+            listed = ', '.join(winners[:GROUP_SUMMARY_NAMES])
+            if len(winners) > GROUP_SUMMARY_NAMES:
+                listed += f' и ещё {len(winners) - GROUP_SUMMARY_NAMES}'
+            lines.append(f'✅ Угадали: {listed}')
+        return '\n'.join(lines)
 
-            await self.bot.send_photo(
-                chat_id=message.chat.id,
-                photo=image_file,
-                caption=caption,
-                reply_markup=keyboard,
-            )
+    async def _close_group_rounds(self):
+        """Close all open group rounds at shutdown, so their answers are recorded"""
+        for task in self._group_round_tasks.values():
+            task.cancel()
+        self._group_round_tasks.clear()
+        for chat_id in list(self.game_logic.group_rounds):
+            await self.game_logic.close_group_round(chat_id)
 
-            # Delete status message
-            await status_message.delete()
-            logger.info('[TelegramBot] Finished sending illusion challenge with buttons')
+    async def handle_subscribe(self, message: aiogram.types.Message):
+        """Handle /subscribe command"""
+        logger.info(f'[TelegramBot] Received /subscribe in chat {message.chat.id}')
+        time_text = self.daily_broadcast_time.strftime('%H:%M')
+        if await self.broadcast_store.subscribe(str(message.chat.id)):
+            text = f'📅 Вы подписались на иллюзию дня! Она будет приходить каждый день в {time_text}.'
+        else:
+            text = f'📅 Вы уже подписаны на иллюзию дня ({time_text}). Отписаться: /unsubscribe'
+        await message.answer(text, reply_markup=self._create_main_menu())
 
-        except Exception as e:
-            logger.error(f'[TelegramBot] Error generating illusion: {str(e)}')
-            await message.answer(
-                f'Извините, при генерации иллюзии произошла ошибка: {str(e)}. Пожалуйста, попробуйте еще раз.'
-            )
+    async def handle_unsubscribe(self, message: aiogram.types.Message):
+        """Handle /unsubscribe command"""
+        logger.info(f'[TelegramBot] Received /unsubscribe in chat {message.chat.id}')
+        if await self.broadcast_store.unsubscribe(str(message.chat.id)):
+            text = '📅 Вы отписались от иллюзии дня.'
+        else:
+            text = '📅 Вы не подписаны на иллюзию дня. Подписаться: /subscribe'
+        await message.answer(text, reply_markup=self._create_main_menu())
+
+    async def _run_daily_broadcasts(self):
+        """Resume interrupted broadcasts, then send the daily illusion every day at the configured time"""
+        for unfinished in await self.broadcast_store.unfinished_broadcasts():
+            logger.info(f'[TelegramBot] Resuming broadcast {unfinished.day}')
+            await self.broadcaster.run(unfinished)
+
+        last_day = None
+        while True:
+            now = datetime.datetime.now()
+            if last_day != now.date() and now.time() >= self.daily_broadcast_time:
+                # Also catches up on today's broadcast if the bot was down at the scheduled time
+                last_day = now.date()
+                try:
+                    await self._send_daily_broadcast(last_day)
+                except Exception as e:
+                    logger.error(f'[TelegramBot] Error sending daily broadcast: {str(e)}')
+                continue
+            next_run = datetime.datetime.combine(now.date(), self.daily_broadcast_time)
+            if next_run <= now:
+                next_run += datetime.timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+    async def _send_daily_broadcast(self, day: datetime.date):
+        """Generate the illusion of the day and send it to all subscribers"""
+        if await self.broadcast_store.get_broadcast(day.isoformat()) is not None:
+            return
+        subscribers = await self.broadcast_store.subscriber_count()
+        if subscribers == 0:
+            return
+        logger.info(f'[TelegramBot] Generating daily illusion for {subscribers} subscribers')
+        generated = await self.challenge_source.generate()
+        daily = await self.broadcast_store.create_broadcast(
+            day.isoformat(),
+            DAILY_CAPTION_PREFIX + CHALLENGE_CAPTIONS[generated.source],
+            generated.prompt,
+            generated.correct_answer,
+            generated.explanation,
+            generated.source,
+            generated.image_bytes,
+            generated.output_format,
+            # Subscribers can answer until the next daily illusion
+            expires_at=datetime.datetime.now() + datetime.timedelta(days=1),
+        )
+        await self.broadcaster.run(daily)
 
     async def handle_callback_query(self, callback_query: aiogram.types.CallbackQuery):
         """Handle callback queries (button presses)"""
@@ -351,11 +893,36 @@ class TelegramBot:
         # Get username or first name for display
         username = callback_query.from_user.username or callback_query.from_user.first_name or 'Anonymous'
 
+        # Broadcast answers carry the broadcast id: their challenge is stored apart from the chat's own one
+        broadcast_id = None
+        if callback_data.startswith(broadcast.BROADCAST_CALLBACK_PREFIX):
+            try:
+                broadcast_id, callback_data = broadcast.decode_answer(callback_data)
+            except ValueError:
+                logger.warning(f'[TelegramBot] Invalid broadcast answer from user {user_id}: {callback_data}')
+                await callback_query.answer('Эта задача уже была решена или истекло время.', show_alert=True)
+                return
+
+        # In a group round every user answers once; results are sent when the round is over
+        if broadcast_id is None and callback_query.message.chat.type in GROUP_CHAT_TYPES:
+            accepted = self.game_logic.add_group_answer(chat_id, callback_query.from_user.id, callback_data, username)
+            if accepted is not None:
+                await callback_query.answer(
+                    '✅ Ответ принят! Результаты — после окончания раунда.'
+                    if accepted
+                    else 'Вы уже ответили в этом раунде.'
+                )
+                return
+
         # Answer the callback query to remove the loading indicator
         await callback_query.answer()
 
-        # Check if there's an active challenge - use chat_id as key to match C++ implementation
-        challenge = self.game_logic.get_active_challenge(chat_id)
+        # Take the active challenge - use chat_id as key to match C++ implementation
+        # Taking it atomically guarantees that a double click is only counted once
+        if broadcast_id is not None:
+            challenge = await self.game_logic.take_broadcast_challenge(broadcast_id, chat_id)
+        else:
+            challenge = await self.game_logic.take_active_challenge(chat_id)
 
         if challenge is None:
             # No active challenge, send message and return
@@ -364,45 +931,104 @@ class TelegramBot:
             return
 
         # Check the answer (only validates, doesn't record stats)
-        # Use chat_id for challenge lookup
-        is_correct = self.game_logic.check_answer(chat_id, callback_data)
+        is_correct = challenge.correct_answer == callback_data
 
         # Record the answer for user statistics with username
         # Use user_id for stats (not chat_id) to track individual users
-        self.game_logic.record_answer(user_id, is_correct, username)
+        self.game_logic.record_answer(user_id, is_correct, username, chat_id, callback_data, challenge)
 
         # Remove the buttons from the message
         await callback_query.message.edit_reply_markup(reply_markup=None)
 
         # Send feedback
-        if is_correct:
-            logger.info(f'[TelegramBot] User {user_id} answered correctly')
-            feedback_text = '✅ Правильно! Вы угадали мнение нейросети!'
-            # Add correct answer and explanation if available
-            if challenge.correct_answer and challenge.explanation:
-                feedback_text += f'\n\n🤖 Ответ нейросети: {challenge.correct_answer}\n💡 Объяснение от нейросети: {challenge.explanation}'
-            await self.bot.send_message(chat_id, feedback_text)
+        if challenge.source == 'local':
+            answer_line = f'📏 Правильный ответ: {challenge.correct_answer}\n💡 Объяснение: {challenge.explanation}'
+            verdict = '✅ Правильно!' if is_correct else '❌ Неправильно.'
         else:
-            logger.info(f'[TelegramBot] User {user_id} answered incorrectly')
-            feedback_text = '❌ Неправильно. Нейросеть думает иначе!'
-            # Add correct answer and explanation if available
-            if challenge.correct_answer and challenge.explanation:
-                feedback_text += f'\n\n🤖 Ответ нейросети: {challenge.correct_answer}\n💡 Объяснение от нейросети: {challenge.explanation}'
-            await self.bot.send_message(chat_id, feedback_text)
+            answer_line = (
+                f'🤖 Ответ нейросети: {challenge.correct_answer}\n💡 Объяснение от нейросети: {challenge.explanation}'
+            )
+            verdict = (
+                '✅ Правильно! Вы угадали мнение нейросети!'
+                if is_correct
+                else '❌ Неправильно. Нейросеть думает иначе!'
+            )
+        logger.info(f'[TelegramBot] User {user_id} answered {"correctly" if is_correct else "incorrectly"}')
+        feedback_text = verdict
+        # Add correct answer and explanation if available
+        if challenge.correct_answer and challenge.explanation:
+            feedback_text += f'\n\n{answer_line}'
+        await self.bot.send_message(chat_id, feedback_text)
+
+    async def _stop_daily_broadcasts(self):
+        """Stop the daily broadcast; an interrupted broadcast resumes on the next start"""
+        if self._broadcast_task is not None:
+            self._broadcast_task.cancel()
+            try:
+                await self._broadcast_task
+            except asyncio.CancelledError:
+                pass
+            self._broadcast_task = None
+        await self.broadcast_store.close()
+
+    async def _stop_job_deliveries(self):
+        """Stop sending finished jobs; jobs not delivered yet are sent after the next start"""
+        if self.job_queue is None:
+            return
+        await self.job_events.stop()
+        tasks = [task for task in (self._job_task, *self._job_deliveries.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._job_task = None
+        await self.job_queue.close()
 
     async def start(self):
         """Start the bot"""
         logger.info('[TelegramBot] Starting Telegram bot...')
+        if self.lag_monitor is not None:
+            self.lag_monitor.start()
+        if self.tracer is not None:
+            self.tracer.start()
+        if self.config.install_signal_handler():
+            logger.info('[TelegramBot] Send SIGHUP to reload the settings')
+        self._broadcast_task = asyncio.create_task(self._run_daily_broadcasts())
+        if self.job_queue is not None:
+            await self.job_events.start()
+            self._job_task = asyncio.create_task(self._run_job_deliveries())
         try:
             await self.dp.start_polling(self.bot)
         except Exception as e:
             logger.error(f'[TelegramBot] Bot error: {str(e)}')
         finally:
             logger.info('[TelegramBot] Shutting down bot...')
+            self.config.remove_signal_handler()
+            await self._close_group_rounds()
+            await self._stop_daily_broadcasts()
+            await self._stop_profile()
+            await self._stop_job_deliveries()
+            await self.send_scheduler.close()
+            if self.lag_monitor is not None:
+                self.lag_monitor.stop()
+            await self.challenge_source.close()
             await self.ai_service.close()
+            await self.cpu_executor.close()
+            await self.game_logic.close()
+            if self.tracer is not None:
+                self.tracer.stop()
 
     async def stop(self):
         """Stop the bot"""
         logger.info('[TelegramBot] Stopping bot...')
         await self.dp.stop_polling()
+        await self._close_group_rounds()
+        await self._stop_daily_broadcasts()
+        await self._stop_profile()
+        await self._stop_job_deliveries()
+        await self.send_scheduler.close()
+        await self.challenge_source.close()
         await self.ai_service.close()
+        await self.cpu_executor.close()
+        await self.game_logic.close()
+        if self.tracer is not None:
+            self.tracer.stop()
@@ -0,0 +1,445 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import BufferedInputFile, InlineKeyboardMarkup
+
+from .game_logic import GameLogic
+from .send_scheduler import bulk_sends
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Answer buttons of a broadcast carry its id: "bc:<broadcast id>:<answer>"
+BROADCAST_CALLBACK_PREFIX = 'bc:'
+
+
+def encode_answer(broadcast_id: int, answer: str) -> str:
+    """Callback data of an answer button of a broadcast."""
+    return f'{BROADCAST_CALLBACK_PREFIX}{broadcast_id}:{answer}'
+
+
+def decode_answer(data: str) -> tuple[int, str]:
+    """
+    Decode callback data produced by encode_answer().
+
+    Returns:
+        Tuple of the broadcast id and the answer
+
+    Raises:
+        ValueError: If the data is not a broadcast answer
+    """
+    if not data.startswith(BROADCAST_CALLBACK_PREFIX):
+        raise ValueError(f'Not a broadcast answer: {data!r}')
+    broadcast_id, answer = data[len(BROADCAST_CALLBACK_PREFIX) :].split(':', 1)
+    return int(broadcast_id), answer
+
+
+@dataclass
+class Broadcast:
+    """A challenge sent to all subscribers, at most once per day."""
+
+    id: int
+    day: str  # ISO date
+    caption: str
+    prompt: str
+    correct_answer: str
+    explanation: str
+    source: str
+    image: bytes | None  # Image data until the first upload, then None
+    output_format: str
+    file_id: str | None  # Telegram file_id of the uploaded image, reused for every other subscriber
+    expires_at: datetime
+
+
+class BroadcastStore:
+    """
+    Subscribers and the delivery queue of broadcasts, in data/broadcast.db.
+
+    Every broadcast enqueues one delivery row per subscriber in the same transaction, and each row is
+    marked as soon as it is sent, so a broadcast interrupted by a crash resumes with the chats still pending.
+    """
+
+    def __init__(self, data_dir: str):
+        self.db_file = os.path.join(data_dir, 'broadcast.db')
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the long-lived database connection on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_file)
+                    await db.execute('PRAGMA journal_mode=WAL')
+                    await db.execute('PRAGMA synchronous=NORMAL')
+                    await db.executescript("""
+                        CREATE TABLE IF NOT EXISTS subscribers (
+                            chat_id TEXT PRIMARY KEY,
+                            subscribed_at REAL NOT NULL
+                        );
+                        CREATE TABLE IF NOT EXISTS broadcasts (
+                            id INTEGER PRIMARY KEY,
+                            day TEXT NOT NULL UNIQUE,
+                            caption TEXT NOT NULL,
+                            prompt TEXT NOT NULL,
+                            correct_answer TEXT NOT NULL,
+                            explanation TEXT DEFAULT '',
+                            source TEXT NOT NULL,
+                            image BLOB,
+                            output_format TEXT NOT NULL,
+                            file_id TEXT,
+                            expires_at REAL NOT NULL,
+                            created_at REAL NOT NULL,
+                            finished_at REAL
+                        );
+                        CREATE TABLE IF NOT EXISTS deliveries (
+                            broadcast_id INTEGER NOT NULL,
+                            chat_id TEXT NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'pending',
+                            attempts INTEGER NOT NULL DEFAULT 0,
+                            sent_at REAL,
+                            PRIMARY KEY (broadcast_id, chat_id)
+                        ) WITHOUT ROWID;
+                        CREATE INDEX IF NOT EXISTS idx_deliveries_pending
+                            ON deliveries(broadcast_id, chat_id) WHERE status = 'pending';
+                    """)
+                    await db.commit()
+                    self._db = db
+                    logger.info('[BroadcastStore] Database tables created/verified')
+        return self._db
+
+    async def subscribe(self, chat_id: str) -> bool:
+        """Subscribe a chat; returns False if it was already subscribed."""
+        db = await self._connection()
+        cursor = await db.execute(
+            'INSERT OR IGNORE INTO subscribers (chat_id, subscribed_at) VALUES (?, ?)', (chat_id, time.time())
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+    async def unsubscribe(self, chat_id: str) -> bool:
+        """Unsubscribe a chat; returns False if it was not subscribed."""
+        db = await self._connection()
+        cursor = await db.execute('DELETE FROM subscribers WHERE chat_id = ?', (chat_id,))
+        await db.commit()
+        return cursor.rowcount > 0
+
+    async def is_subscribed(self, chat_id: str) -> bool:
+        db = await self._connection()
+        async with db.execute('SELECT 1 FROM subscribers WHERE chat_id = ?', (chat_id,)) as cursor:
+            return await cursor.fetchone() is not None
+
+    async def subscriber_count(self) -> int:
+        db = await self._connection()
+        async with db.execute('SELECT COUNT(*) FROM subscribers') as cursor:
+            return (await cursor.fetchone())[0]
+
+    _BROADCAST_COLUMNS = """
+        id, day, caption, prompt, correct_answer, explanation, source, image, output_format, file_id, expires_at
+    """
+
+    @staticmethod
+    def _from_row(row: tuple) -> Broadcast:
+        return Broadcast(*row[:10], expires_at=datetime.fromtimestamp(row[10]))
+
+    async def get_broadcast(self, day: str) -> Broadcast | None:
+        db = await self._connection()
+        async with db.execute(f'SELECT {self._BROADCAST_COLUMNS} FROM broadcasts WHERE day = ?', (day,)) as cursor:
+            row = await cursor.fetchone()
+        return self._from_row(row) if row else None
+
+    async def create_broadcast(
+        self,
+        day: str,
+        caption: str,
+        prompt: str,
+        correct_answer: str,
+        explanation: str,
+        source: str,
+        image: bytes,
+        output_format: str,
+        expires_at: datetime,
+    ) -> Broadcast:
+        """Create a broadcast and enqueue a delivery for every current subscriber, in one transaction."""
+        db = await self._connection()
+        cursor = await db.execute(
+            """
+            INSERT INTO broadcasts
+                (day, caption, prompt, correct_answer, explanation, source, image, output_format,
+                 expires_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                day,
+                caption,
+                prompt,
+                correct_answer,
+                explanation,
+                source,
+                image,
+                output_format,
+                expires_at.timestamp(),
+                time.time(),
+            ),
+        )
+        broadcast_id = cursor.lastrowid
+        await db.execute(
+            'INSERT INTO deliveries (broadcast_id, chat_id) SELECT ?, chat_id FROM subscribers', (broadcast_id,)
+        )
+        await db.commit()
+        return Broadcast(
+            broadcast_id,
+            day,
+            caption,
+            prompt,
+            correct_answer,
+            explanation,
+            source,
+            image,
+            output_format,
+            None,
+            expires_at,
+        )
+
+    async def unfinished_broadcasts(self) -> list[Broadcast]:
+        """Broadcasts interrupted before all deliveries were made."""
+        db = await self._connection()
+        async with db.execute(
+            f'SELECT {self._BROADCAST_COLUMNS} FROM broadcasts WHERE finished_at IS NULL ORDER BY id'
+        ) as cursor:
+            return [self._from_row(row) for row in await cursor.fetchall()]
+
+    async def pending_deliveries(self, broadcast_id: int, limit: int, after: str = '') -> list[str]:
+        """Chat IDs still waiting for the broadcast, in chat ID order after the given one."""
+        db = await self._connection()
+        async with db.execute(
+            """
+            SELECT chat_id FROM deliveries
+            WHERE broadcast_id = ? AND status = 'pending' AND chat_id > ?
+            ORDER BY chat_id
+            LIMIT ?
+        """,
+            (broadcast_id, after, limit),
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def set_file_id(self, broadcast_id: int, file_id: str) -> None:
+        """Remember the uploaded image and drop the image data."""
+        db = await self._connection()
+        await db.execute('UPDATE broadcasts SET file_id = ?, image = NULL WHERE id = ?', (file_id, broadcast_id))
+        await db.commit()
+
+    async def mark_delivery(self, broadcast_id: int, chat_id: str, status: str, attempts: int) -> None:
+        """Record the outcome of a delivery: "sent" or "failed"."""
+        db = await self._connection()
+        await db.execute(
+            """
+            UPDATE deliveries SET status = ?, attempts = ?, sent_at = ?
+            WHERE broadcast_id = ? AND chat_id = ?
+        """,
+            (status, attempts, time.time(), broadcast_id, chat_id),
+        )
+        await db.commit()
+
+    async def finish(self, broadcast_id: int) -> None:
+        db = await self._connection()
+        await db.execute('UPDATE broadcasts SET finished_at = ? WHERE id = ?', (time.time(), broadcast_id))
+        await db.commit()
+
+    async def delivery_counts(self, broadcast_id: int) -> dict[str, int]:
+        """Number of deliveries of a broadcast by status."""
+        db = await self._connection()
+        async with db.execute(
+            'SELECT status, COUNT(*) FROM deliveries WHERE broadcast_id = ? GROUP BY status', (broadcast_id,)
+        ) as cursor:
+            return dict(await cursor.fetchall())
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+@dataclass
+class BroadcastReport:
+    """Outcome and throughput of a broadcast run."""
+
+    day: str
+    sent: int = 0
+    failed: int = 0
+    unsubscribed: int = 0  # Chats that blocked the bot or were deleted
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Sent messages per second."""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+class Broadcaster:
+    """
+    Delivers a broadcast to its pending chats.
+
+    The image is uploaded with the first delivery and sent by file_id to everyone else. Sends are bulk
+    requests of the send scheduler, which limits their rate, serves replies to users first and retries
+    flood-control errors. Each chat gets the broadcast challenge in the challenge store before its message
+    is sent. The answer buttons carry the broadcast id, so the challenge is kept apart from a challenge
+    the chat is solving.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        store: BroadcastStore,
+        game_logic: GameLogic,
+        reply_markup: InlineKeyboardMarkup,
+        workers: int = 8,
+        batch_size: int = 200,
+        max_attempts: int = 3,
+        progress_every: int = 500,
+    ):
+        self.bot = bot
+        self.store = store
+        self.game_logic = game_logic
+        self.reply_markup = reply_markup
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.progress_every = progress_every
+
+    async def run(self, broadcast: Broadcast) -> BroadcastReport:
+        """Deliver the broadcast to all pending chats and mark it finished."""
+        report = BroadcastReport(broadcast.day)
+        start = time.monotonic()
+        logger.info(f'[Broadcaster] Starting broadcast {broadcast.day}')
+        with bulk_sends():
+            await self._run(broadcast, report, start)
+
+        await self.store.finish(broadcast.id)
+        report.elapsed = time.monotonic() - start
+        logger.info(
+            f'[Broadcaster] Finished broadcast {broadcast.day}: {report.sent} sent, {report.failed} failed '
+            f'({report.unsubscribed} unsubscribed), {report.elapsed:.1f}s, {report.rate:.1f} msg/s'
+        )
+        return report
+
+    def _answer_markup(self, broadcast: Broadcast) -> InlineKeyboardMarkup:
+        """The answer buttons, with callback data that carries the broadcast id."""
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    button.model_copy(update={'callback_data': encode_answer(broadcast.id, button.callback_data)})
+                    for button in row
+                ]
+                for row in self.reply_markup.inline_keyboard
+            ]
+        )
+
+    async def _run(self, broadcast: Broadcast, report: BroadcastReport, start: float) -> None:
+        reply_markup = self._answer_markup(broadcast)
+
+        after = ''
+        while True:
+            chat_ids = await self.store.pending_deliveries(broadcast.id, self.batch_size, after)
+            if not chat_ids:
+                break
+            after = chat_ids[-1]
+            await self.game_logic.start_broadcast_challenges(
+                broadcast.id,
+                chat_ids,
+                broadcast.prompt,
+                broadcast.correct_answer,
+                broadcast.explanation,
+                broadcast.source,
+                broadcast.expires_at,
+            )
+
+            # Upload the image once; until it succeeds, chats are tried one by one
+            while chat_ids and broadcast.file_id is None:
+                await self._deliver(broadcast, reply_markup, chat_ids.pop(0), report, start)
+
+            queue: asyncio.Queue[str] = asyncio.Queue()
+            for chat_id in chat_ids:
+                queue.put_nowait(chat_id)
+            await asyncio.gather(
+                *(
+                    self._worker(broadcast, reply_markup, queue, report, start)
+                    for _ in range(min(self.workers, len(chat_ids)))
+                )
+            )
+
+    async def _worker(
+        self,
+        broadcast: Broadcast,
+        reply_markup: InlineKeyboardMarkup,
+        queue: asyncio.Queue,
+        report: BroadcastReport,
+        start: float,
+    ):
+        while not queue.empty():
+            await self._deliver(broadcast, reply_markup, queue.get_nowait(), report, start)
+
+    async def _deliver(
+        self,
+        broadcast: Broadcast,
+        reply_markup: InlineKeyboardMarkup,
+        chat_id: str,
+        report: BroadcastReport,
+        start: float,
+    ) -> None:
+        """Send the broadcast to one chat, retrying transient errors."""
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                photo = broadcast.file_id or BufferedInputFile(
+                    broadcast.image, filename=f'illusion.{broadcast.output_format}'
+                )
+                message = await self.bot.send_photo(
+                    chat_id=chat_id, photo=photo, caption=broadcast.caption, reply_markup=reply_markup
+                )
+            except TelegramForbiddenError as e:
+                # The user blocked the bot or the bot was removed from the chat
+                logger.info(f'[Broadcaster] Unsubscribing chat {chat_id}: {e}')
+                await self.store.unsubscribe(chat_id)
+                await self.store.mark_delivery(broadcast.id, chat_id, 'failed', attempts)
+                report.failed += 1
+                report.unsubscribed += 1
+                return
+            except TelegramBadRequest as e:
+                logger.warning(f'[Broadcaster] Could not deliver to chat {chat_id}: {e}')
+                await self.store.mark_delivery(broadcast.id, chat_id, 'failed', attempts)
+                report.failed += 1
+                return
+            except Exception as e:
+                if attempts < self.max_attempts:
+                    logger.warning(f'[Broadcaster] Error delivering to chat {chat_id}, retrying: {e}')
+                    await asyncio.sleep(2**attempts)
+                    continue
+                logger.error(f'[Broadcaster] Giving up delivering to chat {chat_id}: {e}')
+                await self.store.mark_delivery(broadcast.id, chat_id, 'failed', attempts)
+                report.failed += 1
+                return
+
+            if broadcast.file_id is None:
+                broadcast.file_id = message.photo[-1].file_id
+                broadcast.image = None
+                await self.store.set_file_id(broadcast.id, broadcast.file_id)
+            await self.store.mark_delivery(broadcast.id, chat_id, 'sent', attempts)
+            report.sent += 1
+            if report.sent % self.progress_every == 0:
+                elapsed = time.monotonic() - start
+                logger.info(
+                    f'[Broadcaster] Broadcast {broadcast.day}: {report.sent} sent, {report.failed} failed, '
+                    f'{report.sent / elapsed:.1f} msg/s'
+                )
+            return
@@ -0,0 +1,193 @@
+"""
+Record/replay of the AI API responses.
+
+In record mode every prompt completion and image response of AIService is written to a cassette
+(a SQLite file with zlib-compressed bodies). In replay mode the responses are served from the cassette
+without any network access, with the recorded or a fixed synthetic latency, so benchmarks and debugging
+sessions are reproducible, offline and free.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from types import SimpleNamespace
+
+import aiosqlite
+from openai.types.chat import ChatCompletion
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+
+CHAT = 'chat'
+IMAGES = 'images'
+
+
+class CassetteMissError(LookupError):
+    """The cassette has no response of the requested kind."""
+
+
+def request_key(request: dict) -> str:
+    """Stable key of the request arguments."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    Responses stored by request.
+
+    A request is replayed with the responses recorded for the same arguments, in recorded order
+    (cycling if it is made more often). A request that was never recorded gets the next recorded
+    response of the same kind, so a replay keeps working when the requests drift.
+    """
+
+    def __init__(self, path: str, mode: str, latency: float | None = None):
+        """
+        Args:
+            path: Cassette file
+            mode: "record" or "replay"
+            latency: Seconds every replayed response takes, or None to replay the recorded latency
+        """
+        if mode not in {'record', 'replay'}:
+            raise ValueError(f'Unknown cassette mode: {mode!r}, expected "record" or "replay"')
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+        self._plays: defaultdict[str, int] = defaultdict(int)  # Replays by request key, and misses by kind
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def create(cls, mode: str, path: str, latency: str = 'recorded') -> 'Cassette | None':
+        """
+        Create a cassette, or None if it is off.
+
+        Args:
+            mode: "off", "record" or "replay"
+            path: Cassette file
+            latency: "recorded", or a fixed latency of the replayed responses in seconds
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f'Unknown cassette mode: {mode!r}, expected one of {list(CASSETTE_MODES)}')
+        if mode == 'off':
+            return None
+        return cls(path, mode, None if latency == 'recorded' else float(latency))
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the cassette on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("""
+                        CREATE TABLE IF NOT EXISTS responses (
+                            id INTEGER PRIMARY KEY,
+                            kind TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            request TEXT NOT NULL,
+                            body BLOB NOT NULL,
+                            latency REAL NOT NULL
+                        )
+                    """)
+                    await db.execute('CREATE INDEX IF NOT EXISTS idx_responses_key ON responses(kind, key, id)')
+                    await db.commit()
+                    self._db = db
+                    logger.info(f'[Cassette] Opened {self.path} in {self.mode} mode')
+        return self._db
+
+    async def play(self, kind: str, request: dict, call: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Record or replay one response.
+
+        Args:
+            kind: Kind of request, e.g. "chat" or "images"
+            request: Arguments of the request
+            call: Makes the real request and returns the response body; only called when recording
+
+        Returns:
+            The response body
+        """
+        db = await self._connection()
+        key = request_key(request)
+        if self.mode == 'record':
+            start = time.monotonic()
+            body = await call()
+            latency = time.monotonic() - start
+            await db.execute(
+                'INSERT INTO responses (kind, key, request, body, latency) VALUES (?, ?, ?, ?, ?)',
+                (kind, key, json.dumps(request, ensure_ascii=False), zlib.compress(body), latency),
+            )
+            await db.commit()
+            return body
+
+        async with db.execute(
+            'SELECT body, latency FROM responses WHERE kind = ? AND key = ? ORDER BY id', (kind, key)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if rows:
+            self.hits += 1
+            body, latency = rows[self._plays[key] % len(rows)]
+            self._plays[key] += 1
+        else:
+            self.misses += 1
+            async with db.execute('SELECT COUNT(*) FROM responses WHERE kind = ?', (kind,)) as cursor:
+                (count,) = await cursor.fetchone()
+            if count == 0:
+                raise CassetteMissError(f'The cassette {self.path} has no {kind} responses')
+            async with db.execute(
+                'SELECT body, latency FROM responses WHERE kind = ? ORDER BY id LIMIT 1 OFFSET ?',
+                (kind, self._plays[kind] % count),
+            ) as cursor:
+                body, latency = await cursor.fetchone()
+            self._plays[kind] += 1
+            logger.warning(f'[Cassette] No {kind} response recorded for this request, replaying the next one')
+
+        await asyncio.sleep(latency if self.latency is None else self.latency)
+        return zlib.decompress(body)
+
+    async def close(self) -> None:
+        if self._db is not None:
+            if self.mode == 'replay':
+                logger.info(f'[Cassette] Replayed {self.hits} recorded requests, {self.misses} misses')
+            await self._db.close()
+            self._db = None
+
+
+class CassetteClient:
+    """
+    Stands in for the AsyncOpenAI client used by AIService, recording or replaying its responses.
+
+    Only the calls AIService makes are provided: chat.completions.create and
+    images.with_raw_response.generate. In replay mode the real client is not needed.
+    """
+
+    def __init__(self, client, cassette: Cassette):
+        self.client = client
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+        self.images = SimpleNamespace(with_raw_response=SimpleNamespace(generate=self._generate_images))
+
+    async def _create_chat_completion(self, **kwargs) -> ChatCompletion:
+        async def call() -> bytes:
+            result = await self.client.chat.completions.create(**kwargs)
+            return result.model_dump_json().encode()
+
+        return ChatCompletion.model_validate_json(await self.cassette.play(CHAT, kwargs, call))
+
+    async def _generate_images(self, **kwargs) -> SimpleNamespace:
+        async def call() -> bytes:
+            response = await self.client.images.with_raw_response.generate(**kwargs)
+            return response.content
+
+        # AIService only reads the raw body of the images response
+        return SimpleNamespace(content=await self.cassette.play(IMAGES, kwargs, call))
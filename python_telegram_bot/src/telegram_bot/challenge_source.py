@@ -0,0 +1,341 @@
+import asyncio
+import base64
+import logging
+import random
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from .ai_service import AIService, GeneratedImage, PromptResponse
+from .config import CHALLENGE_SOURCES, Settings
+from .executor import CPUExecutor
+from .illusion_renderer import ANSWERS, ILLUSIONS, render_illusion
+from .image_archive import ImageArchive
+from .image_verifier import ImageVerifier
+from .tracing import set_attributes, traced
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Called with the name of the generation stage that is about to start, e.g. "image"
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+
+@dataclass
+class GeneratedChallenge:
+    """A challenge ready to be stored and sent."""
+
+    prompt: str
+    correct_answer: str  # "left", "right", "equal"
+    explanation: str
+    image_base64: str
+    image_bytes: bytes  # Decoded image data, ready to be sent
+    output_format: str  # "png", "jpeg" or "webp"
+    source: str  # Name of the source that generated the challenge: "ai" or "local"
+    detail: str = ''  # Image tier for AI challenges, illusion type for local ones
+
+
+class ChallengeGenerationError(Exception):
+    """A challenge could not be generated; the message is shown to the user."""
+
+
+class ChallengeSource(ABC):
+    """Generates illusion challenges."""
+
+    name: str
+
+    @abstractmethod
+    async def generate(self, on_progress: ProgressCallback | None = None) -> GeneratedChallenge:
+        """
+        Generate a new challenge.
+
+        Args:
+            on_progress: Optional callback notified when a slow generation stage starts
+
+        Returns:
+            The generated challenge
+
+        Raises:
+            ChallengeGenerationError: If the source produced an unusable challenge
+        """
+
+    def apply_settings(self, settings: Settings) -> None:
+        """Apply reloaded settings; generations in progress finish with the old ones. An optional hook."""
+        return
+
+    async def close(self) -> None:
+        """Release resources held by the source; an optional hook, by default nothing to release."""
+        return
+
+
+class AIChallengeSource(ChallengeSource):
+    """
+    Challenges with a prompt from the prompt model and an image from the image model.
+
+    If a verifier is given, the shapes in the image are measured, and images that do not match the
+    answer the prompt was generated for are rejected or relabeled, depending on the verifier mode.
+
+    With more than one variant, each image request asks for several images of the prompt. Every variant
+    is verified on its own; the first usable one is returned and the others are kept as ready challenges
+    with the prompt's answer and explanation, served by the next calls without any request.
+
+    With an image archive, usable images are archived with their prompt, and a prompt similar enough to an
+    archived one with the same answer is served the archived image instead of a new one.
+    """
+
+    name = 'ai'
+
+    def __init__(
+        self,
+        ai_service: AIService,
+        verifier: ImageVerifier | None = None,
+        variants: int = 1,
+        archive: ImageArchive | None = None,
+    ):
+        self.ai_service = ai_service
+        self.verifier = verifier
+        self.variants = variants
+        self.archive = archive
+        self.ready: deque[GeneratedChallenge] = deque()
+
+    def apply_settings(self, settings: Settings) -> None:
+        self.variants = settings.image_variants
+        if self.verifier is not None:
+            self.verifier.mode = settings.image_verify
+        if self.archive is not None:
+            self.archive.threshold = settings.image_reuse_threshold
+
+    async def close(self) -> None:
+        if self.archive is not None:
+            await self.archive.close()
+
+    @traced()
+    async def generate(self, on_progress: ProgressCallback | None = None) -> GeneratedChallenge:
+        if self.ready:
+            challenge = self.ready.popleft()
+            set_attributes(ready=True)
+            logger.info(f'[AIChallengeSource] Using a ready image variant, {len(self.ready)} left')
+            return challenge
+
+        logger.info('[AIChallengeSource] Requesting prompt generation from AI service')
+        prompt_response = await self.ai_service.generate_prompt()
+        logger.info(f'[AIChallengeSource] Received prompt: {prompt_response.prompt}')
+        if not prompt_response.prompt:
+            logger.warning('[AIChallengeSource] Warning: Empty prompt received from AI service')
+            raise ChallengeGenerationError(
+                'Извините, я не смог сгенерировать подходящий запрос для иллюзии. Пожалуйста, попробуйте еще раз.'
+            )
+
+        if self.archive is not None:
+            archived = await self.archive.find(prompt_response.prompt, prompt_response.correct_answer)
+            set_attributes(reused=archived is not None)
+            if archived is not None:
+                # The archived prompt and explanation describe the image, the new prompt only resembles them
+                return GeneratedChallenge(
+                    prompt=archived.prompt,
+                    correct_answer=archived.correct_answer,
+                    explanation=archived.explanation,
+                    image_base64=base64.b64encode(archived.image_bytes).decode(),
+                    image_bytes=archived.image_bytes,
+                    output_format=archived.output_format,
+                    source=self.name,
+                    detail=archived.tier,
+                )
+
+        if on_progress is not None:
+            await on_progress('image')
+
+        logger.info('[AIChallengeSource] Requesting image generation from AI service')
+        if self.variants > 1:
+            images = await self.ai_service.generate_image_variants(prompt_response.prompt, self.variants)
+        else:
+            images = [await self.ai_service.generate_image_result(prompt_response.prompt)]
+        images = [image for image in images if image.image_base64]
+        if not images:
+            logger.warning('[AIChallengeSource] Warning: Empty image data received')
+            raise ChallengeGenerationError(
+                'Извините, я не смог сгенерировать изображение иллюзии. Пожалуйста, попробуйте еще раз.'
+            )
+
+        challenges = [
+            challenge
+            for challenge in await asyncio.gather(*(self._to_challenge(prompt_response, image) for image in images))
+            if challenge is not None
+        ]
+        if not challenges:
+            raise ChallengeGenerationError(
+                'Извините, изображение не соответствует задуманной иллюзии. Пожалуйста, попробуйте еще раз.'
+            )
+        if len(images) > 1:
+            logger.info(f'[AIChallengeSource] {len(challenges)} of {len(images)} image variants usable')
+        if self.archive is not None:
+            await self._archive(prompt_response, challenges)
+        self.ready.extend(challenges[1:])
+        return challenges[0]
+
+    async def _archive(self, prompt_response: PromptResponse, challenges: list[GeneratedChallenge]) -> None:
+        """Archive the images that match the prompt; relabeled images contradict their prompt."""
+        for challenge in challenges:
+            if challenge.correct_answer != prompt_response.correct_answer:
+                continue
+            try:
+                await self.archive.add(
+                    challenge.prompt,
+                    challenge.correct_answer,
+                    challenge.explanation,
+                    challenge.image_bytes,
+                    challenge.output_format,
+                    challenge.detail,
+                )
+            except Exception as e:
+                logger.error(f'[AIChallengeSource] Error archiving image: {e}')
+
+    @traced()
+    async def _to_challenge(self, prompt_response: PromptResponse, image: GeneratedImage) -> GeneratedChallenge | None:
+        """Verify an image of the prompt; returns None if the verifier rejects it."""
+        correct_answer = prompt_response.correct_answer
+        explanation = prompt_response.explanation
+        if self.verifier is not None:
+            verification = await self.verifier.verify(image.image_bytes, correct_answer, prompt_response.origin)
+            if verification is not None and verification.status == 'failed':
+                measurement = verification.measurement
+                if self.verifier.mode == 'reject':
+                    return None
+                if self.verifier.mode == 'relabel':
+                    # The explanation of the prompt model describes the other answer, so it is replaced
+                    correct_answer = measurement.answer
+                    explanation = (
+                        f'Ответ определён измерением изображения: левый объект — {measurement.left_size:.0f}px, '
+                        f'правый — {measurement.right_size:.0f}px.'
+                    )
+
+        return GeneratedChallenge(
+            prompt=prompt_response.prompt,
+            correct_answer=correct_answer,
+            explanation=explanation,
+            image_base64=image.image_base64,
+            image_bytes=image.image_bytes,
+            output_format=image.output_format,
+            source=self.name,
+            detail=image.tier,
+        )
+
+
+class LocalChallengeSource(ChallengeSource):
+    """
+    Challenges drawn by the local procedural renderer.
+
+    Rendering is CPU-bound, so it runs in an executor (by default a pool of worker processes)
+    and never blocks the event loop. The answer is exact: the figures are drawn with known sizes.
+    """
+
+    name = 'local'
+
+    def __init__(
+        self,
+        executor: CPUExecutor | None = None,
+        illusions: tuple[str, ...] = ILLUSIONS,
+        image_size: int = 1024,
+    ):
+        """
+        Args:
+            executor: Executor the renderer runs in, a pool of two threads by default
+            illusions: Illusion types to choose from
+            image_size: Width and height of the images in pixels
+        """
+        unknown = set(illusions) - set(ILLUSIONS)
+        if unknown:
+            raise ValueError(f'Unknown illusions: {sorted(unknown)}')
+        self.executor = executor or CPUExecutor('thread', workers=2, name='render')
+        self.illusions = illusions
+        self.image_size = image_size
+
+    @traced()
+    async def generate(self, on_progress: ProgressCallback | None = None) -> GeneratedChallenge:
+        illusion = random.choice(self.illusions)
+        correct_answer = random.choice(ANSWERS)
+        seed = random.getrandbits(32)
+
+        rendered = await self.executor.run(render_illusion, illusion, correct_answer, seed, self.image_size)
+        logger.info(f'[LocalChallengeSource] Rendered {rendered.description}')
+
+        return GeneratedChallenge(
+            prompt=rendered.description,
+            correct_answer=rendered.correct_answer,
+            explanation=rendered.explanation,
+            image_base64=base64.b64encode(rendered.image_png).decode('ascii'),
+            image_bytes=rendered.image_png,
+            output_format='png',
+            source=self.name,
+            detail=illusion,
+        )
+
+    async def close(self) -> None:
+        await self.executor.close()
+
+
+class FallbackChallengeSource(ChallengeSource):
+    """Uses the primary source and falls back to the other one when it fails."""
+
+    def __init__(self, primary: ChallengeSource, fallback: ChallengeSource):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f'{primary.name}+{fallback.name}'
+
+    async def generate(self, on_progress: ProgressCallback | None = None) -> GeneratedChallenge:
+        try:
+            return await self.primary.generate(on_progress)
+        except Exception as e:
+            logger.warning(
+                f'[FallbackChallengeSource] {self.primary.name} source failed, using {self.fallback.name}: {e}'
+            )
+            return await self.fallback.generate(on_progress)
+
+    def apply_settings(self, settings: Settings) -> None:
+        self.primary.apply_settings(settings)
+        self.fallback.apply_settings(settings)
+
+    async def close(self) -> None:
+        await self.primary.close()
+        await self.fallback.close()
+
+
+def create_challenge_source(
+    name: str, ai_service: AIService | None, settings: Settings | None = None
+) -> ChallengeSource:
+    """
+    Create a challenge source by name.
+
+    Args:
+        name: "ai" (prompt and image models), "local" (procedural renderer)
+            or "auto" (AI with the local renderer as a fallback)
+        ai_service: AI service used by the AI source, not needed by the local source
+        settings: Verification, variants, image reuse, local illusions and render executor; read from the
+            environment if not given
+
+    Returns:
+        The challenge source
+    """
+    if name not in CHALLENGE_SOURCES:
+        raise ValueError(f'Unknown challenge source: {name!r}, expected one of {list(CHALLENGE_SOURCES)}')
+
+    settings = settings or Settings.from_env()
+    if name != 'local':
+        verifier = ImageVerifier(ai_service.executor, settings.image_verify)
+        archive = (
+            ImageArchive('data', settings.image_reuse_threshold, settings.image_archive_size)
+            if settings.image_reuse
+            else None
+        )
+        ai = AIChallengeSource(ai_service, verifier, settings.image_variants, archive)
+        if name == 'ai':
+            return ai
+
+    executor = CPUExecutor(settings.render_executor, settings.render_executor_workers, name='render')
+    local = LocalChallengeSource(executor, illusions=settings.local_illusions)
+    if name == 'local':
+        return local
+    return FallbackChallengeSource(ai, local)
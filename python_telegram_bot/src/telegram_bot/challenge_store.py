@@ -0,0 +1,323 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+import aiosqlite
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DELETE_ATTEMPTS = 3
+
+# Wall clock minus monotonic clock at startup, to convert between the two
+_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def monotonic_ns(moment: datetime) -> int:
+    """Convert a wall clock time to the monotonic clock of this process, in nanoseconds."""
+    return round(moment.timestamp() * 1e9) - _CLOCK_OFFSET_NS
+
+
+def wall_clock(ns: int) -> datetime:
+    """Convert a time on the monotonic clock of this process to the wall clock."""
+    return datetime.fromtimestamp((ns + _CLOCK_OFFSET_NS) / 1e9)
+
+
+@dataclass(slots=True)
+class Challenge:
+    """
+    Represents an optical illusion challenge for a user.
+
+    Times are integers on the monotonic clock (time.monotonic_ns()), so expiry checks compare integers
+    and are not affected by changes of the wall clock while the bot runs.
+    """
+
+    user_id: str
+    prompt: str
+    correct_answer: str  # "left", "right", "equal"
+    explanation: str  # Explanation of why the answer is correct
+    image_base64: str
+    created_ns: int
+    source: str = 'ai'  # Challenge source: "ai" (answer is the AI's opinion) or "local" (measured answer)
+    expires_ns: int | None = None  # Overrides the default challenge timeout, e.g. for daily challenges
+    detail: str = ''  # Image tier for AI challenges, illusion type for local ones
+
+    @property
+    def created_at(self) -> datetime:
+        return wall_clock(self.created_ns)
+
+    @property
+    def expires_at(self) -> datetime | None:
+        return wall_clock(self.expires_ns) if self.expires_ns is not None else None
+
+
+def _to_timestamp(ns: int) -> float:
+    """Wall clock timestamp stored in the database, which outlives the monotonic clock of this process."""
+    return (ns + _CLOCK_OFFSET_NS) / 1e9
+
+
+def _from_timestamp(timestamp: float) -> int:
+    return round(timestamp * 1e9) - _CLOCK_OFFSET_NS
+
+
+class ChallengeStore:
+    """
+    Active challenges persisted in SQLite with a small in-memory hot tier.
+
+    Every challenge is written through to data/challenges.db, so challenges survive restarts
+    and deploys. Only the most recently used challenges are kept in memory (LRU), and without
+    their image data, which is only needed when the challenge is sent.
+    """
+
+    def __init__(self, data_dir: str, hot_capacity: int = 256):
+        self.db_file = os.path.join(data_dir, 'challenges.db')
+        self.hot_capacity = hot_capacity
+        self._hot: OrderedDict[str, Challenge] = OrderedDict()
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+        # Held around every statement and its commit: the connection is shared by concurrent coroutines,
+        # and a commit fails while another coroutine's statement is in progress
+        self._statement_lock = asyncio.Lock()
+        self._taken: set[str] = set()  # Taken from the hot tier, deletion from disk still pending
+        self._pending_deletes: set[asyncio.Task] = set()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the long-lived database connection on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_file)
+                    await db.execute('PRAGMA journal_mode=WAL')
+                    await db.execute('PRAGMA synchronous=NORMAL')
+                    await db.execute("""
+                        CREATE TABLE IF NOT EXISTS active_challenges (
+                            chat_id TEXT PRIMARY KEY,
+                            prompt TEXT NOT NULL,
+                            correct_answer TEXT NOT NULL,
+                            explanation TEXT DEFAULT '',
+                            image_base64 TEXT DEFAULT '',
+                            created_at REAL NOT NULL,
+                            source TEXT NOT NULL DEFAULT 'ai',
+                            expires_at REAL,
+                            detail TEXT NOT NULL DEFAULT ''
+                        )
+                    """)
+                    async with db.execute('PRAGMA table_info(active_challenges)') as cursor:
+                        columns = {row[1] for row in await cursor.fetchall()}
+                    if 'source' not in columns:
+                        await db.execute("ALTER TABLE active_challenges ADD COLUMN source TEXT NOT NULL DEFAULT 'ai'")
+                    if 'expires_at' not in columns:
+                        await db.execute('ALTER TABLE active_challenges ADD COLUMN expires_at REAL')
+                    if 'detail' not in columns:
+                        await db.execute("ALTER TABLE active_challenges ADD COLUMN detail TEXT NOT NULL DEFAULT ''")
+                    await db.commit()
+                    self._db = db
+                    logger.info('[ChallengeStore] Database tables created/verified')
+        return self._db
+
+    @staticmethod
+    def _from_row(row: tuple) -> Challenge:
+        return Challenge(
+            user_id=row[0],
+            prompt=row[1],
+            correct_answer=row[2],
+            explanation=row[3],
+            image_base64='',
+            created_ns=_from_timestamp(row[4]),
+            source=row[5],
+            expires_ns=_from_timestamp(row[6]) if row[6] is not None else None,
+            detail=row[7],
+        )
+
+    def _remember(self, chat_id: str, challenge: Challenge) -> None:
+        """Put a challenge into the hot tier, evicting the least recently used one."""
+        self._hot[chat_id] = replace(challenge, image_base64='') if challenge.image_base64 else challenge
+        self._hot.move_to_end(chat_id)
+        while len(self._hot) > self.hot_capacity:
+            self._hot.popitem(last=False)
+
+    @staticmethod
+    def _to_row(chat_id: str, challenge: Challenge) -> tuple:
+        return (
+            chat_id,
+            challenge.prompt,
+            challenge.correct_answer,
+            challenge.explanation,
+            challenge.image_base64,
+            _to_timestamp(challenge.created_ns),
+            challenge.source,
+            _to_timestamp(challenge.expires_ns) if challenge.expires_ns is not None else None,
+            challenge.detail,
+        )
+
+    _INSERT = """
+        INSERT OR REPLACE INTO active_challenges
+            (chat_id, prompt, correct_answer, explanation, image_base64, created_at, source, expires_at, detail)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    @contextlib.asynccontextmanager
+    async def _locked(self):
+        """The database connection, for the exclusive use of one coroutine."""
+        db = await self._connection()
+        async with self._statement_lock:
+            yield db
+
+    async def put(self, chat_id: str, challenge: Challenge) -> None:
+        """Store a challenge, replacing any previous challenge of the chat."""
+        await self._wait_for_delete(chat_id)
+        async with self._locked() as db:
+            await db.execute(self._INSERT, self._to_row(chat_id, challenge))
+            await db.commit()
+        # The new challenge replaces one whose deletion failed
+        self._taken.discard(chat_id)
+        self._remember(chat_id, challenge)
+
+    async def put_many(self, challenges: list[tuple[str, Challenge]]) -> None:
+        """
+        Store challenges for many chats in one transaction, e.g. for a broadcast.
+
+        The challenges are not put into the hot tier, so they do not evict challenges of active players.
+        """
+        for chat_id, _ in challenges:
+            await self._wait_for_delete(chat_id)
+            self._hot.pop(chat_id, None)
+        async with self._locked() as db:
+            await db.executemany(self._INSERT, [self._to_row(chat_id, challenge) for chat_id, challenge in challenges])
+            await db.commit()
+        self._taken.difference_update(chat_id for chat_id, _ in challenges)
+
+    async def get(self, chat_id: str) -> Challenge | None:
+        """Get a challenge without its image data, from the hot tier or from the database."""
+        challenge = self._hot.get(chat_id)
+        if challenge is not None:
+            self._hot.move_to_end(chat_id)
+            return challenge
+        if chat_id in self._taken:
+            return None
+
+        async with (
+            self._locked() as db,
+            db.execute(
+                """
+                SELECT chat_id, prompt, correct_answer, explanation, created_at, source, expires_at, detail
+                FROM active_challenges
+                WHERE chat_id = ?
+            """,
+                (chat_id,),
+            ) as cursor,
+        ):
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+
+        challenge = self._from_row(row)
+        self._remember(chat_id, challenge)
+        return challenge
+
+    async def take(self, chat_id: str) -> Challenge | None:
+        """
+        Atomically remove a challenge and return it (without image data).
+
+        Concurrent callers for the same chat never both receive the challenge.
+
+        Returns:
+            The removed challenge, or None if there was none
+        """
+        challenge = self._hot.pop(chat_id, None)
+        if challenge is not None:
+            # Hot hit: answer from memory and delete from disk in the background
+            self._taken.add(chat_id)
+            task = asyncio.create_task(self._delete(chat_id))
+            self._pending_deletes.add(task)
+            task.add_done_callback(self._pending_deletes.discard)
+            return challenge
+        if chat_id in self._taken:
+            return None
+
+        async with self._locked() as db:
+            async with db.execute(
+                """
+                DELETE FROM active_challenges
+                WHERE chat_id = ?
+                RETURNING chat_id, prompt, correct_answer, explanation, created_at, source, expires_at, detail
+            """,
+                (chat_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+            await db.commit()
+        if row is None:
+            return None
+        return self._from_row(row)
+
+    async def _delete(self, chat_id: str) -> None:
+        """
+        Delete a challenge taken from the hot tier from disk, retrying on errors.
+
+        If every attempt fails, the chat stays in _taken, so the challenge left on disk is not
+        served again by this process.
+        """
+        for attempt in range(1, DELETE_ATTEMPTS + 1):
+            try:
+                async with self._locked() as db:
+                    await db.execute('DELETE FROM active_challenges WHERE chat_id = ?', (chat_id,))
+                    await db.commit()
+            except Exception as e:
+                logger.error(
+                    f'[ChallengeStore] Error deleting challenge for chat {chat_id} '
+                    f'(attempt {attempt}/{DELETE_ATTEMPTS}): {e}'
+                )
+                if attempt < DELETE_ATTEMPTS:
+                    await asyncio.sleep(0.1 * 2**attempt)
+            else:
+                self._taken.discard(chat_id)
+                return
+
+    async def _wait_for_delete(self, chat_id: str) -> None:
+        """Wait until a pending background delete of the chat's challenge has finished."""
+        while chat_id in self._taken and self._pending_deletes:
+            await asyncio.wait(set(self._pending_deletes))
+
+    async def delete_older_than(self, created_before: datetime, now: datetime | None = None) -> int:
+        """
+        Delete challenges created before the given time, and challenges with an expiry time that has passed.
+
+        Returns:
+            Number of deleted challenges
+        """
+        now = now or datetime.now()
+        now_ns, created_before_ns = monotonic_ns(now), monotonic_ns(created_before)
+
+        def expired(challenge: Challenge) -> bool:
+            if challenge.expires_ns is not None:
+                return challenge.expires_ns < now_ns
+            return challenge.created_ns < created_before_ns
+
+        for chat_id in [chat_id for chat_id, c in self._hot.items() if expired(c)]:
+            del self._hot[chat_id]
+        async with self._locked() as db:
+            cursor = await db.execute(
+                """
+                DELETE FROM active_challenges
+                WHERE (expires_at IS NULL AND created_at < ?) OR expires_at < ?
+            """,
+                (created_before.timestamp(), now.timestamp()),
+            )
+            await db.commit()
+        return cursor.rowcount
+
+    async def close(self) -> None:
+        """Finish pending deletes and close the database connection."""
+        if self._pending_deletes:
+            await asyncio.wait(set(self._pending_deletes))
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+        self._hot.clear()
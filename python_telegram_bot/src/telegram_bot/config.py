@@ -0,0 +1,356 @@
+"""
+Typed configuration of the bot.
+
+All settings are read once, from the environment and the .env file (the environment takes precedence), into
+one validated Settings object. Every setting is read from the environment variable named after its field in
+upper case, e.g. prompt_model from PROMPT_MODEL.
+
+Settings marked as reloadable (models, image parameters, timeouts, rate limits, ...) can be changed while
+the bot runs: edit .env and send SIGHUP. The others need a restart; changing them only logs a warning.
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import re
+import signal
+import types
+import typing
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field, fields, replace
+from typing import Any
+
+from dotenv import dotenv_values, find_dotenv
+
+from .cassette import CASSETTE_MODES
+from .executor import EXECUTOR_KINDS
+from .illusion_renderer import ILLUSIONS
+from .image_policy import BASE_SIZE, QUALITY_LEVELS
+from .image_verifier import VERIFY_MODES
+from .storage import STATS_BACKENDS
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHALLENGE_SOURCES = ('ai', 'local', 'auto')
+GENERATION_MODES = ('inline', 'queue')
+IMAGE_FORMATS = ('png', 'jpeg', 'webp')
+IMAGE_MODERATION_LEVELS = ('low', 'auto')
+_TRUE = {'1', 'true', 'yes', 'on'}
+_FALSE = {'0', 'false', 'no', 'off'}
+
+Check = Callable[[Any], str | None]
+
+
+class ConfigError(ValueError):
+    """Invalid settings; the message lists every problem."""
+
+
+def _one_of(choices: tuple) -> Check:
+    return lambda value: None if value in choices else f'expected one of {", ".join(map(str, choices))}'
+
+
+def _subset_of(choices: tuple) -> Check:
+    def check(value: tuple) -> str | None:
+        if not value:
+            return 'expected at least one value'
+        unknown = sorted(set(value) - set(choices))
+        return f'unknown values {", ".join(unknown)}, expected {", ".join(choices)}' if unknown else None
+
+    return check
+
+
+def _between(low: float, high: float | None = None) -> Check:
+    def check(value: float | None) -> str | None:
+        if value is None or (value >= low and (high is None or value <= high)):
+            return None
+        return f'expected at least {low}' if high is None else f'expected {low} to {high}'
+
+    return check
+
+
+def _positive(value: float) -> str | None:
+    return None if value > 0 else 'expected a positive number'
+
+
+def _image_size(value: str) -> str | None:
+    return None if value == 'auto' or re.fullmatch(r'\d+x\d+', value) else 'expected WIDTHxHEIGHT or auto'
+
+
+def _cassette_latency(value: str) -> str | None:
+    if value == 'recorded':
+        return None
+    try:
+        return None if float(value) >= 0 else 'expected "recorded" or a number of seconds'
+    except ValueError:
+        return 'expected "recorded" or a number of seconds'
+
+
+def setting(default: Any, check: Check | None = None, reloadable: bool = False, secret: bool = False) -> Any:
+    """
+    A field of Settings.
+
+    Args:
+        default: Value used when the environment variable is not set or empty
+        check: Validation of the parsed value, returning the problem or None
+        reloadable: Whether the setting can change while the bot runs
+        secret: The value is never logged
+    """
+    return field(default=default, metadata={'check': check, 'reloadable': reloadable, 'secret': secret})
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Settings of the bot; see .env.example for their meaning."""
+
+    # Credentials and connections
+    telegram_bot_token: str = setting('', secret=True)
+    ai_api_key: str = setting('', secret=True)
+    ai_base_url: str = setting('https://api.aitunnel.ru/v1')
+
+    # AI models and image parameters
+    prompt_model: str = setting('deepseek-r1', reloadable=True)
+    prompt_batch_size: int = setting(6, _between(1, 50), reloadable=True)
+    prompt_template_ratio: float = setting(0.0, _between(0, 1), reloadable=True)
+    image_model: str = setting('gpt-image-1-mini', reloadable=True)
+    image_quality: str = setting('low', _one_of((*QUALITY_LEVELS, 'auto')), reloadable=True)
+    image_size: str = setting(BASE_SIZE, _image_size, reloadable=True)
+    image_format: str = setting('png', _one_of(IMAGE_FORMATS), reloadable=True)
+    image_moderation: str = setting('low', _one_of(IMAGE_MODERATION_LEVELS), reloadable=True)
+    image_adaptive: bool = setting(True, reloadable=True)
+    image_overload_queue_depth: int = setting(4, _between(1), reloadable=True)
+    image_overload_latency: float = setting(60.0, _positive, reloadable=True)
+    image_variants: int = setting(1, _between(1, 10), reloadable=True)
+    # Only logs the pass rate by default: reject once the rate has been measured, the images are already paid for
+    image_verify: str = setting('log', _one_of(VERIFY_MODES), reloadable=True)
+    image_reuse: bool = setting(False)
+    image_reuse_threshold: float = setting(0.8, _between(0, 1), reloadable=True)
+    image_archive_size: int = setting(1000, _between(1))
+
+    # Challenge sources and executors
+    challenge_source: str = setting('auto', _one_of(CHALLENGE_SOURCES))
+    local_illusions: tuple[str, ...] = setting(ILLUSIONS, _subset_of(ILLUSIONS))
+    # Threads by default: process pools pickle the multi-MB payloads both ways, which costs more than the GIL
+    render_executor: str = setting('thread', _one_of(EXECUTOR_KINDS))
+    render_executor_workers: int = setting(2, _between(1))
+    cpu_executor: str = setting('thread', _one_of(EXECUTOR_KINDS))
+    cpu_executor_workers: int = setting(2, _between(1))
+
+    # Challenge generation in the bot process (inline) or in worker processes fed by a job queue (queue)
+    generation_mode: str = setting('inline', _one_of(GENERATION_MODES))
+    job_socket: str = setting(os.path.join('data', 'jobs.sock'))
+    job_lease_seconds: float = setting(300.0, _positive)
+    job_max_attempts: int = setting(3, _between(1))
+    job_poll_interval: float = setting(2.0, _positive)
+    worker_concurrency: int = setting(2, _between(1))
+
+    # Game
+    challenge_timeout_minutes: float = setting(10.0, _positive, reloadable=True)
+    leaderboard_size: int = setting(10, _between(1, 50), reloadable=True)
+    challenge_cache_size: int = setting(256, _between(1))
+    group_answer_window: int = setting(30, _between(1), reloadable=True)
+    seasons_kept: int | None = setting(None, _between(0), reloadable=True)
+    # At least the 30 days of the illusion statistics
+    rollup_days: int = setting(90, _between(30), reloadable=True)
+    stats_backend: str = setting('sqlite', _one_of(tuple(sorted(STATS_BACKENDS))))
+    daily_broadcast_time: datetime.time = setting(datetime.time(10, 0))
+    illusion_catalog_check_interval: float = setting(5.0, _between(0), reloadable=True)
+
+    # Bot API send rates
+    send_global_rate: float = setting(30.0, _positive, reloadable=True)
+    broadcast_rate: float = setting(25.0, _positive, reloadable=True)
+    send_chat_rate: float = setting(1.0, _positive, reloadable=True)
+    send_group_per_minute: float = setting(20.0, _positive, reloadable=True)
+
+    # Diagnostics
+    loop_lag_monitor: bool = setting(True)
+    loop_lag_threshold_ms: float = setting(100.0, _positive, reloadable=True)
+    tracing: bool = setting(True)
+    trace_file: str = setting(os.path.join('data', 'traces.jsonl'))
+    trace_file_max_mb: float = setting(10.0, _positive)
+    trace_file_backups: int = setting(5, _between(0))
+
+    # Recording and replaying AI responses
+    ai_cassette: str = setting('off', _one_of(CASSETTE_MODES))
+    ai_cassette_path: str = setting(os.path.join('data', 'cassette.db'))
+    ai_cassette_latency: str = setting('recorded', _cassette_latency)
+    ai_cassette_seed: int = setting(0)
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] | None = None) -> 'Settings':
+        """
+        Read and validate the settings.
+
+        Args:
+            environ: Variables to read, by default the environment over the values of the .env file
+
+        Raises:
+            ConfigError: If any value is invalid, listing all of them
+        """
+        if environ is None:
+            environ = {**read_env_file(find_dotenv()), **os.environ}
+        values = {}
+        errors = []
+        for setting_field in fields(cls):
+            name = setting_field.name.upper()
+            raw = environ.get(name, '').strip()
+            if not raw:
+                continue
+            try:
+                value = _parse(setting_field.type, raw)
+            except ValueError:
+                value = None
+                problem = f'expected {_type_name(setting_field.type)}'
+            else:
+                check = setting_field.metadata['check']
+                problem = check(value) if check is not None else None
+            if problem is not None:
+                shown = '***' if setting_field.metadata['secret'] else repr(raw)
+                errors.append(f'{name}={shown}: {problem}')
+            values[setting_field.name] = value
+        if errors:
+            raise ConfigError('Invalid settings: ' + '; '.join(errors))
+        return cls(**values)
+
+    def changes(self, other: 'Settings') -> list[str]:
+        """Names of the settings whose values differ in the other settings."""
+        return [f.name for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)]
+
+
+def is_reloadable(name: str) -> bool:
+    return Settings.__dataclass_fields__[name].metadata['reloadable']
+
+
+def read_env_file(path: str) -> dict[str, str]:
+    """Values of a .env file, without changing the environment; empty if there is no file."""
+    if not path or not os.path.exists(path):
+        return {}
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+def _parse(annotation: Any, raw: str) -> Any:
+    """Parse an environment variable into the type of a field."""
+    if isinstance(annotation, types.UnionType):  # Optional setting, e.g. int | None
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    if annotation is bool:
+        if raw.lower() in _TRUE:
+            return True
+        if raw.lower() in _FALSE:
+            return False
+        raise ValueError(raw)
+    if typing.get_origin(annotation) is tuple:
+        return tuple(item.strip() for item in raw.split(',') if item.strip())
+    if annotation is datetime.time:
+        return datetime.time.fromisoformat(raw)
+    return annotation(raw)
+
+
+def _type_name(annotation: Any) -> str:
+    if isinstance(annotation, types.UnionType):
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return {bool: 'true or false', int: 'an integer', float: 'a number', datetime.time: 'a time HH:MM'}.get(
+        annotation, 'a value'
+    )
+
+
+class RuntimeConfig:
+    """
+    The settings of the running bot.
+
+    reload() reads the .env file again and applies the changed reloadable settings: the new Settings
+    object replaces the old one and is passed to the subscribers, which update their state in place, so
+    work in progress finishes with the values it started with. Invalid files are rejected as a whole.
+    """
+
+    def __init__(self, settings: Settings, environ: Mapping[str, str] | None = None, env_file: str = ''):
+        """
+        Args:
+            settings: Initial settings
+            environ: Environment variables, which take precedence over the .env file on reload
+            env_file: The .env file read on reload
+        """
+        self.settings = settings
+        self.env_file = env_file
+        self.reloads = 0
+        self._environ = dict(environ or {})
+        self._subscribers: list[Callable[[Settings], None]] = []
+        self._reload_task: asyncio.Task | None = None
+
+    @classmethod
+    def load(cls, env_file: str | None = None) -> 'RuntimeConfig':
+        """
+        Read the settings from the environment and the .env file.
+
+        Raises:
+            ConfigError: If any value is invalid
+        """
+        env_file = find_dotenv() if env_file is None else env_file
+        environ = dict(os.environ)
+        settings = Settings.from_env({**read_env_file(env_file), **environ})
+        logger.info(f'[RuntimeConfig] Loaded settings from {env_file or "the environment"}')
+        return cls(settings, environ, env_file)
+
+    def subscribe(self, callback: Callable[[Settings], None]) -> None:
+        """Call the callback with the new settings after every reload that changes them."""
+        self._subscribers.append(callback)
+
+    def reload(self) -> list[str]:
+        """
+        Read the .env file again and apply the changed reloadable settings.
+
+        Returns:
+            Names of the settings that changed
+        """
+        return self.apply({**read_env_file(self.env_file), **self._environ})
+
+    def apply(self, environ: Mapping[str, str]) -> list[str]:
+        """Apply the reloadable settings of the given variables; the others keep their values."""
+        try:
+            new = Settings.from_env(environ)
+        except ConfigError as e:
+            logger.error(f'[RuntimeConfig] Reload rejected, keeping the current settings: {e}')
+            return []
+
+        changed = self.settings.changes(new)
+        restart = [name.upper() for name in changed if not is_reloadable(name)]
+        if restart:
+            logger.warning(f'[RuntimeConfig] Restart the bot to change {", ".join(restart)}')
+        changed = [name for name in changed if is_reloadable(name)]
+        if not changed:
+            logger.info('[RuntimeConfig] Reload found no changes to apply')
+            return []
+
+        self.settings = replace(self.settings, **{name: getattr(new, name) for name in changed})
+        self.reloads += 1
+        logger.info(f'[RuntimeConfig] Reloaded {", ".join(name.upper() for name in changed)}')
+        for callback in self._subscribers:
+            try:
+                callback(self.settings)
+            except Exception as e:
+                logger.error(f'[RuntimeConfig] Error applying reloaded settings in {callback!r}: {e}')
+        return changed
+
+    async def _reload_from_signal(self) -> None:
+        # The file is read off the event loop; the settings are applied on it
+        environ = await asyncio.to_thread(read_env_file, self.env_file)
+        self.apply({**environ, **self._environ})
+
+    def install_signal_handler(self) -> bool:
+        """Reload on SIGHUP; returns False where the platform has no SIGHUP."""
+        if not hasattr(signal, 'SIGHUP'):
+            return False
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self._on_sighup)
+        return True
+
+    def _on_sighup(self) -> None:
+        # Signals arriving while a reload runs are folded into it
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload_from_signal())
+
+    def remove_signal_handler(self) -> None:
+        if hasattr(signal, 'SIGHUP'):
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
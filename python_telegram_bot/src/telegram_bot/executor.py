@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+EXECUTOR_KINDS = ('thread', 'process', 'inline')
+
+
+class CPUExecutor:
+    """
+    Runs CPU-bound work (payload decoding, image processing) off the event loop.
+
+    The pool is pluggable: "thread" keeps payloads in-process (no copies, but the work still holds the GIL),
+    "process" runs it in worker processes (payloads are pickled, but the loop thread never competes for the GIL),
+    "inline" runs it directly on the loop, for tests and tools.
+    Functions run in a process pool must be picklable, i.e. defined at module level.
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 2, name: str = 'cpu'):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f'Unknown executor kind: {kind!r}, expected one of {list(EXECUTOR_KINDS)}')
+        self.kind = kind
+        self.workers = workers
+        self.name = name
+        self._pool: Executor | None = None
+
+    def _get_pool(self) -> Executor:
+        """Create the pool on first use, so idle executors cost nothing."""
+        if self._pool is None:
+            if self.kind == 'process':
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'{self.name}-executor')
+            logger.info(f'[CPUExecutor] Started {self.name} {self.kind} pool with {self.workers} workers')
+        return self._pool
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args) in the pool and return its result."""
+        if self.kind == 'inline':
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), func, *args)
+
+    async def close(self) -> None:
+        """Shut the pool down; queued work is cancelled."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def decode_image_response(content: bytes) -> tuple[str, bytes]:
+    """
+    Parse a raw images API response and decode the first image.
+
+    Args:
+        content: JSON body of the response
+
+    Returns:
+        (base64 image data, decoded image bytes); both empty if the response has no image
+    """
+    images, _ = decode_image_variants(content)
+    return images[0] if images else ('', b'')
+
+
+def decode_image_variants(content: bytes) -> tuple[list[tuple[str, bytes]], dict]:
+    """
+    Parse a raw images API response and decode all of its images.
+
+    Args:
+        content: JSON body of the response
+
+    Returns:
+        (list of (base64 image data, decoded image bytes) of the non-empty images, usage field of the response)
+    """
+    body = json.loads(content)
+    images = []
+    for item in body.get('data') or []:
+        image_base64 = item.get('b64_json') or ''
+        if not image_base64:
+            continue
+        try:
+            images.append((image_base64, base64.b64decode(image_base64)))
+        except binascii.Error as e:
+            raise ValueError(f'Invalid base64 image data: {e}') from e
+    return images, body.get('usage') or {}
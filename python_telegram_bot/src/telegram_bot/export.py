@@ -0,0 +1,106 @@
+"""
+Streaming export of the user statistics.
+
+Rows are read from the storage backend chunk by chunk and compressed as they arrive, so memory use
+stays constant however many users there are. The output is gzip-compressed CSV or NDJSON.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import zlib
+from collections.abc import AsyncIterator
+from typing import BinaryIO
+
+from .storage import StatsStorage
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ('user_id', 'username', 'total_challenges', 'correct_answers', 'accuracy')
+
+
+def _records(rows: list[tuple]) -> list[tuple]:
+    """Order the columns of storage rows for the export and add the accuracy."""
+    records = []
+    for user_id, total_challenges, correct_answers, username in rows:
+        accuracy = round(correct_answers / total_challenges * 100, 2) if total_challenges else 0.0
+        records.append((user_id, username, total_challenges, correct_answers, accuracy))
+    return records
+
+
+def encode_rows(rows: list[tuple], fmt: str, header: bool = False) -> bytes:
+    """
+    Encode a chunk of storage rows.
+
+    Args:
+        rows: (user_id, total_challenges, correct_answers, username) tuples
+        fmt: "csv" or "ndjson"
+        header: Start with the CSV header line
+
+    Returns:
+        UTF-8 encoded lines
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if header:
+            writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(_records(rows))
+        return buffer.getvalue().encode('utf-8')
+    return b''.join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, record)), ensure_ascii=False).encode('utf-8') + b'\n'
+        for record in _records(rows)
+    )
+
+
+class StatsExport:
+    """
+    One export of the user statistics as a stream of gzip data.
+
+    Iterate over the export to get the compressed chunks, or write it to a file with write_to().
+    """
+
+    def __init__(self, storage: StatsStorage, fmt: str = 'csv', chunk_size: int = 1000):
+        """
+        Args:
+            storage: Statistics storage backend
+            fmt: "csv" or "ndjson"
+            chunk_size: Users read, encoded and compressed at a time
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown export format: {fmt!r}, expected one of {list(EXPORT_FORMATS)}')
+        self.storage = storage
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.rows = 0  # Users exported so far
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        if self.fmt == 'csv':
+            # The header is written even if there are no users
+            yield compressor.compress(encode_rows([], self.fmt, header=True))
+        async for rows in self.storage.iter_users(self.chunk_size):
+            # Encoding and compression of a chunk run off the event loop
+            data = await asyncio.to_thread(lambda rows=rows: compressor.compress(encode_rows(rows, self.fmt)))
+            self.rows += len(rows)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    async def write_to(self, file: BinaryIO) -> int:
+        """
+        Write the compressed export to a binary file.
+
+        Returns:
+            Number of exported users
+        """
+        async for data in self:
+            await asyncio.to_thread(file.write, data)
+        logger.info(f'[StatsExport] Exported {self.rows} users as {self.fmt}')
+        return self.rows
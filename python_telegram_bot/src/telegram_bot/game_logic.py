@@ -1,82 +1,122 @@
 import asyncio
+import contextlib
 import logging
 import os
-from dataclasses import dataclass
-from datetime import datetime, timedelta
-
-import aiosqlite
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from .challenge_store import Challenge, ChallengeStore, monotonic_ns
+from .config import Settings
+from .storage import (
+    AnswerEvent,
+    DailyStats,
+    IllusionStats,
+    LeaderboardCursor,
+    LeaderboardPage,
+    create_stats_storage,
+)
+from .tracing import traced
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class DatabaseConnection:
-    """Async context manager for thread-safe database connections."""
+@dataclass(slots=True)
+class UserStats:
+    """Represents user statistics."""
+
+    total_challenges: int = 0
+    correct_answers: int = 0
+    username: str = ''  # Telegram username/nickname
+
 
-    def __init__(self, db_file: str, lock: asyncio.Lock):
-        self.db_file = db_file
-        self.lock = lock
-        self.db = None
+ANSWERS = ('left', 'right', 'equal')
 
-    async def __aenter__(self):
-        """Acquire lock and open database connection."""
-        await self.lock.acquire()
-        self.db = await aiosqlite.connect(self.db_file)
-        return self.db
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Close database connection and release lock."""
-        if self.db:
-            await self.db.close()
-        self.lock.release()
-        return False
+def broadcast_challenge_key(broadcast_id: int, chat_id: str) -> str:
+    """Key of a broadcast challenge in the challenge store, apart from the chat's own challenge."""
+    return f'{chat_id}:broadcast:{broadcast_id}'
 
 
 @dataclass
-class Challenge:
-    """Represents an optical illusion challenge for a user."""
+class GroupRound:
+    """Answers of a group chat to one challenge, collected until the answer window closes."""
 
-    user_id: str
-    prompt: str
-    correct_answer: str  # "left", "right", "equal"
-    explanation: str  # Explanation of why the answer is correct
-    image_base64: str
-    created_at: datetime
+    chat_id: str
+    deadline: datetime
+    message_id: int | None = None  # Message with the challenge and its buttons
+    # User id -> index of the answer in ANSWERS; only the first answer of a user counts
+    answers: dict[int, int] = field(default_factory=dict)
+    names: dict[int, str] = field(default_factory=dict)
 
 
 @dataclass
-class UserStats:
-    """Represents user statistics."""
+class GroupRoundResult:
+    """Outcome of a closed group round."""
 
-    total_challenges: int = 0
-    correct_answers: int = 0
-    username: str = ''  # Telegram username/nickname
+    challenge: Challenge
+    message_id: int | None
+    answers: dict[str, list[str]]  # Answer -> names of the users who gave it, in answer order
+    correct_users: int
+    total_users: int
 
 
 class GameLogic:
     """Manages game state and challenges for the optical illusion bot."""
 
-    def __init__(self, data_dir: str = 'data'):
-        self.active_challenges: dict[str, Challenge] = {}
+    def __init__(self, data_dir: str = 'data', stats_backend: str | None = None, settings: Settings | None = None):
+        settings = settings or Settings.from_env()
         self.user_stats: dict[str, UserStats] = {}
-        self.challenge_timeout = timedelta(minutes=10)
+        self.challenge_timeout = timedelta(minutes=settings.challenge_timeout_minutes)
+        self._timeout_ns = round(self.challenge_timeout.total_seconds() * 1e9)
+        self.leaderboard_size = settings.leaderboard_size
         self.data_dir = data_dir
-        self.db_file = os.path.join(data_dir, 'user_stats.db')
-        self._db_lock = asyncio.Lock()  # Database lock for thread-safe operations
+        self.stats_backend = stats_backend or settings.stats_backend
+        self.stats_version = 0  # Incremented after every stats write, used to invalidate cached leaderboards
 
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
 
+        # Active challenges survive restarts; only a few recent ones are kept in memory
+        self.active_challenges = ChallengeStore(data_dir, hot_capacity=settings.challenge_cache_size)
+        self._last_cleanup = datetime.now()
+
+        # In group chats one challenge is answered by everyone within the answer window
+        self.group_answer_window = timedelta(seconds=settings.group_answer_window)
+        self.group_rounds: dict[str, GroupRound] = {}
+
+        # Select the statistics storage backend ("sqlite" or "eventlog")
+        self.storage = create_stats_storage(self.stats_backend, data_dir)
+        logger.info(f'[GameLogic] Using {self.stats_backend} stats storage')
+
+        # Finished seasons kept in the archive, all of them if unset; older ones are pruned in the background
+        self.seasons_kept = settings.seasons_kept
+        self._prune_task: asyncio.Task | None = None
+        # Days of daily rollups kept; older days are pruned in the background once a day
+        self.rollup_days = settings.rollup_days
+        self._rollups_pruned_on: date | None = None
+        self._rollup_prune_task: asyncio.Task | None = None
+
         # Initialize database
         self._init_db()
 
+    def apply_settings(self, settings: Settings) -> None:
+        """Apply reloaded settings; group rounds already started keep their deadlines."""
+        self.challenge_timeout = timedelta(minutes=settings.challenge_timeout_minutes)
+        self._timeout_ns = round(self.challenge_timeout.total_seconds() * 1e9)
+        self.leaderboard_size = settings.leaderboard_size
+        self.group_answer_window = timedelta(seconds=settings.group_answer_window)
+        self.seasons_kept = settings.seasons_kept
+        self.rollup_days = settings.rollup_days
+
     def _init_db(self):
         """Initialize the database and create tables if they don't exist"""
         try:
             # Create tables synchronously
             async def init_tables():
-                await self._create_tables()
+                await self.storage.open()
 
             # Try to get the running loop, if it exists
             try:
@@ -90,60 +130,38 @@ class GameLogic:
         except Exception as e:
             logger.error(f'[GameLogic] Error initializing database: {e}')
 
-    async def _create_tables(self):
-        """Create database tables and run migrations"""
-        async with DatabaseConnection(self.db_file, self._db_lock) as db:
-            # Create table if not exists
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_stats (
-                    user_id TEXT PRIMARY KEY,
-                    total_challenges INTEGER DEFAULT 0,
-                    correct_answers INTEGER DEFAULT 0,
-                    username TEXT DEFAULT ''
-                )
-            """)
-
-            # Check if username column exists, if not add it (migration)
-            async with db.execute('PRAGMA table_info(user_stats)') as cursor:
-                columns = await cursor.fetchall()
-                column_names = [col[1] for col in columns]
-
-                if 'username' not in column_names:
-                    logger.info('[GameLogic] Adding username column to user_stats table')
-                    await db.execute("ALTER TABLE user_stats ADD COLUMN username TEXT DEFAULT ''")
-
-            await db.commit()
-            logger.info('[GameLogic] Database tables created/verified')
-
-    async def _save_stats(self, user_id: str):
-        """Save user statistics to database"""
+    async def close(self) -> None:
+        """Flush pending statistics writes and close the storage backends."""
+        # Pruning is resumed after the next reset, and on the next day for the rollups
+        for task in (self._prune_task, self._rollup_prune_task):
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        await self.storage.close()
+        await self.active_challenges.close()
+
+    @traced()
+    async def _save_stats(self, event: AnswerEvent):
+        """Save user statistics to the storage backend"""
+        user_id = event.user_id
         try:
-            async with DatabaseConnection(self.db_file, self._db_lock) as db:
-                # Use INSERT OR REPLACE to handle both new and existing users
-                await db.execute(
-                    """
-                    INSERT OR REPLACE INTO user_stats (user_id, total_challenges, correct_answers, username)
-                    VALUES (?, ?, ?, ?)
-                """,
-                    (
-                        user_id,
-                        self.user_stats[user_id].total_challenges,
-                        self.user_stats[user_id].correct_answers,
-                        self.user_stats[user_id].username,
-                    ),
-                )
-                await db.commit()
+            await self.storage.record_answer(event)
+            self.stats_version += 1
             logger.info(f'[GameLogic] Saved stats for user {user_id}')
         except Exception as e:
             logger.error(f'[GameLogic] Error saving stats for user {user_id}: {e}')
 
-    def start_challenge(
+    @traced()
+    async def start_challenge(
         self,
         user_id: str,
         prompt: str,
         correct_answer: str,
         explanation: str,
         image_base64: str,
+        source: str = 'ai',
+        detail: str = '',
     ) -> None:
         """
         Start a new challenge for a user.
@@ -154,6 +172,8 @@ class GameLogic:
             correct_answer: The correct answer ("first", "second", or "equal")
             explanation: Explanation of why the answer is correct
             image_base64: The base64 encoded image data
+            source: Challenge source, "ai" or "local"
+            detail: Image tier for AI challenges, illusion type for local ones
         """
         logger.info(f'[GameLogic] Starting challenge for user {user_id}')
 
@@ -163,13 +183,53 @@ class GameLogic:
             correct_answer=correct_answer,
             explanation=explanation,
             image_base64=image_base64,
-            created_at=datetime.now(),
+            created_ns=time.monotonic_ns(),
+            source=source,
+            detail=detail,
         )
 
-        self.active_challenges[user_id] = challenge
+        await self.active_challenges.put(user_id, challenge)
         logger.info(f'[GameLogic] Challenge started for user {user_id} with answer: {correct_answer}')
 
-    def check_answer(self, user_id: str, user_answer: str) -> bool:
+        # Expired challenges are only removed from disk, so purge them once per timeout period
+        if datetime.now() - self._last_cleanup >= self.challenge_timeout:
+            await self.cleanup_expired_challenges()
+        if self._rollups_pruned_on != date.today():
+            self._rollups_pruned_on = date.today()
+            self._rollup_prune_task = asyncio.create_task(self._prune_rollups())
+
+    @traced()
+    async def start_broadcast_challenges(
+        self,
+        broadcast_id: int,
+        chat_ids: list[str],
+        prompt: str,
+        correct_answer: str,
+        explanation: str,
+        source: str,
+        expires_at: datetime,
+    ) -> None:
+        """
+        Start the same challenge in many chats at once, e.g. the daily illusion.
+
+        The challenges are stored under broadcast_challenge_key(), so a challenge the chat is solving is
+        kept, and are answered with take_broadcast_challenge() until expires_at. No image is stored:
+        broadcast images are sent by Telegram file_id.
+        """
+        created_ns, expires_ns = time.monotonic_ns(), monotonic_ns(expires_at)
+        await self.active_challenges.put_many(
+            [
+                (
+                    broadcast_challenge_key(broadcast_id, chat_id),
+                    Challenge(chat_id, prompt, correct_answer, explanation, '', created_ns, source, expires_ns),
+                )
+                for chat_id in chat_ids
+            ]
+        )
+        logger.info(f'[GameLogic] Started broadcast challenge in {len(chat_ids)} chats until {expires_at}')
+
+    @traced()
+    async def check_answer(self, user_id: str, user_answer: str) -> bool:
         """
         Check a user's answer and remove the challenge.
 
@@ -182,20 +242,38 @@ class GameLogic:
         """
         logger.info(f'[GameLogic] Checking answer for user {user_id}: {user_answer}')
 
-        if user_id in self.active_challenges:
-            challenge = self.active_challenges[user_id]
+        # Remove the challenge while checking
+        # Note: Don't record answer here - let the bot handle it with username
+        challenge = await self.active_challenges.take(user_id)
+        if challenge is not None:
             is_correct = challenge.correct_answer == user_answer
             logger.info(f'[GameLogic] User {user_id} answer is {"correct" if is_correct else "incorrect"}')
-
-            # Remove the challenge after checking
-            # Note: Don't record answer here - let the bot handle it with username
-            del self.active_challenges[user_id]
             return is_correct
 
         logger.info(f'[GameLogic] No active challenge found for user {user_id}')
         return False
 
-    def record_answer(self, user_id: str, is_correct: bool, username: str = '') -> None:
+    @staticmethod
+    def _answer_event(
+        user_id: str, is_correct: bool, username: str, chat_id: str, answer: str, challenge: Challenge | None
+    ) -> AnswerEvent:
+        """Build the stored answer, with the challenge's metadata for the answer history."""
+        event = AnswerEvent(user_id=user_id, is_correct=is_correct, username=username, chat_id=chat_id, answer=answer)
+        if challenge is not None:
+            event.correct_answer = challenge.correct_answer
+            event.source = challenge.source
+            event.detail = challenge.detail
+        return event
+
+    def record_answer(
+        self,
+        user_id: str,
+        is_correct: bool,
+        username: str = '',
+        chat_id: str = '',
+        answer: str = '',
+        challenge: Challenge | None = None,
+    ) -> None:
         """
         Record a user's answer for statistics.
 
@@ -203,6 +281,9 @@ class GameLogic:
             user_id: Telegram user ID
             is_correct: Whether the answer was correct
             username: Telegram username or first name
+            chat_id: Chat the challenge was answered in
+            answer: The answer the user gave
+            challenge: The answered challenge, for the answer history and the illusion stats
         """
         # Initialize user stats if not exists
         if user_id not in self.user_stats:
@@ -221,8 +302,10 @@ class GameLogic:
         logger.info(f'[GameLogic] Updated stats for user {user_id}: {self.user_stats[user_id]}')
 
         # Save stats to database
+        event = self._answer_event(user_id, is_correct, username, chat_id, answer, challenge)
+
         async def save_stats_async():
-            await self._save_stats(user_id)
+            await self._save_stats(event)
 
         # Try to get the running loop, if it exists
         try:
@@ -234,6 +317,111 @@ class GameLogic:
             loop = asyncio.new_event_loop()
             loop.run_until_complete(save_stats_async())
 
+    @traced()
+    async def record_answers(
+        self,
+        answers: list[tuple[str, bool, str]],
+        chat_id: str = '',
+        challenge: Challenge | None = None,
+        given: dict[str, str] | None = None,
+    ) -> None:
+        """
+        Record several answers for statistics and save them in one batch.
+
+        Args:
+            answers: Tuples of Telegram user ID, whether the answer was correct, and username
+            chat_id: Chat the challenge was answered in
+            challenge: The answered challenge, for the answer history and the illusion stats
+            given: The answer each user gave, by Telegram user ID
+        """
+        given = given or {}
+        batch = []
+        for user_id, is_correct, username in answers:
+            # Users not answered since startup are loaded first, so their stored totals are kept
+            stats = await self.get_user_stats(user_id)
+            self.user_stats[user_id] = stats
+            stats.total_challenges += 1
+            if is_correct:
+                stats.correct_answers += 1
+            if username:
+                stats.username = username
+            batch.append(self._answer_event(user_id, is_correct, username, chat_id, given.get(user_id, ''), challenge))
+
+        try:
+            await self.storage.record_answers(batch)
+            self.stats_version += 1
+            logger.info(f'[GameLogic] Saved stats for {len(batch)} users in one batch')
+        except Exception as e:
+            logger.error(f'[GameLogic] Error saving stats batch of {len(batch)} users: {e}')
+
+    def start_group_round(self, chat_id: str, message_id: int | None = None) -> GroupRound:
+        """
+        Start collecting answers of a group chat to its active challenge.
+
+        Args:
+            chat_id: Telegram chat ID
+            message_id: ID of the message with the challenge
+
+        Returns:
+            The new round
+        """
+        group_round = GroupRound(chat_id, datetime.now() + self.group_answer_window, message_id)
+        self.group_rounds[chat_id] = group_round
+        logger.info(f'[GameLogic] Started group round in chat {chat_id} until {group_round.deadline}')
+        return group_round
+
+    def add_group_answer(self, chat_id: str, user_id: int, answer: str, username: str = '') -> bool | None:
+        """
+        Register a user's answer in the chat's group round.
+
+        Returns:
+            True if the answer was accepted, False if the user has already answered or the window has closed,
+            None if the chat has no group round
+        """
+        group_round = self.group_rounds.get(chat_id)
+        if group_round is None:
+            return None
+        if user_id in group_round.answers or datetime.now() > group_round.deadline or answer not in ANSWERS:
+            return False
+        group_round.answers[user_id] = ANSWERS.index(answer)
+        group_round.names[user_id] = username
+        return True
+
+    @traced()
+    async def close_group_round(self, chat_id: str) -> GroupRoundResult | None:
+        """
+        Close the chat's group round, remove its challenge and record all answers in one batch.
+
+        Returns:
+            The result of the round, or None if there was no round or its challenge is gone
+        """
+        group_round = self.group_rounds.pop(chat_id, None)
+        challenge = await self.active_challenges.take(chat_id)
+        if group_round is None or challenge is None:
+            return None
+
+        answers: dict[str, list[str]] = {answer: [] for answer in ANSWERS}
+        batch = []
+        given = {}
+        for user_id, code in group_round.answers.items():
+            answer = ANSWERS[code]
+            username = group_round.names.get(user_id, '')
+            answers[answer].append(username or 'Anonymous')
+            batch.append((str(user_id), answer == challenge.correct_answer, username))
+            given[str(user_id)] = answer
+        if batch:
+            await self.record_answers(batch, chat_id, challenge, given)
+
+        logger.info(f'[GameLogic] Closed group round in chat {chat_id} with {len(batch)} answers')
+        return GroupRoundResult(
+            challenge=challenge,
+            message_id=group_round.message_id,
+            answers=answers,
+            correct_users=len(answers.get(challenge.correct_answer, [])),
+            total_users=len(batch),
+        )
+
+    @traced()
     async def get_user_stats(self, user_id: str) -> UserStats:
         """
         Get user statistics.
@@ -250,31 +438,58 @@ class GameLogic:
 
         # If not in memory, try to load from database
         try:
-            async with DatabaseConnection(self.db_file, self._db_lock) as db:
-                async with db.execute(
-                    """
-                    SELECT total_challenges, correct_answers, username
-                    FROM user_stats
-                    WHERE user_id = ?
-                """,
-                    (user_id,),
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        stats = UserStats(
-                            total_challenges=row[0],
-                            correct_answers=row[1],
-                            username=row[2] if len(row) > 2 else '',
-                        )
-                        self.user_stats[user_id] = stats  # Cache in memory
-                        return stats
+            row = await self.storage.load_user(user_id)
+            if row:
+                stats = UserStats(
+                    total_challenges=row.total_challenges,
+                    correct_answers=row.correct_answers,
+                    username=row.username,
+                )
+                self.user_stats[user_id] = stats  # Cache in memory
+                return stats
         except Exception as e:
             logger.error(f'[GameLogic] Error loading stats for user {user_id}: {e}')
 
         # If no stats found, return default
         return UserStats()
 
-    def get_active_challenge(self, user_id: str) -> Challenge | None:
+    @traced()
+    async def get_daily_stats(self, user_id: str, days: int = 7) -> list[DailyStats]:
+        """
+        Get the user's answers per day from the daily rollup.
+
+        Args:
+            user_id: Telegram user ID
+            days: Number of days up to and including today
+
+        Returns:
+            The days with answers, oldest first (empty on errors)
+        """
+        try:
+            return await self.storage.get_daily_stats(user_id, days)
+        except Exception as e:
+            logger.error(f'[GameLogic] Error getting daily stats for user {user_id}: {e}')
+            return []
+
+    @traced()
+    async def get_illusion_stats(self, days: int | None = None) -> list[IllusionStats]:
+        """
+        Get the accuracy per illusion type from the daily illusion rollup.
+
+        Args:
+            days: Number of days up to and including today, or None for all time
+
+        Returns:
+            Illusion types, most answered first (empty on errors)
+        """
+        try:
+            return await self.storage.get_illusion_stats(days)
+        except Exception as e:
+            logger.error(f'[GameLogic] Error getting illusion stats: {e}')
+            return []
+
+    @traced()
+    async def get_active_challenge(self, user_id: str) -> Challenge | None:
         """
         Get the active challenge for a user without removing it.
 
@@ -284,31 +499,56 @@ class GameLogic:
         Returns:
             Challenge object if active challenge exists, None otherwise
         """
-        if user_id in self.active_challenges:
-            challenge = self.active_challenges[user_id]
-            if not self._is_challenge_expired(challenge):
-                logger.info(f'[GameLogic] Found active challenge for user {user_id}')
-                return challenge
+        challenge = await self.active_challenges.get(user_id)
+        if challenge is not None and not self._is_challenge_expired(challenge):
+            logger.info(f'[GameLogic] Found active challenge for user {user_id}')
+            return challenge
 
         logger.info(f'[GameLogic] No active challenge found for user {user_id}')
         return None
 
-    def cleanup_expired_challenges(self) -> None:
-        """Clean up all expired challenges."""
-        logger.info('[GameLogic] Cleaning up expired challenges')
+    @traced()
+    async def take_active_challenge(self, user_id: str) -> Challenge | None:
+        """
+        Remove and return the active challenge for a user.
+
+        Only one of several concurrent callers receives the challenge, so a challenge
+        is never answered twice.
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            Challenge object if active challenge exists, None otherwise
+        """
+        challenge = await self.active_challenges.take(user_id)
+        if challenge is not None and not self._is_challenge_expired(challenge):
+            logger.info(f'[GameLogic] Took active challenge for user {user_id}')
+            return challenge
 
-        now = datetime.now()
-        expired_users = []
+        logger.info(f'[GameLogic] No active challenge found for user {user_id}')
+        return None
+
+    async def take_broadcast_challenge(self, broadcast_id: int, chat_id: str) -> Challenge | None:
+        """
+        Remove and return a chat's challenge of a broadcast, like take_active_challenge().
+
+        Args:
+            broadcast_id: ID of the broadcast
+            chat_id: Telegram chat ID
+
+        Returns:
+            Challenge object if the broadcast challenge is still active, None otherwise
+        """
+        return await self.take_active_challenge(broadcast_challenge_key(broadcast_id, chat_id))
 
-        for user_id, challenge in self.active_challenges.items():
-            if self._is_challenge_expired(challenge):
-                logger.info(f'[GameLogic] Removing expired challenge for user {user_id}')
-                expired_users.append(user_id)
+    @traced()
+    async def cleanup_expired_challenges(self) -> None:
+        """Clean up all expired challenges."""
+        logger.info('[GameLogic] Cleaning up expired challenges')
 
-        removed_count = 0
-        for user_id in expired_users:
-            del self.active_challenges[user_id]
-            removed_count += 1
+        self._last_cleanup = datetime.now()
+        removed_count = await self.active_challenges.delete_older_than(self._last_cleanup - self.challenge_timeout)
 
         logger.info(f'[GameLogic] Cleaned up {removed_count} expired challenges')
 
@@ -322,106 +562,133 @@ class GameLogic:
         Returns:
             True if the challenge has expired, False otherwise
         """
-        now = datetime.now()
-        duration = now - challenge.created_at
-        expired = duration >= self.challenge_timeout
+        now = time.monotonic_ns()
+        if challenge.expires_ns is not None:
+            return now >= challenge.expires_ns
+        age = now - challenge.created_ns
+        expired = age >= self._timeout_ns
 
         if expired:
-            logger.info(f'[GameLogic] Challenge expired, created {duration.total_seconds() / 60:.1f} minutes ago')
+            logger.info(f'[GameLogic] Challenge expired, created {age / 6e10:.1f} minutes ago')
 
         return expired
 
-    async def get_leaderboard(self, user_id: str, limit: int = 10) -> dict:
+    @traced()
+    async def get_leaderboard(self, user_id: str, limit: int | None = None) -> dict:
         """
         Get leaderboard with top users and current user's position.
 
         Args:
             user_id: Current user's Telegram user ID
-            limit: Number of top users to retrieve (default: 10)
+            limit: Number of top users to retrieve (default: LEADERBOARD_SIZE)
 
         Returns:
             Dictionary with 'top_users' (list of tuples: rank, user_id, username, score, accuracy)
             and 'user_rank' (tuple: rank, user_id, username, score, accuracy) or None
         """
         try:
-            async with DatabaseConnection(self.db_file, self._db_lock) as db:
-                # Get top users ordered by correct answers descending
-                top_users = []
-                async with db.execute(
-                    """
-                    SELECT user_id, username, total_challenges, correct_answers
-                    FROM user_stats
-                    WHERE total_challenges > 0
-                    ORDER BY correct_answers DESC, total_challenges ASC
-                    LIMIT ?
-                """,
-                    (limit,),
-                ) as cursor:
-                    rank = 1
-                    async for row in cursor:
-                        user_id_db, username, total_challenges, correct_answers = row
-                        accuracy = (correct_answers / total_challenges * 100) if total_challenges > 0 else 0
-                        top_users.append((rank, user_id_db, username or 'Anonymous', correct_answers, accuracy))
-                        rank += 1
-
-                # Get current user's rank
-                user_rank = None
-                if user_id:
-                    # Get user's stats
-                    async with db.execute(
-                        """
-                        SELECT total_challenges, correct_answers, username
-                        FROM user_stats
-                        WHERE user_id = ?
-                    """,
-                        (user_id,),
-                    ) as cursor:
-                        user_row = await cursor.fetchone()
-
-                    if user_row and user_row[0] > 0:  # If user has completed challenges
-                        total_challenges, correct_answers, username = user_row
-                        accuracy = (correct_answers / total_challenges * 100) if total_challenges > 0 else 0
-
-                        # Get user's rank
-                        async with db.execute(
-                            """
-                            SELECT COUNT(*) + 1
-                            FROM user_stats
-                            WHERE total_challenges > 0 AND (
-                                correct_answers > ? OR
-                                (correct_answers = ? AND total_challenges < ?)
-                            )
-                        """,
-                            (correct_answers, correct_answers, total_challenges),
-                        ) as cursor:
-                            rank_row = await cursor.fetchone()
-                            rank = rank_row[0] if rank_row else 1
-
-                        user_rank = (rank, user_id, username or 'Anonymous', correct_answers, accuracy)
-
-                logger.info(f'[GameLogic] Retrieved leaderboard: {len(top_users)} top users')
-                return {'top_users': top_users, 'user_rank': user_rank}
+            if limit is None:
+                limit = self.leaderboard_size
+            leaderboard = await self.storage.get_leaderboard(user_id, limit)
+            logger.info(f'[GameLogic] Retrieved leaderboard: {len(leaderboard["top_users"])} top users')
+            return leaderboard
 
         except Exception as e:
             logger.error(f'[GameLogic] Error getting leaderboard: {e}')
             return {'top_users': [], 'user_rank': None}
 
+    @traced()
+    async def get_user_rank(self, user_id: str) -> tuple | None:
+        """
+        Get the user's leaderboard position.
+
+        Returns:
+            Tuple (rank, user_id, username, score, accuracy), or None if the user has no completed challenges
+        """
+        leaderboard = await self.get_leaderboard(user_id, limit=0)
+        return leaderboard['user_rank']
+
+    @traced()
+    async def get_leaderboard_page(
+        self,
+        after: LeaderboardCursor | None = None,
+        before: LeaderboardCursor | None = None,
+        page_size: int = 10,
+    ) -> LeaderboardPage:
+        """
+        Get a leaderboard page with keyset pagination, so deep pages cost the same as the first one.
+
+        Args:
+            after: Cursor of the last row of the previous page (first page if neither cursor is given)
+            before: Cursor of the first row of the next page
+            page_size: Number of users per page
+
+        Returns:
+            LeaderboardPage object (empty on errors)
+        """
+        try:
+            return await self.storage.get_leaderboard_page(after=after, before=before, page_size=page_size)
+        except Exception as e:
+            logger.error(f'[GameLogic] Error getting leaderboard page: {e}')
+            return LeaderboardPage(entries=[])
+
+    @traced()
+    async def get_user_leaderboard_page(self, user_id: str, page_size: int = 10) -> LeaderboardPage | None:
+        """
+        Get the leaderboard page containing the user.
+
+        Args:
+            user_id: Telegram user ID
+            page_size: Number of users per page
+
+        Returns:
+            LeaderboardPage object, or None if the user has no completed challenges
+        """
+        try:
+            return await self.storage.get_user_leaderboard_page(user_id, page_size=page_size)
+        except Exception as e:
+            logger.error(f'[GameLogic] Error getting leaderboard page for user {user_id}: {e}')
+            return None
+
+    @property
+    def season(self) -> int:
+        """Current leaderboard season."""
+        return self.storage.season
+
+    @traced()
     async def reset_leaderboard(self) -> None:
         """
-        Reset the entire leaderboard - delete all user statistics.
-        This is a destructive operation that cannot be undone.
+        Reset the leaderboard by starting a new season, in constant time.
+
+        The statistics of the finished season are archived; when SEASONS_KEPT is set,
+        older seasons are pruned in the background.
         """
         try:
-            async with DatabaseConnection(self.db_file, self._db_lock) as db:
-                # Delete all records from user_stats table
-                await db.execute('DELETE FROM user_stats')
-                await db.commit()
-                logger.warning('[GameLogic] All user statistics have been deleted from database')
+            await self.storage.reset()
+            logger.warning(f'[GameLogic] Started leaderboard season {self.storage.season}')
 
             # Clear in-memory cache
             self.user_stats.clear()
+            self.stats_version += 1
             logger.warning('[GameLogic] In-memory user stats cache cleared')
 
         except Exception as e:
             logger.error(f'[GameLogic] Error resetting leaderboard: {e}')
             raise
+
+        if self.seasons_kept is not None and (self._prune_task is None or self._prune_task.done()):
+            self._prune_task = asyncio.create_task(self._prune_seasons())
+
+    async def _prune_seasons(self) -> None:
+        try:
+            pruned = await self.storage.prune_seasons(self.seasons_kept)
+            logger.info(f'[GameLogic] Pruned {pruned} old seasons')
+        except Exception as e:
+            logger.error(f'[GameLogic] Error pruning old seasons: {e}')
+
+    async def _prune_rollups(self) -> None:
+        try:
+            pruned = await self.storage.prune_rollups(self.rollup_days)
+            logger.info(f'[GameLogic] Pruned {pruned} daily rollup rows older than {self.rollup_days} days')
+        except Exception as e:
+            logger.error(f'[GameLogic] Error pruning old daily rollups: {e}')
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import socket
+
+from .challenge_source import ChallengeGenerationError, ChallengeSource
+from .job_queue import Job, JobNotifier, JobQueue
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class GenerationWorker:
+    """
+    Generates the challenges of queued jobs with a challenge source, outside the bot process.
+
+    Every worker process runs `concurrency` jobs at a time; more capacity is added by starting more
+    processes, on this machine or any other sharing the data directory.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        source: ChallengeSource,
+        notifier: JobNotifier,
+        concurrency: int = 2,
+        poll_interval: float = 2.0,
+        name: str | None = None,
+    ):
+        """
+        Args:
+            queue: Job queue shared with the bot
+            source: Challenge source generating the challenges
+            notifier: Sends progress and finished jobs to the bot
+            concurrency: Jobs generated at the same time
+            poll_interval: Seconds between checks of an empty queue
+            name: Worker name recorded with its leases, by default host and process id
+        """
+        self.queue = queue
+        self.source = source
+        self.notifier = notifier
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.completed = 0
+        self.failed = 0
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Generate jobs until stop() is called; jobs in progress are finished first."""
+        logger.info(f'[GenerationWorker] {self.name} generating {self.concurrency} challenges at a time')
+        await asyncio.gather(*(self._run_slot() for _ in range(self.concurrency)))
+        logger.info(f'[GenerationWorker] {self.name} stopped: {self.completed} completed, {self.failed} failed')
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _run_slot(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job, expired = await self.queue.lease(self.name)
+            except Exception as e:
+                logger.error(f'[GenerationWorker] Error leasing a job: {e}')
+                job, expired = None, []
+            for job_id in expired:
+                await self.notifier.notify(job_id, 'finished')
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+            await self.process(job)
+
+    async def process(self, job: Job) -> None:
+        """Generate the challenge of a leased job and store it, or record the failed attempt."""
+
+        async def on_progress(stage: str):
+            # A slow stage renews the lease, so the job is not taken over while it makes progress
+            await self.queue.extend(job.id, self.name)
+            await self.notifier.notify(
+                job.id, 'progress', stage=stage, chat_id=job.chat_id, message_id=job.status_message_id
+            )
+
+        try:
+            generated = await self.source.generate(on_progress)
+        except Exception as e:
+            if isinstance(e, ChallengeGenerationError):
+                error = str(e)  # Already a message for the user
+            else:
+                logger.error(f'[GenerationWorker] Error generating job {job.id}: {e}')
+                error = f'Извините, при генерации иллюзии произошла ошибка: {e}. Пожалуйста, попробуйте еще раз.'
+            if not await self.queue.fail(job.id, self.name, error):
+                logger.info(f'[GenerationWorker] Job {job.id} will be retried after attempt {job.attempts}')
+                return
+            self.failed += 1
+        else:
+            if not await self.queue.complete(job.id, self.name, generated):
+                return
+            self.completed += 1
+            logger.info(f'[GenerationWorker] Job {job.id} for chat {job.chat_id} generated by {generated.source}')
+        await self.notifier.notify(job.id, 'finished')
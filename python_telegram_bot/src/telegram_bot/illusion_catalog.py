@@ -0,0 +1,241 @@
+"""
+Catalog of the illusions served by the random illusion button.
+
+The catalog file (data/illusion_urls.txt) is reloaded when it changes, without restarting the bot,
+and every user walks through the whole catalog in a random order of their own before any illusion repeats.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shuffle cursors of the least recently drawing users are forgotten beyond this many users
+MAX_TRACKED_USERS = 100000
+
+_FEISTEL_ROUNDS = 4
+
+
+@dataclass(frozen=True, slots=True)
+class IllusionEntry:
+    """An illusion of the catalog."""
+
+    url: str
+    description: str = ''
+    title: str = ''
+    author: str = ''
+    tags: tuple[str, ...] = ()
+    meta: dict = field(default_factory=dict, compare=False)  # Other fields of a JSON entry
+
+
+def parse_catalog(text: str) -> list[IllusionEntry]:
+    """
+    Parse a catalog file.
+
+    Every line is an entry: either "URL|Description" (the description is optional), or a JSON object
+    with "url" and optionally "description", "title", "author", "tags" and any other metadata.
+    Empty lines and lines starting with "#" are ignored, and so are repeated URLs.
+    """
+    entries = []
+    seen = set()
+    for number, raw_line in enumerate(text.splitlines(), 1):
+        line = raw_line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                data = json.loads(line)
+                entry = IllusionEntry(
+                    url=data.pop('url'),
+                    description=data.pop('description', ''),
+                    title=data.pop('title', ''),
+                    author=data.pop('author', ''),
+                    tags=tuple(data.pop('tags', ())),
+                    meta=data,
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f'[IllusionCatalog] Skipping invalid entry on line {number}: {e}')
+                continue
+        else:
+            url, _, description = line.partition('|')
+            entry = IllusionEntry(url.strip(), description.strip())
+        if entry.url in seen:
+            continue
+        seen.add(entry.url)
+        entries.append(entry)
+    return entries
+
+
+def _round_function(value: int, seed: int, round_number: int, mask: int) -> int:
+    """Mix a half block with the seed (a multiply-xorshift hash)."""
+    value = (value ^ seed ^ (round_number * 0x9E3779B97F4A7C15)) & 0xFFFFFFFFFFFFFFFF
+    value = (value * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value ^= value >> 31
+    value = (value * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    value ^= value >> 29
+    return value & mask
+
+
+def shuffled_index(position: int, size: int, seed: int) -> int:
+    """
+    Position of a random permutation of range(size) chosen by the seed, in O(1) time and memory.
+
+    A Feistel network is a permutation of the smallest power-of-four domain containing the range;
+    values outside the range are mapped again (cycle walking), which takes fewer than four steps on average.
+    """
+    if size <= 1:
+        return 0
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half_bits) - 1
+    value = position
+    while True:
+        left, right = value >> half_bits, value & mask
+        for round_number in range(_FEISTEL_ROUNDS):
+            left, right = right, left ^ _round_function(right, seed, round_number, mask)
+        value = (left << half_bits) | right
+        if value < size:
+            return value
+
+
+class ShuffleCursor:
+    """A user's position in their own random order of the catalog: a permutation seed and a counter."""
+
+    __slots__ = ('last_url', 'position', 'seed', 'version')
+
+    def __init__(self, seed: int, version: int):
+        self.seed = seed
+        self.version = version  # Catalog version the order is over
+        self.position = 0
+        self.last_url = ''
+
+
+class IllusionCatalog:
+    """
+    Illusions of the catalog file, reloaded when the file changes.
+
+    Every draw checks the file's modification time at most once per check_interval, and the file
+    is read and parsed in a worker thread, so the event loop is never blocked; until the new version
+    is loaded, draws use the previous one. Each user gets illusions in a random order of their own without
+    repeats until the whole catalog has been shown, and never the same illusion twice in a row.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0, max_users: int = MAX_TRACKED_USERS):
+        """
+        Args:
+            path: Catalog file
+            check_interval: Seconds between checks of the file's modification time
+            max_users: Users whose shuffle cursors are kept
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.max_users = max_users
+        self.entries: tuple[IllusionEntry, ...] = ()
+        self.version = 0  # Incremented on every reload
+        self._signature: tuple[int, int] | None = None  # Modification time and size of the loaded file
+        self._last_check = 0.0
+        self._reload_lock = asyncio.Lock()
+        self._cursors: OrderedDict[str, ShuffleCursor] = OrderedDict()
+        self._random = random.Random()
+
+        # The first load happens at startup, before the event loop serves users
+        self._load(self._stat())
+        self._last_check = time.monotonic()
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> list[IllusionEntry]:
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return parse_catalog(file.read())
+
+    def _load(self, signature: tuple[int, int] | None) -> None:
+        if signature is None:
+            logger.warning(f'[IllusionCatalog] {self.path} not found')
+            self._install([], signature)
+            return
+        try:
+            self._install(self._read(), signature)
+        except Exception as e:
+            logger.error(f'[IllusionCatalog] Error reading {self.path}: {e}')
+
+    def _install(self, entries: list[IllusionEntry], signature: tuple[int, int] | None) -> None:
+        self.entries = tuple(entries)
+        self._signature = signature
+        self.version += 1
+        logger.info(f'[IllusionCatalog] Loaded {len(self.entries)} illusions (version {self.version})')
+
+    async def refresh(self, force: bool = False) -> None:
+        """Reload the catalog if the file has changed; checks at most once per check_interval unless forced."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        if self._reload_lock.locked():
+            return  # Another draw is already reloading; keep using the loaded version
+        async with self._reload_lock:
+            self._last_check = now
+            signature = await asyncio.to_thread(self._stat)
+            if signature == self._signature:
+                return
+            if signature is None:
+                # E.g. an editor replacing the file; the loaded version is kept until it is back
+                logger.warning(f'[IllusionCatalog] {self.path} not found, keeping {len(self.entries)} illusions')
+                return
+            try:
+                entries = await asyncio.to_thread(self._read)
+            except Exception as e:
+                logger.error(f'[IllusionCatalog] Error reloading {self.path}: {e}')
+                return
+            self._install(entries, signature)
+
+    def _cursor(self, user_id: str) -> ShuffleCursor:
+        cursor = self._cursors.get(user_id)
+        if cursor is None:
+            cursor = self._cursors[user_id] = ShuffleCursor(self._random.getrandbits(64), self.version)
+            if len(self._cursors) > self.max_users:
+                self._cursors.popitem(last=False)
+        else:
+            self._cursors.move_to_end(user_id)
+        return cursor
+
+    async def draw(self, user_id: str) -> IllusionEntry | None:
+        """
+        Draw the user's next illusion.
+
+        Returns:
+            The illusion, or None if the catalog is empty
+        """
+        await self.refresh()
+        entries = self.entries
+        if not entries:
+            return None
+
+        size = len(entries)
+        cursor = self._cursor(user_id)
+        if cursor.version != self.version:
+            # The catalog has changed: start a new order over the current entries
+            cursor.version = self.version
+            cursor.position = size
+        if cursor.position >= size:
+            # Every illusion has been shown: start a new random order, not beginning with the last illusion shown
+            for _ in range(8):
+                cursor.seed = self._random.getrandbits(64)
+                if size == 1 or entries[shuffled_index(0, size, cursor.seed)].url != cursor.last_url:
+                    break
+            cursor.position = 0
+        entry = entries[shuffled_index(cursor.position, size, cursor.seed)]
+        cursor.position += 1
+        cursor.last_url = entry.url
+        return entry
@@ -0,0 +1,246 @@
+"""
+Local procedural renderer of classic size illusions.
+
+Every figure is drawn with known dimensions, so the correct answer is exact: it is derived
+from the measured sizes of the two objects instead of relying on an image model following a prompt.
+The render function is a plain module-level function, so it can run in a process pool.
+"""
+
+import io
+import math
+import random
+from dataclasses import dataclass
+
+from PIL import Image, ImageDraw
+
+
+ILLUSIONS = ('ebbinghaus', 'ponzo', 'muller_lyer', 'delboeuf', 'jastrow')
+ANSWERS = ('left', 'right', 'equal')
+
+# Figures are drawn at a higher resolution and downscaled for anti-aliasing
+SUPERSAMPLING = 2
+
+BACKGROUND = (255, 255, 255)
+TARGET_COLOR = (230, 110, 40)
+CONTEXT_COLOR = (60, 100, 190)
+LINE_COLOR = (40, 40, 40)
+
+ILLUSION_NAMES = {
+    'ebbinghaus': 'Иллюзия Эббингауза',
+    'ponzo': 'Иллюзия Понцо',
+    'muller_lyer': 'Иллюзия Мюллера-Лайера',
+    'delboeuf': 'Иллюзия Дельбёфа',
+    'jastrow': 'Иллюзия Ястрова',
+}
+
+ILLUSION_EFFECTS = {
+    'ebbinghaus': 'круг среди больших кругов кажется меньше, а среди маленьких — больше',
+    'ponzo': 'из-за сходящихся линий полоса в «дальней» узкой части кажется больше, чем в «ближней» широкой',
+    'muller_lyer': 'отрезок с «хвостами» наружу кажется длиннее, а со стрелками на концах — короче',
+    'delboeuf': 'круг в тесном кольце кажется больше, а в широком кольце — меньше',
+    'jastrow': 'из двух дуг больше кажется та, чья длинная сторона находится рядом с короткой стороной другой',
+}
+
+OBJECT_NAMES = {
+    'ebbinghaus': ('левый круг', 'правый круг', 'оба круга'),
+    'ponzo': ('левая полоса', 'правая полоса', 'обе полосы'),
+    'muller_lyer': ('левый отрезок', 'правый отрезок', 'оба отрезка'),
+    'delboeuf': ('левый круг', 'правый круг', 'оба круга'),
+    'jastrow': ('левая дуга', 'правая дуга', 'обе дуги'),
+}
+
+
+@dataclass
+class RenderedIllusion:
+    """A rendered illusion with the true sizes of its two objects."""
+
+    illusion: str
+    correct_answer: str  # "left", "right", "equal"
+    image_png: bytes
+    left_size: float  # Measured size of the left object, pixels
+    right_size: float  # Measured size of the right object, pixels
+    description: str  # Parameters of the figure, stored as the challenge prompt
+    explanation: str  # Explanation in Russian
+
+
+def _target_sizes(rng: random.Random, correct_answer: str, base: float) -> tuple[float, float]:
+    """Return (left, right) sizes with the larger object 6-15% larger."""
+    if correct_answer == 'equal':
+        return base, base
+    larger = base * (1 + rng.uniform(0.06, 0.15))
+    return (larger, base) if correct_answer == 'left' else (base, larger)
+
+
+def _circle(draw: ImageDraw.ImageDraw, x: float, y: float, radius: float, fill=None, outline=None, width: int = 0):
+    draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=fill, outline=outline, width=width)
+
+
+def _context_side(rng: random.Random, left: float, right: float) -> str:
+    """Side that gets the context making its object look smaller: the larger one, or a random one if equal."""
+    if left == right:
+        return rng.choice(('left', 'right'))
+    return 'left' if left > right else 'right'
+
+
+def _draw_ebbinghaus(draw, rng, correct_answer, width, height):
+    left, right = _target_sizes(rng, correct_answer, rng.uniform(0.09, 0.11) * width)
+    shrink_side = _context_side(rng, left, right)
+    for side, diameter, cx in (('left', left, width * 0.25), ('right', right, width * 0.75)):
+        cy = height / 2
+        radius = diameter / 2
+        if side == shrink_side:
+            # Few large inducers make the target look smaller
+            inducer_radius, count, gap = diameter * 0.55, 6, diameter * 0.12
+        else:
+            # Many small inducers make the target look larger
+            inducer_radius, count, gap = diameter * 0.18, 8, diameter * 0.1
+        distance = radius + gap + inducer_radius
+        offset = rng.uniform(0, 2 * math.pi)
+        for i in range(count):
+            angle = offset + 2 * math.pi * i / count
+            _circle(
+                draw, cx + distance * math.cos(angle), cy + distance * math.sin(angle), inducer_radius, CONTEXT_COLOR
+            )
+        _circle(draw, cx, cy, radius, TARGET_COLOR)
+    return left, right, f'target diameters {left:.1f}px and {right:.1f}px, large inducers on the {shrink_side}'
+
+
+def _draw_delboeuf(draw, rng, correct_answer, width, height):
+    left, right = _target_sizes(rng, correct_answer, rng.uniform(0.13, 0.16) * width)
+    shrink_side = _context_side(rng, left, right)
+    ring_width = max(2, round(width * 0.005))
+    for side, diameter, cx in (('left', left, width * 0.25), ('right', right, width * 0.75)):
+        cy = height / 2
+        radius = diameter / 2
+        # A wide ring makes the circle look smaller, a tight ring makes it look larger
+        ring_radius = radius * (1.9 if side == shrink_side else 1.15)
+        _circle(draw, cx, cy, ring_radius, outline=CONTEXT_COLOR, width=ring_width)
+        _circle(draw, cx, cy, radius, TARGET_COLOR)
+    return left, right, f'circle diameters {left:.1f}px and {right:.1f}px, wide ring on the {shrink_side}'
+
+
+def _draw_muller_lyer(draw, rng, correct_answer, width, height):
+    left, right = _target_sizes(rng, correct_answer, rng.uniform(0.24, 0.28) * width)
+    shrink_side = _context_side(rng, left, right)
+    line_width = max(3, round(width * 0.008))
+    fin = width * 0.05
+    cy = height / 2
+    for side, length, cx in (('left', left, width * 0.25), ('right', right, width * 0.75)):
+        x0, x1 = cx - length / 2, cx + length / 2
+        # Arrowheads (fins pointing back over the shaft) shorten, tails (fins pointing away) lengthen
+        direction = 1 if side == shrink_side else -1
+        for x, sign in ((x0, 1), (x1, -1)):
+            dx = sign * direction * fin * math.cos(math.pi / 4)
+            dy = fin * math.sin(math.pi / 4)
+            draw.line((x, cy, x + dx, cy - dy), fill=LINE_COLOR, width=line_width)
+            draw.line((x, cy, x + dx, cy + dy), fill=LINE_COLOR, width=line_width)
+        # The shaft is drawn over the fins, so its full length stays visible and measurable
+        draw.line((x0, cy, x1, cy), fill=TARGET_COLOR, width=line_width)
+    return left, right, f'shaft lengths {left:.1f}px and {right:.1f}px, arrowheads on the {shrink_side}'
+
+
+def _draw_ponzo(draw, rng, correct_answer, width, height):
+    left, right = _target_sizes(rng, correct_answer, rng.uniform(0.17, 0.2) * height)
+    shrink_side = _context_side(rng, left, right)
+    line_width = max(3, round(width * 0.006))
+    cy = height / 2
+    wide, narrow = height * 0.46, height * 0.12
+
+    # Converging rails: wide ("near") on the side of the larger bar, narrow ("far") on the other side
+    def half_gap(x: float) -> float:
+        t = x / width if shrink_side == 'left' else 1 - x / width
+        return wide + (narrow - wide) * t
+
+    draw.line((0, cy - half_gap(0), width, cy - half_gap(width)), fill=LINE_COLOR, width=line_width)
+    draw.line((0, cy + half_gap(0), width, cy + half_gap(width)), fill=LINE_COLOR, width=line_width)
+    for i in range(1, 8):
+        x = width * (i / 8) ** (0.8 if shrink_side == 'left' else 1.25)
+        draw.line((x, cy - half_gap(x), x, cy + half_gap(x)), fill=(190, 190, 190), width=max(1, line_width // 2))
+
+    bar_width = width * 0.03
+    for bar_height, cx in ((left, width * 0.25), (right, width * 0.75)):
+        draw.rectangle(
+            (cx - bar_width / 2, cy - bar_height / 2, cx + bar_width / 2, cy + bar_height / 2), fill=TARGET_COLOR
+        )
+    return left, right, f'bar heights {left:.1f}px and {right:.1f}px, near (wide) end on the {shrink_side}'
+
+
+def _draw_jastrow(draw, rng, correct_answer, width, height):
+    left, right = _target_sizes(rng, correct_answer, rng.uniform(0.3, 0.34) * height)
+    span = math.radians(70)
+    thickness = 0.4
+    # The figure whose long edge faces the other figure's short edge looks larger, so the arcs are
+    # oriented to make the actually larger figure look smaller
+    larger_side = _context_side(rng, left, right)
+    facing = math.pi if larger_side == 'left' else 0.0  # Direction of the convex side
+    cy = height / 2
+    for outer, cx in ((left, width * 0.25), (right, width * 0.75)):
+        inner = outer * (1 - thickness)
+        angles = [facing - span / 2 + span * i / 48 for i in range(49)]
+        xs = [outer * math.cos(a) for a in angles] + [inner * math.cos(a) for a in reversed(angles)]
+        ys = [outer * math.sin(a) for a in angles] + [inner * math.sin(a) for a in reversed(angles)]
+        # Center the figure's bounding box in its half
+        shift_x = cx - (min(xs) + max(xs)) / 2
+        shift_y = cy - (min(ys) + max(ys)) / 2
+        draw.polygon([(x + shift_x, y + shift_y) for x, y in zip(xs, ys)], fill=TARGET_COLOR)
+    return left, right, f'outer radii {left:.1f}px and {right:.1f}px, convex sides facing {larger_side}'
+
+
+_DRAWERS = {
+    'ebbinghaus': _draw_ebbinghaus,
+    'ponzo': _draw_ponzo,
+    'muller_lyer': _draw_muller_lyer,
+    'delboeuf': _draw_delboeuf,
+    'jastrow': _draw_jastrow,
+}
+
+
+def _explanation(illusion: str, left: float, right: float) -> str:
+    left_name, right_name, both_name = OBJECT_NAMES[illusion]
+    text = f'{ILLUSION_NAMES[illusion]}: {ILLUSION_EFFECTS[illusion]}. '
+    if left == right:
+        return text + f'Если измерить линейкой, {both_name} одинакового размера.'
+    larger, smaller = (left_name, right) if left > right else (right_name, left)
+    difference = (max(left, right) / smaller - 1) * 100
+    return text + f'Если измерить линейкой, {larger} больше на {difference:.0f}%.'
+
+
+def render_illusion(illusion: str, correct_answer: str, seed: int, size: int = 1024) -> RenderedIllusion:
+    """
+    Render an illusion with known true sizes.
+
+    Args:
+        illusion: One of ILLUSIONS
+        correct_answer: "left", "right" or "equal"
+        seed: Seed of the random figure parameters, the same seed renders the same image
+        size: Width and height of the image in pixels
+
+    Returns:
+        RenderedIllusion with PNG data, measured sizes and an explanation
+    """
+    if illusion not in _DRAWERS:
+        raise ValueError(f'Unknown illusion: {illusion!r}')
+    if correct_answer not in ANSWERS:
+        raise ValueError(f'Unknown answer: {correct_answer!r}')
+
+    rng = random.Random(seed)
+    canvas = size * SUPERSAMPLING
+    image = Image.new('RGB', (canvas, canvas), BACKGROUND)
+    left, right, parameters = _DRAWERS[illusion](ImageDraw.Draw(image), rng, correct_answer, canvas, canvas)
+    # Box downsampling is an order of magnitude faster than LANCZOS and enough for flat shapes
+    image = image.reduce(SUPERSAMPLING)
+
+    buffer = io.BytesIO()
+    # Fast compression: the images are small anyway, encoding time dominates the render
+    image.save(buffer, format='PNG', compress_level=1)
+
+    left, right = left / SUPERSAMPLING, right / SUPERSAMPLING
+    return RenderedIllusion(
+        illusion=illusion,
+        correct_answer=correct_answer,
+        image_png=buffer.getvalue(),
+        left_size=left,
+        right_size=right,
+        description=f'Local {illusion} illusion (seed {seed}): {parameters}',
+        explanation=_explanation(illusion, left, right),
+    )
@@ -0,0 +1,244 @@
+"""
+Archive of generated illusion images, searchable by the similarity of their prompts.
+
+Prompts are compared by MinHash signatures of their word shingles: the share of equal signature values
+estimates the Jaccard similarity of the shingle sets. When a new prompt is close enough to an archived one
+with the same correct answer, the archived image is served instead of requesting a new one.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass
+
+import aiosqlite
+import numpy as np
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 3
+SIGNATURE_SIZE = 64
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: signatures are stored, so they must be computed the same way in every process
+_rng = np.random.default_rng(20250101)
+_A = _rng.integers(1, int(_MERSENNE_PRIME), SIGNATURE_SIZE, dtype=np.uint64)
+_B = _rng.integers(0, int(_MERSENNE_PRIME), SIGNATURE_SIZE, dtype=np.uint64)
+
+
+def shingles(text: str) -> set[str]:
+    """Overlapping runs of SHINGLE_WORDS words of the lowercased text."""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {' '.join(words)}
+    return {' '.join(words[i : i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of the shingles of a text, SIGNATURE_SIZE unsigned 64-bit values."""
+    hashes = np.array([zlib.crc32(shingle.encode()) for shingle in shingles(text)], dtype=np.uint64)
+    # Products wrap around at 64 bits, which keeps the hash functions independent enough for MinHash
+    return ((np.outer(hashes, _A) + _B) % _MERSENNE_PRIME).min(axis=0)
+
+
+@dataclass
+class ArchivedImage:
+    """An archived image with the prompt, answer and explanation it was generated with."""
+
+    id: int
+    prompt: str
+    correct_answer: str  # "left", "right", "equal"
+    explanation: str
+    image_bytes: bytes
+    output_format: str  # "png", "jpeg" or "webp"
+    tier: str  # Image settings tier the image was generated at
+    similarity: float  # Estimated similarity of the archived prompt to the looked up one
+
+
+@dataclass
+class ReuseStats:
+    """Lookups of the archive and the images served from it."""
+
+    lookups: int = 0
+    hits: int = 0
+    stored: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class _AnswerIndex:
+    """Signatures of the archived prompts of one correct answer, one row per image."""
+
+    def __init__(self):
+        self.ids: list[int] = []
+        self.signatures = np.empty((0, SIGNATURE_SIZE), dtype=np.uint64)
+
+    def add(self, image_id: int, signature: np.ndarray) -> None:
+        self.ids.append(image_id)
+        self.signatures = np.vstack((self.signatures, signature))
+
+    def remove(self, image_ids: set[int]) -> None:
+        keep = [i for i, image_id in enumerate(self.ids) if image_id not in image_ids]
+        self.ids = [self.ids[i] for i in keep]
+        self.signatures = self.signatures[keep]
+
+    def matches(self, signature: np.ndarray, threshold: float) -> list[tuple[float, int]]:
+        """(similarity, image id) of the prompts at least as similar as the threshold."""
+        if not self.ids:
+            return []
+        similarities = (self.signatures == signature).mean(axis=1)
+        return [(float(similarities[i]), self.ids[i]) for i in np.flatnonzero(similarities >= threshold)]
+
+
+class ImageArchive:
+    """
+    Generated images in SQLite (data/image_archive.db) with an in-memory index of their prompt signatures.
+
+    Several processes (the bot and generation workers) can share the archive: images archived by
+    another process are added to the index on the next lookup. The oldest images are evicted beyond
+    max_images.
+    """
+
+    def __init__(self, data_dir: str = 'data', threshold: float = 0.8, max_images: int = 1000):
+        """
+        Args:
+            data_dir: Directory of the archive database
+            threshold: Minimum estimated similarity of two prompts for an image to be reused, 0 to 1
+            max_images: Images kept in the archive
+        """
+        self.db_file = os.path.join(data_dir, 'image_archive.db')
+        self.threshold = threshold
+        self.max_images = max_images
+        self.stats = ReuseStats()
+        self._index: dict[str, _AnswerIndex] = {}
+        self._last_id = 0  # Newest image in the index
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+        self.random = random.Random()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the long-lived database connection on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_file)
+                    await db.execute('PRAGMA journal_mode=WAL')
+                    await db.execute('PRAGMA synchronous=NORMAL')
+                    await db.execute("""
+                        CREATE TABLE IF NOT EXISTS images (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            prompt TEXT NOT NULL,
+                            correct_answer TEXT NOT NULL,
+                            explanation TEXT NOT NULL DEFAULT '',
+                            image BLOB NOT NULL,
+                            output_format TEXT NOT NULL,
+                            tier TEXT NOT NULL DEFAULT '',
+                            signature BLOB NOT NULL,
+                            created_at REAL NOT NULL,
+                            served INTEGER NOT NULL DEFAULT 0
+                        )
+                    """)
+                    await db.commit()
+                    self._db = db
+                    logger.info('[ImageArchive] Database tables created/verified')
+        return self._db
+
+    async def _sync(self) -> aiosqlite.Connection:
+        """Add images archived since the last lookup, also by other processes, to the index."""
+        db = await self._connection()
+        async with db.execute(
+            'SELECT id, correct_answer, signature FROM images WHERE id > ? ORDER BY id', (self._last_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for image_id, correct_answer, signature in rows:
+            self._index.setdefault(correct_answer, _AnswerIndex()).add(
+                image_id, np.frombuffer(signature, dtype=np.uint64)
+            )
+            self._last_id = image_id
+        return db
+
+    async def find(self, prompt: str, correct_answer: str) -> ArchivedImage | None:
+        """
+        Find an archived image for a prompt.
+
+        Among the archived prompts with the same correct answer and a similarity of at least the
+        threshold, one is chosen at random, so similar prompts do not always get the same image.
+
+        Returns:
+            The archived image, or None if no archived prompt is similar enough
+        """
+        db = await self._sync()
+        self.stats.lookups += 1
+        index = self._index.get(correct_answer)
+        candidates = index.matches(minhash(prompt), self.threshold) if index is not None else []
+        while candidates:
+            similarity, image_id = candidates.pop(self.random.randrange(len(candidates)))
+            async with db.execute(
+                'SELECT prompt, explanation, image, output_format, tier FROM images WHERE id = ?', (image_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                # Evicted by another process
+                index.remove({image_id})
+                continue
+            await db.execute('UPDATE images SET served = served + 1 WHERE id = ?', (image_id,))
+            await db.commit()
+            self.stats.hits += 1
+            self._log_stats(f'reusing image {image_id} (similarity {similarity:.2f})')
+            return ArchivedImage(image_id, row[0], correct_answer, row[1], row[2], row[3], row[4], similarity)
+        self._log_stats('no similar prompt')
+        return None
+
+    async def add(
+        self, prompt: str, correct_answer: str, explanation: str, image_bytes: bytes, output_format: str, tier: str
+    ) -> None:
+        """Archive a generated image, evicting the oldest images beyond max_images."""
+        db = await self._connection()
+        await db.execute(
+            """
+            INSERT INTO images (prompt, correct_answer, explanation, image, output_format, tier, signature, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                prompt,
+                correct_answer,
+                explanation,
+                image_bytes,
+                output_format,
+                tier,
+                minhash(prompt).tobytes(),
+                time.time(),
+            ),
+        )
+        async with db.execute(
+            'DELETE FROM images WHERE id NOT IN (SELECT id FROM images ORDER BY id DESC LIMIT ?) RETURNING id',
+            (self.max_images,),
+        ) as cursor:
+            evicted = {row[0] for row in await cursor.fetchall()}
+        await db.commit()
+        self.stats.stored += 1
+        if evicted:
+            for index in self._index.values():
+                index.remove(evicted)
+        # The new image, and any archived by other processes meanwhile
+        await self._sync()
+
+    def _log_stats(self, outcome: str) -> None:
+        logger.info(
+            f'[ImageArchive] Lookup: {outcome}; hit rate {self.stats.hit_rate:.0%} over {self.stats.lookups} '
+            f'lookups, {self.stats.stored} images archived'
+        )
+
+    async def close(self) -> None:
+        """Close the database connection."""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
@@ -0,0 +1,167 @@
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ordered from most to least expensive
+QUALITY_LEVELS = ['high', 'medium', 'low']
+# Smallest size of the GPT image models, so sizes are not stepped below it
+BASE_SIZE = '1024x1024'
+# JPEG compression of the economy and minimal tiers, 0-100
+COMPRESSION_LEVELS = {'economy': 75, 'minimal': 50}
+
+
+@dataclass(frozen=True)
+class ImageSettings:
+    """Parameters of an image generation request."""
+
+    quality: str = 'low'
+    size: str = BASE_SIZE
+    output_format: str = 'png'
+    moderation: str = 'low'
+    output_compression: int | None = None  # 0-100 for jpeg and webp, None for the API default
+
+
+@dataclass(frozen=True)
+class ImageTier:
+    """A named level of image settings."""
+
+    name: str
+    settings: ImageSettings
+
+
+def build_tiers(base: ImageSettings) -> list[ImageTier]:
+    """
+    Build the ladder of tiers from the configured settings down to the cheapest ones.
+
+    The first step lowers the quality by one level and falls back to the square base size, the smallest
+    size of the GPT image models, so there are no size steps below it. The economy and minimal tiers
+    switch to low quality JPEG with increasing compression (COMPRESSION_LEVELS), which is faster to
+    encode, download and upload; they are the only steps left from the default low quality base size.
+    Steps that would not change anything are skipped.
+    """
+    tiers = [ImageTier('full', base)]
+
+    quality_index = QUALITY_LEVELS.index(base.quality) if base.quality in QUALITY_LEVELS else len(QUALITY_LEVELS) - 1
+    reduced = replace(base, quality=QUALITY_LEVELS[min(quality_index + 1, len(QUALITY_LEVELS) - 1)], size=BASE_SIZE)
+    if reduced != base:
+        tiers.append(ImageTier('reduced', reduced))
+
+    for name, compression in COMPRESSION_LEVELS.items():
+        if base.output_compression is not None and compression >= base.output_compression:
+            continue
+        compressed = replace(reduced, quality=QUALITY_LEVELS[-1], output_format='jpeg', output_compression=compression)
+        if compressed != tiers[-1].settings:
+            tiers.append(ImageTier(name, compressed))
+
+    return tiers
+
+
+class AdaptiveImagePolicy:
+    """
+    Chooses image settings based on load.
+
+    Load is measured by the number of image requests in flight (the AI queue depth) and an
+    exponentially weighted moving average of recent image latencies. When either is above its
+    overload threshold the policy steps one tier down; when both are well below, it steps one tier
+    back up. A cooldown between steps prevents flapping.
+    """
+
+    def __init__(
+        self,
+        tiers: list[ImageTier],
+        overload_queue_depth: int = 4,
+        overload_latency: float = 60.0,
+        cooldown: float = 30.0,
+        enabled: bool = True,
+        latency_smoothing: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tiers = tiers
+        self.overload_queue_depth = overload_queue_depth
+        self.overload_latency = overload_latency
+        self.cooldown = cooldown
+        self.enabled = enabled
+        self.latency_smoothing = latency_smoothing
+        self._clock = clock
+
+        self.tier_index = 0
+        self.in_flight = 0
+        self.latency: float | None = None  # Smoothed latency of successful requests, seconds
+        self._last_change = clock() - cooldown
+        self._last_release = clock()
+
+    def reconfigure(
+        self, tiers: list[ImageTier], overload_queue_depth: int, overload_latency: float, enabled: bool
+    ) -> None:
+        """
+        Change the tiers and thresholds; requests in flight keep their tier and are released as usual.
+
+        The policy stays at the same step of the new ladder, or at its last step if the ladder is shorter.
+        """
+        self.tiers = tiers
+        self.tier_index = min(self.tier_index, len(tiers) - 1)
+        self.overload_queue_depth = overload_queue_depth
+        self.overload_latency = overload_latency
+        self.enabled = enabled
+
+    @property
+    def current(self) -> ImageTier:
+        return self.tiers[self.tier_index]
+
+    def _overloaded(self) -> bool:
+        if self.in_flight >= self.overload_queue_depth:
+            return True
+        return self.latency is not None and self.latency >= self.overload_latency
+
+    def _idle(self) -> bool:
+        if self.in_flight > self.overload_queue_depth // 2:
+            return False
+        return self.latency is None or self.latency < self.overload_latency / 2
+
+    def _step(self, delta: int) -> None:
+        new_index = min(max(self.tier_index + delta, 0), len(self.tiers) - 1)
+        if new_index == self.tier_index or self._clock() - self._last_change < self.cooldown:
+            return
+        old = self.current
+        self.tier_index = new_index
+        self._last_change = self._clock()
+        logger.info(
+            f'[AdaptiveImagePolicy] Switched image tier {old.name} -> {self.current.name} '
+            f'(in flight: {self.in_flight}, latency: {self.latency or 0:.1f}s)'
+        )
+
+    def acquire(self) -> ImageTier:
+        """Register a new request and return the tier to serve it at."""
+        self.in_flight += 1
+        if not self.enabled:
+            return self.tiers[0]
+        # Latency measured before an idle period says nothing about the current load
+        if self.in_flight == 1 and self._clock() - self._last_release >= self.cooldown:
+            self.latency = None
+        if self._overloaded():
+            self._step(1)
+        elif self._idle():
+            self._step(-1)
+        return self.current
+
+    def release(self, latency: float | None) -> None:
+        """
+        Register the end of a request.
+
+        Args:
+            latency: Request duration in seconds, or None if the request failed
+        """
+        self.in_flight -= 1
+        self._last_release = self._clock()
+        if latency is None:
+            return
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_smoothing * (latency - self.latency)
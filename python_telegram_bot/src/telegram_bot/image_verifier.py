@@ -0,0 +1,234 @@
+"""
+Ground-truth verification of generated illusion images.
+
+The image is reduced to a small palette, the two primary shapes are segmented as connected regions
+of one color, and their sizes are measured. The measured answer is compared with the answer the prompt
+was generated for, before the image becomes a challenge.
+"""
+
+import io
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from .executor import CPUExecutor
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VERIFY_MODES = ('off', 'log', 'reject', 'relabel')
+
+# Images are analysed at this size; enough to tell apart sizes differing by a few percent
+ANALYSIS_SIZE = 512
+PALETTE_COLORS = 8
+# Shapes smaller than this fraction of the image are noise, anti-aliasing or decoration
+MIN_AREA_FRACTION = 0.0005
+# Sizes within this relative difference are considered equal
+EQUAL_TOLERANCE = 0.03
+
+
+@dataclass
+class Measurement:
+    """Sizes of the primary shapes measured in an image."""
+
+    answer: str | None  # "left", "right", "equal", or None if the shapes could not be found
+    left_size: float  # Longest side of the bounding box of the left shape, pixels of the analysed image
+    right_size: float
+    elapsed: float  # Seconds spent measuring, in the worker
+
+
+@dataclass
+class Verification:
+    """Result of verifying an image against the expected answer."""
+
+    expected: str
+    measurement: Measurement
+    latency: float  # Seconds from submitting the image to receiving the result, including queueing
+
+    @property
+    def status(self) -> str:
+        """ "passed", "failed" or "inconclusive"."""
+        if self.measurement.answer is None:
+            return 'inconclusive'
+        return 'passed' if self.measurement.answer == self.expected else 'failed'
+
+
+def _label_components(palette: np.ndarray, foreground: np.ndarray) -> np.ndarray:
+    """
+    Label 4-connected regions of equal palette index.
+
+    Labels are propagated as the minimum pixel index over same-colored neighbours, with pointer jumping
+    to collapse long chains, so the number of iterations stays small even for large shapes.
+
+    Returns:
+        Array of the shape of the image: component label (a pixel index) for foreground pixels, -1 elsewhere
+    """
+    height, width = palette.shape
+    labels = np.arange(height * width, dtype=np.int32).reshape(height, width)
+    labels[~foreground] = -1
+    vertical = foreground[1:, :] & foreground[:-1, :] & (palette[1:, :] == palette[:-1, :])
+    horizontal = foreground[:, 1:] & foreground[:, :-1] & (palette[:, 1:] == palette[:, :-1])
+    flat_foreground = foreground.ravel()
+
+    while True:
+        new = labels.copy()
+        pair = np.minimum(labels[1:, :], labels[:-1, :])
+        new[1:, :] = np.where(vertical, np.minimum(new[1:, :], pair), new[1:, :])
+        new[:-1, :] = np.where(vertical, np.minimum(new[:-1, :], pair), new[:-1, :])
+        pair = np.minimum(new[:, 1:], new[:, :-1])
+        new[:, 1:] = np.where(horizontal, np.minimum(new[:, 1:], pair), new[:, 1:])
+        new[:, :-1] = np.where(horizontal, np.minimum(new[:, :-1], pair), new[:, :-1])
+        flat = new.ravel()
+        for _ in range(2):
+            flat[flat_foreground] = flat[flat[flat_foreground]]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def _primary_shape_sizes(palette: np.ndarray, background: int) -> tuple[float, float] | None:
+    """
+    Find the primary shape of each half of the image and return the longest sides of their bounding boxes.
+
+    Candidates are same-colored regions that are large enough and do not touch the image border (backgrounds,
+    perspective lines). In each half the primary shape is the most solid, large region closest to the
+    area-weighted center of the half's candidates: the center of a figure and its surroundings.
+    """
+    height, width = palette.shape
+    foreground = palette != background
+    labels = _label_components(palette, foreground)
+
+    rows, cols = np.nonzero(foreground)
+    _, component, areas = np.unique(labels[rows, cols], return_inverse=True, return_counts=True)
+    order = np.argsort(component, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(areas)[:-1]))
+    sorted_rows, sorted_cols = rows[order], cols[order]
+    top, bottom = np.minimum.reduceat(sorted_rows, starts), np.maximum.reduceat(sorted_rows, starts)
+    left, right = np.minimum.reduceat(sorted_cols, starts), np.maximum.reduceat(sorted_cols, starts)
+    center_x = np.bincount(component, weights=cols) / areas
+    center_y = np.bincount(component, weights=rows) / areas
+
+    box_width, box_height = right - left + 1, bottom - top + 1
+    candidates = (
+        (areas >= MIN_AREA_FRACTION * height * width)
+        & (top > 0)
+        & (left > 0)
+        & (bottom < height - 1)
+        & (right < width - 1)
+    )
+    solidity = areas / (box_width * box_height)
+    size = np.maximum(box_width, box_height).astype(float)
+
+    sizes = []
+    for in_half in (center_x < width / 2, center_x >= width / 2):
+        mask = candidates & in_half
+        if not mask.any():
+            return None
+        weights = areas[mask]
+        focus_x = np.average(center_x[mask], weights=weights)
+        focus_y = np.average(center_y[mask], weights=weights)
+        distance = np.hypot(center_x[mask] - focus_x, center_y[mask] - focus_y) / (width / 8)
+        score = areas[mask] * solidity[mask] * np.exp(-(distance**2) / 2)
+        sizes.append(size[mask][np.argmax(score)])
+    return sizes[0], sizes[1]
+
+
+def measure_image(image_bytes: bytes) -> Measurement:
+    """
+    Segment the two primary shapes of an illusion image and compare their sizes.
+
+    Args:
+        image_bytes: Encoded image (PNG, JPEG or WebP)
+
+    Returns:
+        Measurement with the measured answer, or None as the answer if the shapes were not found
+    """
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    # Box reduction by an integer factor is much faster than resampling and keeps edges sharp enough
+    image = image.reduce(max(1, max(image.size) // ANALYSIS_SIZE))
+    palette = np.asarray(image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE))
+
+    # The background is the most common color on the border
+    border = np.concatenate((palette[0], palette[-1], palette[:, 0], palette[:, -1]))
+    background = int(np.bincount(border).argmax())
+
+    sizes = _primary_shape_sizes(palette, background)
+    elapsed = time.perf_counter() - start
+    if sizes is None:
+        return Measurement(None, 0.0, 0.0, elapsed)
+
+    left_size, right_size = float(sizes[0]), float(sizes[1])
+    if abs(left_size - right_size) <= EQUAL_TOLERANCE * max(left_size, right_size):
+        answer = 'equal'
+    else:
+        answer = 'left' if left_size > right_size else 'right'
+    return Measurement(answer, left_size, right_size, elapsed)
+
+
+@dataclass
+class VerificationCounts:
+    passed: int = 0
+    failed: int = 0
+    inconclusive: int = 0
+    total_time: float = 0.0  # Seconds spent measuring, in the workers
+
+    @property
+    def total(self) -> int:
+        return self.passed + self.failed + self.inconclusive
+
+    @property
+    def pass_rate(self) -> float:
+        """Share of conclusive verifications that passed."""
+        conclusive = self.passed + self.failed
+        return self.passed / conclusive if conclusive else 0.0
+
+
+class ImageVerifier:
+    """
+    Verifies generated images in an executor and keeps pass/fail counts per prompt origin: the prompt model,
+    or "template" for prompts synthesized locally.
+
+    Modes: "off" skips verification, "log" only records the result, "reject" discards mismatching
+    images and "relabel" replaces the expected answer with the measured one. Inconclusive results
+    (shapes not found) never reject or relabel an image.
+    """
+
+    def __init__(self, executor: CPUExecutor, mode: str = 'log'):
+        if mode not in VERIFY_MODES:
+            raise ValueError(f'Unknown verification mode: {mode!r}, expected one of {list(VERIFY_MODES)}')
+        self.executor = executor
+        self.mode = mode
+        self.counts: dict[str, VerificationCounts] = defaultdict(VerificationCounts)
+
+    async def verify(self, image_bytes: bytes, expected: str, origin: str) -> Verification | None:
+        """
+        Measure an image and record the result for the origin of its prompt.
+
+        Returns:
+            The verification, or None if verification is off
+        """
+        if self.mode == 'off':
+            return None
+
+        start = time.perf_counter()
+        measurement = await self.executor.run(measure_image, image_bytes)
+        verification = Verification(expected, measurement, time.perf_counter() - start)
+
+        counts = self.counts[origin]
+        setattr(counts, verification.status, getattr(counts, verification.status) + 1)
+        counts.total_time += measurement.elapsed
+        logger.info(
+            f'[ImageVerifier] {verification.status}: expected {expected}, measured {measurement.answer} '
+            f'(left {measurement.left_size:.0f}px, right {measurement.right_size:.0f}px) '
+            f'in {measurement.elapsed * 1000:.0f}ms ({verification.latency * 1000:.0f}ms with queueing); '
+            f'{origin}: {counts.passed}/{counts.passed + counts.failed} passed '
+            f'({counts.pass_rate:.0%}), {counts.inconclusive} inconclusive'
+        )
+        return verification
@@ -0,0 +1,387 @@
+"""
+Durable queue of challenge generation jobs, shared by the bot and the generation workers.
+
+The bot enqueues a job for every /illusion request into data/jobs.db. Worker processes (src/worker.py) lease
+jobs, run the prompt and image pipeline and store the generated challenge in the job; the bot then sends it.
+A lease expires if its worker dies, so the job is retried by another worker, up to a number of attempts.
+Jobs survive restarts of the bot and of the workers: a deploy only delays the challenges being generated.
+
+Workers notify the bot over a Unix socket when a job makes progress or is finished, so challenges are sent
+right away; the bot also polls the queue, so a lost notification only delays a challenge.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import aiosqlite
+
+from .challenge_source import GeneratedChallenge
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job states: waiting for a worker, leased by one, generated, or given up after the last attempt
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+# Error of a job whose worker died during its last attempt, shown to the user
+INTERRUPTED_ERROR = 'Извините, генерация иллюзии была прервана. Пожалуйста, попробуйте еще раз.'
+# Seconds between retries of a failed job, multiplied by the number of attempts so far
+RETRY_DELAY = 5.0
+# Delivered jobs are deleted after this many seconds
+DELIVERED_RETENTION = 24 * 60 * 60
+
+
+@dataclass
+class Job:
+    """A challenge generation job."""
+
+    id: int
+    chat_id: str
+    status_message_id: int | None  # Message showing the progress, replaced by the challenge
+    is_group: bool
+    status: str
+    attempts: int
+    error: str = ''  # Message shown to the user if the job failed
+    challenge: GeneratedChallenge | None = None  # Set when the job is ready
+
+
+class JobQueue:
+    """
+    Generation jobs in data/jobs.db, shared by the bot and any number of worker processes.
+
+    Leasing a job is a single UPDATE, so two workers never lease the same job; completing a job checks
+    that the worker still holds the lease, so the result of a worker whose lease expired is discarded.
+    """
+
+    def __init__(self, data_dir: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        """
+        Args:
+            data_dir: Data directory of the bot, shared with the workers
+            lease_seconds: Seconds a worker holds a job before another worker may take it over
+            max_attempts: Attempts of a job before it fails
+        """
+        self.db_file = os.path.join(data_dir, 'jobs.db')
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._db: aiosqlite.Connection | None = None
+        self._db_lock = asyncio.Lock()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the long-lived database connection on first use."""
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_file, timeout=30)
+                    await db.execute('PRAGMA journal_mode=WAL')
+                    await db.execute('PRAGMA synchronous=NORMAL')
+                    await db.executescript("""
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id INTEGER PRIMARY KEY,
+                            chat_id TEXT NOT NULL,
+                            status_message_id INTEGER,
+                            is_group INTEGER NOT NULL DEFAULT 0,
+                            status TEXT NOT NULL DEFAULT 'pending',
+                            attempts INTEGER NOT NULL DEFAULT 0,
+                            available_at REAL NOT NULL,
+                            lease_until REAL,
+                            worker TEXT,
+                            error TEXT NOT NULL DEFAULT '',
+                            prompt TEXT,
+                            correct_answer TEXT,
+                            explanation TEXT,
+                            image BLOB,
+                            output_format TEXT,
+                            source TEXT,
+                            detail TEXT,
+                            created_at REAL NOT NULL,
+                            finished_at REAL,
+                            delivered_at REAL
+                        );
+                        CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(available_at) WHERE status = 'pending';
+                        CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(lease_until) WHERE status = 'running';
+                        CREATE INDEX IF NOT EXISTS idx_jobs_undelivered
+                            ON jobs(id) WHERE status IN ('ready', 'failed') AND delivered_at IS NULL;
+                        CREATE INDEX IF NOT EXISTS idx_jobs_open
+                            ON jobs(chat_id) WHERE status IN ('pending', 'running');
+                    """)
+                    await db.commit()
+                    self._db = db
+                    logger.info('[JobQueue] Database tables created/verified')
+        return self._db
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def enqueue(self, chat_id: str, status_message_id: int | None = None, is_group: bool = False) -> int:
+        """Add a job and return its id."""
+        db = await self._connection()
+        now = time.time()
+        cursor = await db.execute(
+            'INSERT INTO jobs (chat_id, status_message_id, is_group, available_at, created_at) VALUES (?, ?, ?, ?, ?)',
+            (chat_id, status_message_id, int(is_group), now, now),
+        )
+        await db.commit()
+        logger.info(f'[JobQueue] Enqueued job {cursor.lastrowid} for chat {chat_id}')
+        return cursor.lastrowid
+
+    async def has_open_job(self, chat_id: str) -> bool:
+        """Whether the chat has a job waiting for or being generated."""
+        db = await self._connection()
+        async with db.execute(
+            "SELECT 1 FROM jobs WHERE chat_id = ? AND status IN ('pending', 'running') LIMIT 1", (chat_id,)
+        ) as cursor:
+            return await cursor.fetchone() is not None
+
+    async def pending_count(self) -> int:
+        """Jobs waiting for a worker."""
+        db = await self._connection()
+        async with db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'") as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def lease(self, worker: str) -> tuple[Job | None, list[int]]:
+        """
+        Lease the oldest available job.
+
+        Jobs whose worker let the lease expire are taken over, unless they used up their attempts,
+        in which case they fail.
+
+        Returns:
+            The leased job or None, and the ids of the jobs that failed because of expired leases
+        """
+        db = await self._connection()
+        now = time.time()
+        async with db.execute(
+            """
+            UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+            WHERE status = 'running' AND lease_until < ? AND attempts >= ?
+            RETURNING id
+        """,
+            (INTERRUPTED_ERROR, now, now, self.max_attempts),
+        ) as cursor:
+            expired = [row[0] for row in await cursor.fetchall()]
+        async with db.execute(
+            """
+            UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'pending' AND available_at <= ?) OR (status = 'running' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, chat_id, status_message_id, is_group, status, attempts
+        """,
+            (worker, now + self.lease_seconds, now, now),
+        ) as cursor:
+            row = await cursor.fetchone()
+        await db.commit()
+        if expired:
+            logger.warning(f'[JobQueue] Jobs {expired} failed after {self.max_attempts} interrupted attempts')
+        if row is None:
+            return None, expired
+        job = Job(row[0], row[1], row[2], bool(row[3]), row[4], row[5])
+        logger.info(f'[JobQueue] Worker {worker} leased job {job.id} (attempt {job.attempts})')
+        return job, expired
+
+    async def extend(self, job_id: int, worker: str) -> bool:
+        """Renew the lease of a job; returns False if the worker lost it."""
+        db = await self._connection()
+        cursor = await db.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, job_id, worker),
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+    async def complete(self, job_id: int, worker: str, challenge: GeneratedChallenge) -> bool:
+        """Store the generated challenge; returns False if the worker lost the lease."""
+        db = await self._connection()
+        cursor = await db.execute(
+            """
+            UPDATE jobs SET status = 'ready', prompt = ?, correct_answer = ?, explanation = ?, image = ?,
+                output_format = ?, source = ?, detail = ?, finished_at = ?, lease_until = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'
+        """,
+            (
+                challenge.prompt,
+                challenge.correct_answer,
+                challenge.explanation,
+                challenge.image_bytes,
+                challenge.output_format,
+                challenge.source,
+                challenge.detail,
+                time.time(),
+                job_id,
+                worker,
+            ),
+        )
+        await db.commit()
+        if cursor.rowcount == 0:
+            logger.warning(f'[JobQueue] Worker {worker} lost the lease of job {job_id}, discarding its result')
+            return False
+        return True
+
+    async def fail(self, job_id: int, worker: str, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt: the job is retried later, or fails if it used up its attempts or must not be retried.
+
+        Returns:
+            True if the job failed for good
+        """
+        db = await self._connection()
+        now = time.time()
+        async with db.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END,
+                available_at = ? + ? * attempts,
+                finished_at = CASE WHEN ? AND attempts < ? THEN NULL ELSE ? END,
+                error = ?, lease_until = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'
+            RETURNING status
+        """,
+            (retry, self.max_attempts, now, RETRY_DELAY, retry, self.max_attempts, now, error, job_id, worker),
+        ) as cursor:
+            row = await cursor.fetchone()
+        await db.commit()
+        return row is not None and row[0] == FAILED
+
+    async def undelivered(self, limit: int = 100) -> list[Job]:
+        """Finished jobs whose challenge or error was not sent yet, oldest first."""
+        db = await self._connection()
+        async with db.execute(
+            """
+            SELECT id, chat_id, status_message_id, is_group, status, attempts, error,
+                prompt, correct_answer, explanation, image, output_format, source, detail
+            FROM jobs WHERE status IN ('ready', 'failed') AND delivered_at IS NULL
+            ORDER BY id LIMIT ?
+        """,
+            (limit,),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        jobs = []
+        for row in rows:
+            job = Job(row[0], row[1], row[2], bool(row[3]), row[4], row[5], row[6])
+            if job.status == READY:
+                # The base64 copy stored with the active challenge is made by the bot, off the event loop
+                job.challenge = GeneratedChallenge(
+                    prompt=row[7],
+                    correct_answer=row[8],
+                    explanation=row[9],
+                    image_base64='',
+                    image_bytes=row[10],
+                    output_format=row[11],
+                    source=row[12],
+                    detail=row[13],
+                )
+            jobs.append(job)
+        return jobs
+
+    async def mark_delivered(self, job_id: int) -> None:
+        """Record that the job's challenge or error was sent; its image is dropped."""
+        db = await self._connection()
+        await db.execute('UPDATE jobs SET delivered_at = ?, image = NULL WHERE id = ?', (time.time(), job_id))
+        await db.commit()
+
+    async def purge_delivered(self, older_than: float = DELIVERED_RETENTION) -> int:
+        """Delete jobs delivered more than the given number of seconds ago."""
+        db = await self._connection()
+        cursor = await db.execute('DELETE FROM jobs WHERE delivered_at < ?', (time.time() - older_than,))
+        await db.commit()
+        return cursor.rowcount
+
+
+# Called by JobEvents for every event received from a worker
+EventCallback = Callable[[dict], Awaitable[None]]
+
+
+class JobEvents:
+    """
+    Unix socket server of the bot receiving job events from the workers, one JSON object per line:
+    {"job": 1, "event": "progress", "stage": "image", "chat_id": "42", "message_id": 7}
+    or {"job": 1, "event": "finished"}.
+    """
+
+    def __init__(self, path: str, callback: EventCallback):
+        self.path = path
+        self.callback = callback
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        # A socket file left by a previous run would make the bind fail
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+        logger.info(f'[JobEvents] Listening for job events on {self.path}')
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    logger.warning(f'[JobEvents] Ignoring malformed event: {line[:100]!r}')
+                    continue
+                try:
+                    await self.callback(event)
+                except Exception as e:
+                    logger.error(f'[JobEvents] Error handling event {event}: {e}')
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Workers stay connected; closing their connections ends the handlers
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+
+
+class JobNotifier:
+    """Sends job events of a worker to the bot; events are best effort, the bot also polls the queue."""
+
+    def __init__(self, path: str, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def notify(self, job_id: int, event: str, **fields) -> bool:
+        """Send an event; returns False if the bot could not be reached."""
+        line = json.dumps({'job': job_id, 'event': event, **fields}).encode() + b'\n'
+        for _ in range(2):  # The bot may have restarted since the connection was opened
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    _, self._writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout)
+                self._writer.write(line)
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+                return True
+            except (OSError, TimeoutError):
+                await self.close()
+        logger.debug(f'[JobNotifier] Could not notify the bot of job {job_id}')
+        return False
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            with contextlib.suppress(OSError):
+                await self._writer.wait_closed()
+            self._writer = None
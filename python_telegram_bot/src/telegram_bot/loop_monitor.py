@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from types import FrameType
+
+from .config import Settings
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def describe_frames(frame: FrameType | None) -> str:
+    """
+    Describe where the bot's own code is in a stack, outermost first.
+
+    Frames of other packages (asyncio, aiogram, ...) are skipped, so the first entry is the handler
+    and the last one is the line of bot code that was running.
+    """
+    entries = []
+    while frame is not None:
+        code = frame.f_code
+        if os.path.dirname(os.path.abspath(code.co_filename)) == PACKAGE_DIR:
+            entries.append(f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ' -> '.join(reversed(entries)) or 'outside the bot code'
+
+
+class LoopLagMonitor:
+    """
+    Measures how long the event loop is blocked.
+
+    A heartbeat callback on the loop records when it last ran. A watchdog thread checks the heartbeat;
+    when it is older than the threshold, the loop is blocked, and the watchdog samples the loop thread's
+    stack to name the handler responsible. When the loop runs again, the blocked interval is logged
+    together with that handler. A summary of the observed lag is logged periodically.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        report_interval: float = 600.0,
+        history: int = 10000,
+    ):
+        """
+        Args:
+            threshold: Blocked intervals longer than this many seconds are reported
+            interval: Heartbeat period in seconds, which is also the resolution of the measurements
+            report_interval: Seconds between lag summaries in the log
+            history: Number of recent lag samples kept for the summary
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+        self.samples: deque[float] = deque(maxlen=history)
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat: asyncio.TimerHandle | None = None
+        self._last_beat = 0.0
+        self._last_report = 0.0
+        self._culprit: str | None = None  # Stack sampled by the watchdog during the current stall
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'LoopLagMonitor | None':
+        """Create a monitor from the LOOP_LAG_MONITOR and LOOP_LAG_THRESHOLD_MS settings, or None if it is disabled."""
+        if not settings.loop_lag_monitor:
+            return None
+        return cls(threshold=settings.loop_lag_threshold_ms / 1000)
+
+    def apply_settings(self, settings: Settings) -> None:
+        self.threshold = settings.loop_lag_threshold_ms / 1000
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = self._last_report = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = self._loop.call_later(self.interval, self._beat, self._last_beat + self.interval)
+        self._watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f'[LoopLagMonitor] Monitoring event loop, threshold: {self.threshold * 1000:.0f}ms')
+
+    def stop(self) -> None:
+        """Stop monitoring and log the final summary."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+        self._report()
+
+    def _beat(self, expected: float) -> None:
+        """Heartbeat callback: the delay past its scheduled time is the loop lag."""
+        now = time.monotonic()
+        lag = max(0.0, now - expected)
+        self.samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.stalls += 1
+            logger.warning(
+                f'[LoopLagMonitor] Event loop blocked for {lag * 1000:.0f}ms in {self._culprit or "unknown code"}'
+            )
+        self._culprit = None
+        self._last_beat = now
+        if now - self._last_report >= self.report_interval:
+            self._report()
+            self._last_report = now
+        if not self._stop.is_set():
+            self._heartbeat = self._loop.call_later(self.interval, self._beat, now + self.interval)
+
+    def _watch(self) -> None:
+        """Watchdog thread: sample the loop thread's stack while the heartbeat is overdue."""
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue < self.threshold / 2 or self._culprit is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            self._culprit = describe_frames(frame)
+
+    def summary(self) -> dict:
+        """Lag statistics of the recent heartbeats, in milliseconds."""
+        samples = sorted(self.samples)
+        if not samples:
+            return {'samples': 0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0, 'stalls': self.stalls}
+        return {
+            'samples': len(samples),
+            'p50_ms': statistics.median(samples) * 1000,
+            'p99_ms': samples[max(0, int(len(samples) * 0.99) - 1)] * 1000,
+            'max_ms': self.max_lag * 1000,
+            'stalls': self.stalls,
+        }
+
+    def _report(self) -> None:
+        s = self.summary()
+        logger.info(
+            f'[LoopLagMonitor] Loop lag over {s["samples"]} heartbeats: p50 {s["p50_ms"]:.1f}ms, '
+            f'p99 {s["p99_ms"]:.1f}ms, max {s["max_ms"]:.1f}ms, stalls over threshold: {s["stalls"]}'
+        )
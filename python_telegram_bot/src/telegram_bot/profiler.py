@@ -0,0 +1,280 @@
+"""
+On-demand profiling of the running bot.
+
+A profile runs for a given number of seconds (or until stopped) with either cProfile, which records every call
+on the event loop thread, or a sampling profiler, which reads the event loop thread's stack from another thread
+at a fixed interval and costs almost nothing to the bot. Optionally, tracemalloc snapshots taken at the start
+and the end show which lines of the bot grew its memory. Results are written to data/profiles/.
+"""
+
+import asyncio
+import contextlib
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from types import FrameType
+
+from .loop_monitor import PACKAGE_DIR
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+MAX_PROFILE_SECONDS = 600
+# Frames kept per allocation traceback while tracing memory
+MEMORY_FRAMES = 10
+# Names of the selector calls in which the event loop waits for I/O
+_IDLE_SELECTORS = ('select.epoll', 'select.kqueue', 'select.poll', 'select.devpoll', 'select.select')
+
+
+@dataclass
+class ProfileResult:
+    """Files and summaries of a finished profile."""
+
+    mode: str
+    seconds: float  # Actual duration, shorter than requested if the profile was stopped
+    path: str  # pstats dump (cprofile) or collapsed stacks for flame graphs (sample)
+    summary: str  # Top functions
+    memory_path: str | None = None  # tracemalloc snapshot at the end
+    memory_summary: str = ''  # Top memory growth by line of bot code
+
+
+def _location(filename: str, lineno: int, name: str) -> str:
+    if filename == '~':  # Built-in function
+        return name
+    return f'{name} ({os.path.basename(filename)}:{lineno})'
+
+
+def summarize_cprofile(profile: cProfile.Profile, path: str, top: int = 15) -> str:
+    """Dump a cProfile profile to a file and list the functions with the most own time."""
+    stats = pstats.Stats(profile)
+    stats.dump_stats(path)
+    idle = 0.0
+    entries = []
+    for (filename, lineno, name), (_, calls, own_time, cumulative_time, _) in stats.stats.items():
+        if filename == '~' and any(selector in name for selector in _IDLE_SELECTORS):
+            idle += own_time
+            continue
+        entries.append((own_time, cumulative_time, calls, _location(filename, lineno, name)))
+    entries.sort(reverse=True)
+    lines = [f'Idle (waiting for I/O): {idle:.2f}s', 'own s / cumulative s / calls / function:']
+    lines.extend(
+        f'{own_time:.3f} / {cumulative_time:.3f} / {calls} / {location}'
+        for own_time, cumulative_time, calls, location in entries[:top]
+    )
+    return '\n'.join(lines)
+
+
+class StackSampler:
+    """Samples a thread's Python stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        """
+        Args:
+            thread_id: Thread whose stack is sampled, e.g. the event loop's
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()  # Outermost frame first
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            if frame.f_code.co_name == 'select' and frame.f_code.co_filename.endswith('selectors.py'):
+                self.idle += 1  # The event loop is waiting for I/O
+                continue
+            self.stacks[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame: FrameType | None) -> tuple[str, ...]:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return tuple(reversed(names))
+
+    def summarize(self, path: str, top: int = 15) -> str:
+        """Write the stacks in the collapsed format of flame graph tools and list the busiest functions."""
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{";".join(stack)} {count}\n')
+
+        own: Counter[str] = Counter()
+        inclusive: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                inclusive[name] += count
+        total = max(self.samples, 1)
+        lines = [
+            f'{self.samples} samples, idle (waiting for I/O): {self.idle / total:.0%}',
+            'own % / total % / function:',
+        ]
+        lines.extend(
+            f'{count / total:.1%} / {inclusive[name] / total:.1%} / {name}' for name, count in own.most_common(top)
+        )
+        return '\n'.join(lines)
+
+
+def summarize_memory(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, path: str, top: int = 10) -> str:
+    """
+    Dump the final snapshot and list the memory growth between the snapshots.
+
+    Allocations are attributed to the innermost frame of the bot's own code in their traceback (e.g. the
+    GameLogic line that filled a dict), or to the allocating line if the bot's code is not involved.
+    """
+    after.dump(path)
+    # Allocations of the profiling itself are left out
+    ignored = [
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ]
+    before = before.filter_traces(ignored)
+    after = after.filter_traces(ignored)
+
+    growth: Counter[str] = Counter()
+    blocks: Counter[str] = Counter()
+    for stat in after.compare_to(before, 'traceback'):
+        frames = list(stat.traceback)  # Oldest frame first
+        frame = next(
+            (frame for frame in reversed(frames) if os.path.dirname(os.path.abspath(frame.filename)) == PACKAGE_DIR),
+            frames[-1],
+        )
+        key = f'{os.path.basename(frame.filename)}:{frame.lineno}'
+        growth[key] += stat.size_diff
+        blocks[key] += stat.count_diff
+
+    total = sum(growth.values())
+    lines = [f'Memory growth: {total / 1024:+.1f} KiB', 'KiB / blocks / line:']
+    lines.extend(f'{size / 1024:+.1f} / {blocks[key]:+d} / {key}' for key, size in growth.most_common(top) if size > 0)
+    return '\n'.join(lines)
+
+
+class Profiler:
+    """Runs one profile at a time on the event loop thread."""
+
+    def __init__(self, data_dir: str = 'data', top: int = 15, sample_interval: float = 0.005):
+        """
+        Args:
+            data_dir: Data directory; profiles are written to its profiles/ subdirectory
+            top: Functions listed in the summaries
+            sample_interval: Seconds between stack samples of the sampling profiler
+        """
+        self.output_dir = os.path.join(data_dir, 'profiles')
+        self.top = top
+        self.sample_interval = sample_interval
+        self._stop: asyncio.Event | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._stop is not None
+
+    def stop(self) -> bool:
+        """End the running profile early; returns False if none is running."""
+        if self._stop is None:
+            return False
+        self._stop.set()
+        return True
+
+    async def run(self, seconds: float, mode: str = 'cprofile', memory: bool = False) -> ProfileResult:
+        """
+        Profile the event loop thread for the given number of seconds, or until stop() is called.
+
+        Args:
+            seconds: Duration, at most MAX_PROFILE_SECONDS
+            mode: "cprofile" or "sample"
+            memory: Also compare tracemalloc snapshots taken at the start and the end
+
+        Raises:
+            RuntimeError: If a profile is already running
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'Unknown profile mode: {mode!r}, expected one of {list(PROFILE_MODES)}')
+        if self.running:
+            raise RuntimeError('A profile is already running')
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        stop = self._stop = asyncio.Event()
+        logger.info(f'[Profiler] Profiling for {seconds}s with {mode}{" and tracemalloc" if memory else ""}')
+
+        started_tracing = memory and not tracemalloc.is_tracing()
+        profile = sampler = before = after = None
+        start = time.monotonic()
+        try:
+            if started_tracing:
+                tracemalloc.start(MEMORY_FRAMES)
+            if memory:
+                before = tracemalloc.take_snapshot()
+            if mode == 'cprofile':
+                profile = cProfile.Profile()
+                profile.enable()
+            else:
+                sampler = StackSampler(threading.get_ident(), self.sample_interval)
+                sampler.start()
+            try:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(stop.wait(), seconds)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                if sampler is not None:
+                    sampler.stop()
+            if memory:
+                after = tracemalloc.take_snapshot()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._stop = None
+        elapsed = time.monotonic() - start
+
+        # Files are written and summarized off the event loop
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f'profile_{datetime.now():%Y%m%d_%H%M%S}')
+        if profile is not None:
+            result = ProfileResult(
+                mode,
+                elapsed,
+                f'{base}.prof',
+                await asyncio.to_thread(summarize_cprofile, profile, f'{base}.prof', self.top),
+            )
+        else:
+            result = ProfileResult(
+                mode,
+                elapsed,
+                f'{base}.collapsed',
+                await asyncio.to_thread(sampler.summarize, f'{base}.collapsed', self.top),
+            )
+        if memory:
+            result.memory_path = f'{base}.tracemalloc'
+            result.memory_summary = await asyncio.to_thread(summarize_memory, before, after, result.memory_path)
+        logger.info(f'[Profiler] Profile of {elapsed:.1f}s written to {result.path}')
+        return result
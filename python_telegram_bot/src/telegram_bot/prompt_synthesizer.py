@@ -0,0 +1,165 @@
+"""
+Local template-based synthesizer of image prompts.
+
+Prompts of the prompt model always have the same shape: two objects, an illusion that makes one of them
+look smaller, a measured size difference, and an explanation in Russian. The synthesizer fills the same
+shape from parameter tables, so a prompt for a chosen correct answer takes microseconds instead of a
+reasoning-model completion. The same answer and seed always give the same prompt.
+"""
+
+import random
+from dataclasses import dataclass
+
+
+ANSWERS = ('left', 'right', 'equal')
+
+
+@dataclass(frozen=True, slots=True)
+class Shape:
+    """An object shape with its English and Russian names."""
+
+    singular: str
+    plural: str
+    dimension: str  # Measured dimension
+    names: tuple[str, str, str]  # Left one, right one and both, in Russian
+
+
+SHAPES = {
+    'circle': Shape('circle', 'circles', 'diameter', ('левый круг', 'правый круг', 'оба круга')),
+    'square': Shape('square', 'squares', 'side length', ('левый квадрат', 'правый квадрат', 'оба квадрата')),
+    'bar': Shape('bar', 'bars', 'length', ('левый прямоугольник', 'правый прямоугольник', 'оба прямоугольника')),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class PromptTemplate:
+    """
+    An illusion with the shapes it works with.
+
+    The context sentence describes the surroundings of the object that should look smaller ({shrink})
+    and of the one that should look larger ({grow}).
+    """
+
+    name: str  # Russian name of the illusion
+    effect: str  # Russian description of how the illusion deceives the eye
+    shapes: tuple[str, ...]
+    context: str
+
+
+TEMPLATES = {
+    'ebbinghaus': PromptTemplate(
+        name='Иллюзия Эббингауза',
+        effect='фигура среди крупных фигур кажется меньше, а среди мелких — больше',
+        shapes=('circle', 'square'),
+        context=(
+            'The {shrink} {shape} is surrounded by {count} large {shapes} ({large}x its size), making it appear '
+            'smaller. The {grow} {shape} is surrounded by {count} tiny {shapes} ({small}x its size), making it '
+            'appear larger.'
+        ),
+    ),
+    'delboeuf': PromptTemplate(
+        name='Иллюзия Дельбёфа',
+        effect='фигура в широкой рамке кажется меньше, а в тесной — больше',
+        shapes=('circle', 'square'),
+        context=(
+            'The {shrink} {shape} sits inside a thin outline {large}x its size, leaving a wide empty margin that '
+            'makes it appear smaller. The {grow} {shape} sits inside a tight outline only 1.1x its size, making it '
+            'appear larger.'
+        ),
+    ),
+    'ponzo': PromptTemplate(
+        name='Иллюзия Понцо',
+        effect='из-за сходящихся линий фигура в «дальней» узкой части кажется больше, чем в «ближней» широкой',
+        shapes=('bar',),
+        context=(
+            'Both {shapes} stand upright. Two straight lines converge towards the {grow} edge of the image like '
+            'a corridor seen in perspective. The {shrink} {shape} stands in the near, wide part, making it appear '
+            'smaller; the {grow} {shape} stands in the distant, narrow part, making it appear larger.'
+        ),
+    ),
+    'muller_lyer': PromptTemplate(
+        name='Иллюзия Мюллера-Лайера',
+        effect='фигура со стрелками на концах кажется короче, а с «хвостами» наружу — длиннее',
+        shapes=('bar',),
+        context=(
+            'Both {shapes} are horizontal. The {shrink} {shape} ends in inward-pointing arrowheads at both ends, '
+            'making it appear shorter. The {grow} {shape} ends in outward-pointing fins at both ends, making it '
+            'appear longer.'
+        ),
+    ),
+}
+
+STYLES = (
+    'Clean white background, flat 2D vector style, no text.',
+    'Light grey background, flat colors, no shadows, no text.',
+    'Plain white background, simple geometric drawing with thin black outlines, no text.',
+)
+
+COLORS = ('orange', 'red', 'teal', 'purple', 'green', 'blue')
+
+
+@dataclass(frozen=True, slots=True)
+class SynthesizedPrompt:
+    prompt: str
+    correct_answer: str  # "left", "right", "equal"
+    explanation: str  # Explanation in Russian
+    illusion: str
+
+
+def synthesize_prompt(
+    correct_answer: str, seed: int, illusions: tuple[str, ...] = tuple(TEMPLATES)
+) -> SynthesizedPrompt:
+    """
+    Synthesize an image prompt and its explanation for a correct answer.
+
+    Args:
+        correct_answer: "left", "right" or "equal"
+        seed: Seed of the illusion, shapes and sizes; the same seed gives the same prompt
+        illusions: Illusions to choose from, keys of TEMPLATES
+
+    Returns:
+        SynthesizedPrompt with the prompt and the explanation in Russian
+    """
+    if correct_answer not in ANSWERS:
+        raise ValueError(f'Unknown answer: {correct_answer!r}')
+
+    rng = random.Random(seed)
+    illusion = rng.choice(illusions)
+    template = TEMPLATES[illusion]
+    shape = SHAPES[rng.choice(template.shapes)]
+    difference = rng.randrange(10, 26)  # Percent, large enough to measure and small enough to be deceived
+
+    # The context makes the actually larger object look smaller, or one of two equal objects
+    if correct_answer == 'equal':
+        shrink = rng.choice(('left', 'right'))
+        sizes = f'Both {shape.plural} are exactly the same {shape.dimension} when measured with a ruler.'
+    else:
+        shrink = correct_answer
+        smaller = 'right' if correct_answer == 'left' else 'left'
+        sizes = (
+            f'The {correct_answer} {shape.singular} is exactly {difference}% larger in {shape.dimension} '
+            f'than the {smaller} one when measured with a ruler.'
+        )
+    grow = 'right' if shrink == 'left' else 'left'
+    context = template.context.format(
+        shrink=shrink,
+        grow=grow,
+        shape=shape.singular,
+        shapes=shape.plural,
+        count=rng.choice((5, 6, 8)),
+        large=rng.choice((1.8, 2, 2.5)),
+        small=rng.choice((0.3, 0.4, 0.5)),
+    )
+    prompt = (
+        f'Two {rng.choice(COLORS)} {shape.plural} side by side. {sizes} {context} '
+        f'This is the {illusion.replace("_", "-").title()} illusion. {rng.choice(STYLES)}'
+    )
+
+    left_name, right_name, both_name = shape.names
+    explanation = f'{template.name}: {template.effect}. '
+    if correct_answer == 'equal':
+        explanation += f'Если измерить линейкой, {both_name} одинакового размера.'
+    else:
+        larger = left_name if correct_answer == 'left' else right_name
+        explanation += f'Если измерить линейкой, {larger} больше на {difference}%.'
+    return SynthesizedPrompt(prompt=prompt, correct_answer=correct_answer, explanation=explanation, illusion=illusion)
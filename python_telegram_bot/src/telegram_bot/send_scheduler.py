@@ -0,0 +1,312 @@
+"""
+Central scheduler of outbound Bot API requests.
+
+Every request addressed to a chat (messages, photos, edits, deletions) passes through the scheduler,
+installed as a request middleware of the bot session, so handlers keep calling the bot directly.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import statistics
+import time
+from collections import OrderedDict, deque
+from collections.abc import Generator
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from .config import Settings
+from .tracing import set_attributes
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Send priorities, lower is served first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+# Priority of the sends made in the current context; handlers are interactive
+send_priority: contextvars.ContextVar[int] = contextvars.ContextVar('send_priority', default=INTERACTIVE)
+
+# Idle per-chat rate limiters are forgotten beyond this many chats
+MAX_TRACKED_CHATS = 10000
+
+
+@contextlib.contextmanager
+def bulk_sends() -> Generator[None]:
+    """Mark the sends made in this context (and tasks created in it) as bulk, e.g. a broadcast."""
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket of `rate` sends per second with bursts of up to `burst` sends, which can be paused."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds until a send is allowed, 0 if it is allowed now."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self) -> None:
+        self._tokens -= 1
+
+    def pause(self, until: float) -> None:
+        """Allow no sends before the given time."""
+        self._paused_until = max(self._paused_until, until)
+        self._tokens = 0.0
+
+    def idle(self, now: float) -> bool:
+        """Whether the bucket is full again, so it can be forgotten."""
+        self.delay(now)  # Refills the bucket
+        return now >= self._paused_until and self._tokens >= self.burst
+
+
+class ChatLimiter(TokenBucket):
+    """Rate limiter of one chat, which also keeps the chat's requests in order."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        super().__init__(rate, burst)
+        self.lock = asyncio.Lock()
+
+    def idle(self, now: float) -> bool:
+        return not self.lock.locked() and super().idle(now)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Enforces per-chat and global send rates and retries flood-control errors.
+
+    A request waits for its chat's rate limiter first (private chats and groups have different limits),
+    then joins the global queue; requests to one chat are granted in the order they were made. The global
+    queue is served at the global rate, interactive requests first; bulk requests are additionally limited
+    to the bulk rate, so a broadcast leaves room for replies.
+    A TelegramRetryAfter pauses the chat for exactly the time Telegram asks for and, for a bulk request,
+    all bulk sends; the request is then retried. The time requests spend waiting is recorded per priority.
+    Requests without a chat (getUpdates, answerCallbackQuery) are passed through.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        bulk_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_retries: int = 5,
+        report_interval: float = 600.0,
+        history: int = 10000,
+    ):
+        """
+        Args:
+            global_rate: Requests per second over all chats
+            bulk_rate: Bulk requests per second, at most the global rate
+            chat_rate: Requests per second to one private chat
+            group_rate: Requests per second to one group chat
+            chat_burst: Requests that can be sent to an idle chat at once
+            max_retries: Flood-control retries of a request before the error is raised
+            report_interval: Seconds between queue latency summaries in the log
+            history: Number of recent queue latencies kept per priority for the summary
+        """
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self._global = TokenBucket(global_rate)
+        self._bulk = TokenBucket(min(bulk_rate, global_rate))
+        self._chats: OrderedDict[int | str, ChatLimiter] = OrderedDict()
+
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+
+        self.latencies: dict[int, deque[float]] = {priority: deque(maxlen=history) for priority in PRIORITY_NAMES}
+        self.sent = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.retries = 0
+        self._last_report = time.monotonic()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'SendScheduler':
+        """
+        Create a scheduler from the SEND_GLOBAL_RATE, BROADCAST_RATE, SEND_CHAT_RATE and SEND_GROUP_PER_MINUTE
+        settings.
+        """
+        return cls(
+            global_rate=settings.send_global_rate,
+            bulk_rate=settings.broadcast_rate,
+            chat_rate=settings.send_chat_rate,
+            group_rate=settings.send_group_per_minute / 60,
+        )
+
+    def apply_settings(self, settings: Settings) -> None:
+        """Change the rates; requests waiting in the queues are served at the new rates."""
+        self._global.rate = settings.send_global_rate
+        self._bulk.rate = min(settings.broadcast_rate, settings.send_global_rate)
+        self.chat_rate = settings.send_chat_rate
+        self.group_rate = settings.send_group_per_minute / 60
+        for chat_id, chat in self._chats.items():
+            chat.rate = self._rate(chat_id)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+        queued = time.monotonic()
+        retries = 0
+        while True:
+            chat = self._chat_limiter(chat_id)
+            async with chat.lock:
+                await self._acquire_chat(chat)
+                await self._acquire_global(priority)
+            latency = time.monotonic() - queued
+            self._record(priority, latency)
+            # Time spent in the queue, as part of the Bot API call's span
+            set_attributes(queue_ms=round(latency * 1000, 1))
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                self.retries += 1
+                resume = time.monotonic() + e.retry_after
+                chat.pause(resume)
+                if priority == BULK:
+                    self._bulk.pause(resume)
+                logger.warning(
+                    f'[SendScheduler] Flood control on {type(method).__name__} in chat {chat_id}, '
+                    f'retrying in {e.retry_after}s ({retries}/{self.max_retries})'
+                )
+                queued = time.monotonic()
+
+    def _rate(self, chat_id: int | str) -> float:
+        # Group and channel chat IDs are negative
+        return self.group_rate if str(chat_id).startswith(('-', '@')) else self.chat_rate
+
+    def _chat_limiter(self, chat_id: int | str) -> ChatLimiter:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = ChatLimiter(self._rate(chat_id), self.chat_burst)
+            if len(self._chats) > MAX_TRACKED_CHATS:
+                now = time.monotonic()
+                for idle_chat in [key for key, chat in self._chats.items() if chat.idle(now)]:
+                    del self._chats[idle_chat]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire_chat(self, chat: ChatLimiter) -> None:
+        while (delay := chat.delay(time.monotonic())) > 0:
+            await asyncio.sleep(delay)
+        chat.take()
+
+    async def _acquire_global(self, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self) -> None:
+        """Grant the global queue's requests in priority order, at the global and bulk rates."""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():  # The request was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            delay = self._global.delay(now)
+            if priority == BULK:
+                delay = max(delay, self._bulk.delay(now))
+            if delay > 0:
+                # Wake up early if a request of higher priority arrives
+                self._wakeup.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+            heapq.heappop(self._waiters)
+            self._global.take()
+            if priority == BULK:
+                self._bulk.take()
+            future.set_result(None)
+
+    def _record(self, priority: int, latency: float) -> None:
+        self.latencies[priority].append(latency)
+        self.sent[priority] += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.report_interval:
+            self._report()
+            self._last_report = now
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting in the global queue."""
+        return sum(not future.done() for _, _, future in self._waiters)
+
+    def summary(self) -> dict:
+        """Queue latency of the recent requests per priority, in milliseconds."""
+        result = {'queued': self.queued, 'retries': self.retries}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(self.latencies[priority])
+            if not samples:
+                result[name] = {'sent': self.sent[priority], 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+                continue
+            result[name] = {
+                'sent': self.sent[priority],
+                'p50_ms': statistics.median(samples) * 1000,
+                'p99_ms': samples[max(0, int(len(samples) * 0.99) - 1)] * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+        return result
+
+    def _report(self) -> None:
+        s = self.summary()
+        latencies = ', '.join(
+            f'{name} {s[name]["sent"]} sent, p50 {s[name]["p50_ms"]:.0f}ms, p99 {s[name]["p99_ms"]:.0f}ms, '
+            f'max {s[name]["max_ms"]:.0f}ms'
+            for name in PRIORITY_NAMES.values()
+        )
+        logger.info(
+            f'[SendScheduler] Queue latency: {latencies}; {s["queued"]} queued, {s["retries"]} flood-control retries'
+        )
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Let the queued requests go out, then stop the dispatcher and log the final summary."""
+        if self._dispatcher is not None:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(asyncio.shield(self._dispatcher), timeout)
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        self._report()
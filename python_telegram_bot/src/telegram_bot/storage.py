@@ -0,0 +1,1270 @@
+import abc
+import asyncio
+import bisect
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+from urllib.request import pathname2url
+
+import aiosqlite
+
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DatabaseConnection:
+    """Async context manager for thread-safe database connections."""
+
+    def __init__(self, db_file: str, lock: asyncio.Lock):
+        self.db_file = db_file
+        self.lock = lock
+        self.db = None
+
+    async def __aenter__(self):
+        """Acquire lock and open database connection."""
+        await self.lock.acquire()
+        self.db = await aiosqlite.connect(self.db_file)
+        return self.db
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Close database connection and release lock."""
+        if self.db:
+            await self.db.close()
+        self.lock.release()
+        return False
+
+
+@dataclass
+class AnswerEvent:
+    """A single answer given by a user, as persisted by the storage backends."""
+
+    user_id: str
+    is_correct: bool
+    username: str = ''
+    timestamp: float = field(default_factory=time.time)
+    chat_id: str = ''  # Chat the challenge was answered in
+    answer: str = ''  # Answer the user gave
+    correct_answer: str = ''
+    source: str = ''  # Challenge source: "ai" or "local"
+    detail: str = ''  # Image tier for AI challenges, illusion type for local ones
+
+    @property
+    def day(self) -> str:
+        """Local date of the answer, the key of the daily rollups."""
+        return datetime.fromtimestamp(self.timestamp).date().isoformat()
+
+
+class StatsRow(NamedTuple):
+    """User statistics as stored by a backend."""
+
+    total_challenges: int
+    correct_answers: int
+    username: str
+
+
+class DailyStats(NamedTuple):
+    """Answers of a user on one day."""
+
+    day: str  # ISO date
+    answers: int
+    correct: int
+
+
+class IllusionStats(NamedTuple):
+    """Answers to the challenges of one illusion type."""
+
+    source: str
+    detail: str
+    answers: int
+    correct: int
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.answers * 100 if self.answers else 0.0
+
+
+def rollup_answers(events: list[AnswerEvent]) -> tuple[dict, dict]:
+    """
+    Aggregate answers into rollup increments.
+
+    Returns:
+        Increments [answers, correct] of the daily user rollup by (user_id, day) and of the daily
+        illusion rollup by (day, source, detail)
+    """
+    users: defaultdict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0])
+    illusions: defaultdict[tuple[str, str, str], list[int]] = defaultdict(lambda: [0, 0])
+    for event in events:
+        day = event.day
+        for counts in (users[event.user_id, day], illusions[day, event.source, event.detail]):
+            counts[0] += 1
+            counts[1] += int(event.is_correct)
+    return users, illusions
+
+
+def _since(days: int | None) -> str:
+    """First day of a window of the given number of days ending today, or the earliest possible day."""
+    if days is None:
+        return ''
+    return (date.today() - timedelta(days=days - 1)).isoformat()
+
+
+class LeaderboardCursor(NamedTuple):
+    """Position of a row in the leaderboard order, used as a keyset pagination cursor."""
+
+    rank: int
+    correct_answers: int
+    total_challenges: int
+    user_id: str
+
+    def encode(self) -> str:
+        """Encode the cursor for callback data."""
+        return f'{self.rank}:{self.correct_answers}:{self.total_challenges}:{self.user_id}'
+
+    @classmethod
+    def decode(cls, data: str) -> 'LeaderboardCursor':
+        """Decode a cursor produced by encode()."""
+        rank, correct_answers, total_challenges, user_id = data.split(':', 3)
+        return cls(int(rank), int(correct_answers), int(total_challenges), user_id)
+
+    @property
+    def key(self) -> tuple[int, int, str]:
+        """Sort key: more correct answers first, then fewer challenges, then user id."""
+        return -self.correct_answers, self.total_challenges, self.user_id
+
+
+@dataclass
+class LeaderboardPage:
+    """A page of the leaderboard."""
+
+    entries: list[tuple]  # (rank, user_id, username, score, accuracy)
+    first: LeaderboardCursor | None = None
+    last: LeaderboardCursor | None = None
+    has_prev: bool = False
+    has_next: bool = False
+
+
+class StatsStorage(abc.ABC):
+    """
+    Common interface of the user statistics storage backends.
+
+    Statistics and the leaderboard belong to the current season; a reset starts the next one.
+    """
+
+    season: int  # Current season, starting at 1
+
+    async def open(self) -> None:
+        """Prepare the storage (create tables, load state); an optional hook, by default nothing to prepare."""
+        return
+
+    async def close(self) -> None:
+        """Flush pending writes and release resources; an optional hook, by default nothing to release."""
+        return
+
+    @abc.abstractmethod
+    async def load_user(self, user_id: str) -> StatsRow | None:
+        """Return stored statistics for a user or None if the user is unknown."""
+
+    @abc.abstractmethod
+    async def record_answer(self, event: AnswerEvent) -> None:
+        """
+        Persist an answer and add it to the user's statistics.
+
+        Args:
+            event: The answer that has just been given
+        """
+
+    async def record_answers(self, events: list[AnswerEvent]) -> None:
+        """
+        Persist several answers at once, e.g. all answers of a group round.
+
+        Args:
+            events: The answers that have just been given
+        """
+        for event in events:
+            await self.record_answer(event)
+
+    @abc.abstractmethod
+    async def get_leaderboard(self, user_id: str, limit: int = 10) -> dict:
+        """
+        Return leaderboard data in the format of GameLogic.get_leaderboard.
+
+        Ranks are positions in the leaderboard order, the same as on the leaderboard pages.
+        """
+
+    @abc.abstractmethod
+    async def get_leaderboard_page(
+        self,
+        after: LeaderboardCursor | None = None,
+        before: LeaderboardCursor | None = None,
+        page_size: int = 10,
+    ) -> LeaderboardPage:
+        """
+        Return a leaderboard page using keyset pagination.
+
+        Args:
+            after: Return the page following this row (first page if neither cursor is given)
+            before: Return the page preceding this row
+            page_size: Number of rows per page
+        """
+
+    @abc.abstractmethod
+    async def get_user_leaderboard_page(self, user_id: str, page_size: int = 10) -> LeaderboardPage | None:
+        """Return the leaderboard page containing the user, or None if the user is not ranked."""
+
+    @abc.abstractmethod
+    def iter_users(self, chunk_size: int = 1000) -> AsyncIterator[list[tuple]]:
+        """
+        Stream the statistics of all users in chunks, e.g. for an export; memory use does not grow with the user count.
+
+        Args:
+            chunk_size: Users per chunk
+
+        Yields:
+            Lists of (user_id, total_challenges, correct_answers, username) tuples, ordered by user id
+        """
+
+    @abc.abstractmethod
+    async def get_daily_stats(self, user_id: str, days: int = 7) -> list[DailyStats]:
+        """
+        Return the user's answers per day, read from the daily rollup.
+
+        Args:
+            user_id: Telegram user ID
+            days: Number of days up to and including today
+
+        Returns:
+            The days with answers, oldest first
+        """
+
+    @abc.abstractmethod
+    async def get_illusion_stats(self, days: int | None = None) -> list[IllusionStats]:
+        """
+        Return the accuracy per illusion type, read from the daily illusion rollup.
+
+        Args:
+            days: Number of days up to and including today, or None for all time
+
+        Returns:
+            Illusion types, most answered first
+        """
+
+    @abc.abstractmethod
+    async def reset(self) -> None:
+        """
+        Start a new season in constant time, so all users start from zero.
+
+        The finished season is archived; the answer history and the daily rollups are kept.
+        """
+
+    @abc.abstractmethod
+    async def prune_seasons(self, keep: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        """
+        Delete the archived statistics of old seasons in small batches, e.g. in a background task.
+
+        Args:
+            keep: Number of the most recent finished seasons to keep
+            batch_size: Users deleted per transaction (season archive files with the event log)
+            pause: Seconds between batches
+
+        Returns:
+            Number of pruned seasons
+        """
+
+    @abc.abstractmethod
+    async def prune_rollups(self, days: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        """
+        Delete the daily rollups of the days before a retention window in small batches, e.g. in a background task.
+
+        Args:
+            days: Number of days up to and including today to keep
+            batch_size: Rollup rows deleted per transaction
+            pause: Seconds between batches
+
+        Returns:
+            Number of deleted rollup rows
+        """
+
+
+def _leaderboard_entry(rank: int, user_id: str, row: StatsRow) -> tuple:
+    """Build a leaderboard tuple: rank, user_id, username, score, accuracy."""
+    total_challenges, correct_answers, username = row
+    accuracy = (correct_answers / total_challenges * 100) if total_challenges > 0 else 0
+    return rank, user_id, username or 'Anonymous', correct_answers, accuracy
+
+
+def _build_page(rows: list[tuple], start_rank: int, has_prev: bool, has_next: bool) -> LeaderboardPage:
+    """
+    Build a leaderboard page.
+
+    Args:
+        rows: (user_id, total_challenges, correct_answers, username) tuples in leaderboard order
+        start_rank: Rank of the first row
+        has_prev: Whether there are rows before the page
+        has_next: Whether there are rows after the page
+    """
+    entries = []
+    cursors = []
+    for rank, (user_id, total_challenges, correct_answers, username) in enumerate(rows, start_rank):
+        entries.append(_leaderboard_entry(rank, user_id, StatsRow(total_challenges, correct_answers, username)))
+        cursors.append(LeaderboardCursor(rank, correct_answers, total_challenges, user_id))
+    if not cursors:
+        return LeaderboardPage(entries=[])
+    return LeaderboardPage(entries, cursors[0], cursors[-1], has_prev, has_next)
+
+
+_USER_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        season INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        total_challenges INTEGER DEFAULT 0,
+        correct_answers INTEGER DEFAULT 0,
+        username TEXT DEFAULT '',
+        rank_score INTEGER GENERATED ALWAYS AS (-correct_answers) VIRTUAL,
+        PRIMARY KEY (season, user_id)
+    )
+"""
+
+
+class SQLiteStatsStorage(StatsStorage):
+    """
+    Stores one mutable row per user and season in the user_stats SQLite table.
+
+    A reset starts a new season with a single insert; the rows of earlier seasons stay as their archive
+    until prune_seasons removes them.
+    """
+
+    def __init__(self, data_dir: str):
+        self.db_file = os.path.join(data_dir, 'user_stats.db')
+        self._db_lock = asyncio.Lock()  # Database lock for thread-safe operations
+        self.season = 1
+
+    async def open(self) -> None:
+        """Create database tables and run migrations"""
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            # Readers (exports) work on a snapshot and do not block writers
+            await db.execute('PRAGMA journal_mode=WAL')
+
+            # Create tables if not exist
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS seasons (
+                    id INTEGER PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    ended_at REAL,
+                    pruned INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            await db.execute(_USER_STATS_TABLE)
+
+            # Check if username column exists, if not add it (migration)
+            async with db.execute('PRAGMA table_info(user_stats)') as cursor:
+                columns = await cursor.fetchall()
+                column_names = [col[1] for col in columns]
+
+                if 'username' not in column_names:
+                    logger.info('[SQLiteStatsStorage] Adding username column to user_stats table')
+                    await db.execute("ALTER TABLE user_stats ADD COLUMN username TEXT DEFAULT ''")
+
+            # Statistics are keyed by season: the primary key changes, so the table is rebuilt (migration),
+            # and the statistics kept so far become the first season
+            if 'season' not in column_names:
+                logger.info('[SQLiteStatsStorage] Moving user_stats to seasons, existing statistics become season 1')
+                await db.execute('ALTER TABLE user_stats RENAME TO user_stats_before_seasons')
+                await db.execute(_USER_STATS_TABLE)
+                await db.execute("""
+                    INSERT INTO user_stats (season, user_id, total_challenges, correct_answers, username)
+                    SELECT 1, user_id, total_challenges, correct_answers, username FROM user_stats_before_seasons
+                """)
+                await db.execute('DROP TABLE user_stats_before_seasons')
+
+            # The negated score column makes the leaderboard order ascending in every column, so that
+            # keyset pagination within the current season is a single row-value range scan on the index
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_stats_season_rank
+                ON user_stats (season, rank_score, total_challenges, user_id)
+                WHERE total_challenges > 0
+            """)
+
+            async with db.execute('SELECT MAX(id) FROM seasons') as cursor:
+                (season,) = await cursor.fetchone()
+            if season is None:
+                season = 1
+                await db.execute('INSERT INTO seasons (id, started_at) VALUES (?, ?)', (season, time.time()))
+            self.season = season
+
+            # Every answer, append-only: no secondary indexes to maintain on insert
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS answer_history (
+                    id INTEGER PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    user_id TEXT NOT NULL,
+                    chat_id TEXT NOT NULL DEFAULT '',
+                    answer TEXT NOT NULL DEFAULT '',
+                    correct_answer TEXT NOT NULL DEFAULT '',
+                    is_correct INTEGER NOT NULL,
+                    source TEXT NOT NULL DEFAULT '',
+                    detail TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            # Rollups maintained together with the history, read by the stats queries
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS daily_user_stats (
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    answers INTEGER NOT NULL,
+                    correct INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, day)
+                ) WITHOUT ROWID
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS daily_illusion_stats (
+                    day TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    detail TEXT NOT NULL,
+                    answers INTEGER NOT NULL,
+                    correct INTEGER NOT NULL,
+                    PRIMARY KEY (day, source, detail)
+                ) WITHOUT ROWID
+            """)
+
+            await db.commit()
+            logger.info('[SQLiteStatsStorage] Database tables created/verified')
+
+    async def load_user(self, user_id: str) -> StatsRow | None:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            async with db.execute(
+                """
+                SELECT total_challenges, correct_answers, username
+                FROM user_stats
+                WHERE season = ? AND user_id = ?
+            """,
+                (self.season, user_id),
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return StatsRow(row[0], row[1], row[2] or '')
+
+    async def record_answer(self, event: AnswerEvent) -> None:
+        await self.record_answers([event])
+
+    async def record_answers(self, events: list[AnswerEvent]) -> None:
+        # One transaction for the whole batch: user totals, history and rollups
+        users, illusions = rollup_answers(events)
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            await db.executemany(
+                """
+                INSERT INTO user_stats (season, user_id, total_challenges, correct_answers, username)
+                VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (season, user_id) DO UPDATE
+                SET total_challenges = total_challenges + 1,
+                    correct_answers = correct_answers + excluded.correct_answers,
+                    username = CASE WHEN excluded.username != '' THEN excluded.username ELSE username END
+            """,
+                [(self.season, event.user_id, int(event.is_correct), event.username) for event in events],
+            )
+            await db.executemany(
+                """
+                INSERT INTO answer_history (ts, user_id, chat_id, answer, correct_answer, is_correct, source, detail)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                [
+                    (
+                        event.timestamp,
+                        event.user_id,
+                        event.chat_id,
+                        event.answer,
+                        event.correct_answer,
+                        int(event.is_correct),
+                        event.source,
+                        event.detail,
+                    )
+                    for event in events
+                ],
+            )
+            await db.executemany(
+                """
+                INSERT INTO daily_user_stats (user_id, day, answers, correct) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, day) DO UPDATE
+                SET answers = answers + excluded.answers, correct = correct + excluded.correct
+            """,
+                [(*key, *counts) for key, counts in users.items()],
+            )
+            await db.executemany(
+                """
+                INSERT INTO daily_illusion_stats (day, source, detail, answers, correct) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (day, source, detail) DO UPDATE
+                SET answers = answers + excluded.answers, correct = correct + excluded.correct
+            """,
+                [(*key, *counts) for key, counts in illusions.items()],
+            )
+            await db.commit()
+
+    async def iter_users(self, chunk_size: int = 1000) -> AsyncIterator[list[tuple]]:
+        # A separate read-only connection, outside the lock: the transaction reads one consistent snapshot
+        # while answers keep being written, and rows are fetched chunk by chunk in primary key order
+        uri = f'file:{pathname2url(os.path.abspath(self.db_file))}?mode=ro'
+        async with aiosqlite.connect(uri, uri=True) as db:
+            await db.execute('BEGIN')
+            # The current season is read from the snapshot, so exports of a storage that was not
+            # opened (e.g. the command line export) do not fall back to the first season
+            async with db.execute('SELECT MAX(id) FROM seasons') as cursor:
+                (season,) = await cursor.fetchone()
+            async with db.execute(
+                """
+                SELECT user_id, total_challenges, correct_answers, username
+                FROM user_stats
+                WHERE season = ?
+                ORDER BY user_id
+            """,
+                (season or self.season,),
+            ) as cursor:
+                while rows := await cursor.fetchmany(chunk_size):
+                    yield rows
+            await db.rollback()
+
+    async def get_daily_stats(self, user_id: str, days: int = 7) -> list[DailyStats]:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            async with db.execute(
+                'SELECT day, answers, correct FROM daily_user_stats WHERE user_id = ? AND day >= ? ORDER BY day',
+                (user_id, _since(days)),
+            ) as cursor:
+                return [DailyStats(*row) for row in await cursor.fetchall()]
+
+    async def get_illusion_stats(self, days: int | None = None) -> list[IllusionStats]:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            async with db.execute(
+                """
+                SELECT source, detail, SUM(answers), SUM(correct)
+                FROM daily_illusion_stats
+                WHERE day >= ?
+                GROUP BY source, detail
+                ORDER BY SUM(answers) DESC, source, detail
+            """,
+                (_since(days),),
+            ) as cursor:
+                return [IllusionStats(*row) for row in await cursor.fetchall()]
+
+    async def get_leaderboard(self, user_id: str, limit: int = 10) -> dict:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            # Get top users ordered by correct answers descending
+            top_users = []
+            async with db.execute(
+                """
+                SELECT user_id, total_challenges, correct_answers, username
+                FROM user_stats
+                WHERE season = ? AND total_challenges > 0
+                ORDER BY rank_score, total_challenges, user_id
+                LIMIT ?
+            """,
+                (self.season, limit),
+            ) as cursor:
+                rank = 1
+                async for user_id_db, total_challenges, correct_answers, username in cursor:
+                    top_users.append(
+                        _leaderboard_entry(rank, user_id_db, StatsRow(total_challenges, correct_answers, username))
+                    )
+                    rank += 1
+
+            # Get current user's rank
+            user_rank = None
+            if user_id:
+                async with db.execute(
+                    """
+                    SELECT total_challenges, correct_answers, username
+                    FROM user_stats
+                    WHERE season = ? AND user_id = ?
+                """,
+                    (self.season, user_id),
+                ) as cursor:
+                    user_row = await cursor.fetchone()
+
+                if user_row and user_row[0] > 0:  # If user has completed challenges
+                    total_challenges, correct_answers, _ = user_row
+                    rank = await self._position(db, (-correct_answers, total_challenges, user_id))
+                    user_rank = _leaderboard_entry(rank, user_id, StatsRow(*user_row))
+
+        return {'top_users': top_users, 'user_rank': user_rank}
+
+    async def _position(self, db, key: tuple) -> int:
+        """
+        Position of a row in the leaderboard order, the rank shown on the leaderboard pages.
+
+        The rows before it are counted with a range scan of the leaderboard index, so the cost grows with
+        the rank: an index-only count, run once per stats write and user because the bot caches the result.
+
+        Args:
+            db: Open database connection
+            key: (rank_score, total_challenges, user_id) of the row
+        """
+        async with db.execute(
+            """
+            SELECT COUNT(*)
+            FROM user_stats
+            WHERE season = ? AND total_challenges > 0 AND (rank_score, total_challenges, user_id) < (?, ?, ?)
+        """,
+            (self.season, *key),
+        ) as cursor:
+            return (await cursor.fetchone())[0] + 1
+
+    async def _fetch_ranked(self, db, op: str, key: tuple | None, limit: int) -> list[tuple]:
+        """
+        Fetch ranked rows relative to a key with an index range scan.
+
+        Args:
+            db: Open database connection
+            op: Comparison with the key: ">" or ">=" walks forward, "<" walks backward
+            key: (rank_score, total_challenges, user_id) or None to start at the top
+            limit: Maximum number of rows
+        """
+        order = 'DESC' if op == '<' else 'ASC'
+        condition = f'AND (rank_score, total_challenges, user_id) {op} (?, ?, ?)' if key else ''
+        async with db.execute(
+            f"""
+            SELECT user_id, total_challenges, correct_answers, username
+            FROM user_stats
+            WHERE season = ? AND total_challenges > 0 {condition}
+            ORDER BY rank_score {order}, total_challenges {order}, user_id {order}
+            LIMIT ?
+        """,
+            (self.season, *(key or ()), limit),
+        ) as cursor:
+            return list(await cursor.fetchall())
+
+    async def get_leaderboard_page(
+        self,
+        after: LeaderboardCursor | None = None,
+        before: LeaderboardCursor | None = None,
+        page_size: int = 10,
+    ) -> LeaderboardPage:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            if before is not None:
+                rows = await self._fetch_ranked(db, '<', before.key, page_size + 1)
+                has_prev = len(rows) > page_size
+                rows = rows[:page_size][::-1]
+                return _build_page(rows, before.rank - len(rows), has_prev, True)
+
+            rows = await self._fetch_ranked(db, '>', after.key if after else None, page_size + 1)
+            start_rank = after.rank + 1 if after else 1
+            return _build_page(rows[:page_size], start_rank, start_rank > 1, len(rows) > page_size)
+
+    async def get_user_leaderboard_page(self, user_id: str, page_size: int = 10) -> LeaderboardPage | None:
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            async with db.execute(
+                """
+                SELECT rank_score, total_challenges
+                FROM user_stats
+                WHERE season = ? AND user_id = ? AND total_challenges > 0
+            """,
+                (self.season, user_id),
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            key = (row[0], row[1], user_id)
+            position = await self._position(db, key)
+
+            # Align pages to multiples of page_size, so that the user's page matches regular browsing
+            offset_in_page = (position - 1) % page_size
+            before_rows = await self._fetch_ranked(db, '<', key, offset_in_page) if offset_in_page else []
+            rows = await self._fetch_ranked(db, '>=', key, page_size - offset_in_page + 1)
+            has_next = len(rows) > page_size - offset_in_page
+            rows = before_rows[::-1] + rows[: page_size - offset_in_page]
+            start_rank = position - offset_in_page
+            return _build_page(rows, start_rank, start_rank > 1, has_next)
+
+    async def reset(self) -> None:
+        # Constant time: the rows of the finished season are left in place as its archive
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            now = time.time()
+            await db.execute('UPDATE seasons SET ended_at = ? WHERE id = ?', (now, self.season))
+            cursor = await db.execute('INSERT INTO seasons (started_at) VALUES (?)', (now,))
+            await db.commit()
+            self.season = cursor.lastrowid
+        logger.info(f'[SQLiteStatsStorage] Started season {self.season}')
+
+    async def prune_seasons(self, keep: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        # Small transactions with pauses in between, so answers are never blocked for long
+        async with DatabaseConnection(self.db_file, self._db_lock) as db:
+            async with db.execute(
+                'SELECT id FROM seasons WHERE id < ? AND pruned = 0 ORDER BY id', (self.season - keep,)
+            ) as cursor:
+                seasons = [row[0] for row in await cursor.fetchall()]
+        for season in seasons:
+            while True:
+                async with DatabaseConnection(self.db_file, self._db_lock) as db:
+                    cursor = await db.execute(
+                        """
+                        DELETE FROM user_stats
+                        WHERE season = ? AND user_id IN (SELECT user_id FROM user_stats WHERE season = ? LIMIT ?)
+                    """,
+                        (season, season, batch_size),
+                    )
+                    done = cursor.rowcount < batch_size
+                    if done:
+                        await db.execute('UPDATE seasons SET pruned = 1 WHERE id = ?', (season,))
+                    await db.commit()
+                if done:
+                    break
+                await asyncio.sleep(pause)
+            logger.info(f'[SQLiteStatsStorage] Pruned season {season}')
+        return len(seasons)
+
+    async def prune_rollups(self, days: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        # Small transactions with pauses in between, like prune_seasons
+        since = _since(days)
+        pruned = 0
+        for table, key in (('daily_user_stats', 'user_id, day'), ('daily_illusion_stats', 'day, source, detail')):
+            while True:
+                async with DatabaseConnection(self.db_file, self._db_lock) as db:
+                    cursor = await db.execute(
+                        f'DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} WHERE day < ? LIMIT ?)',
+                        (since, batch_size),
+                    )
+                    await db.commit()
+                pruned += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+                await asyncio.sleep(pause)
+        logger.info(f'[SQLiteStatsStorage] Pruned {pruned} rollup rows before {since}')
+        return pruned
+
+
+# Event log record types
+_RECORD_ANSWER = 1
+_RECORD_RESET = 2
+
+# Frame: payload length, CRC32 of payload
+_FRAME_HEADER = struct.Struct('<II')
+# Payload header: record type, timestamp, is_correct, user_id length, username length
+_EVENT_HEADER = struct.Struct('<BdBHH')
+# Optional payload tail, absent in older logs: lengths of chat_id, answer, correct_answer, source and detail
+_DETAIL_HEADER = struct.Struct('<HHHHH')
+_DETAIL_FIELDS = ('chat_id', 'answer', 'correct_answer', 'source', 'detail')
+
+_SNAPSHOT_FILE = 'stats_snapshot.json'
+_LOG_PREFIX = 'stats_events.'
+_LOG_SUFFIX = '.log'
+_HISTORY_PREFIX = 'stats_history.'
+_HISTORY_SUFFIX = '.bin'
+_SEASON_PREFIX = 'stats_season.'
+_SEASON_SUFFIX = '.json'
+
+
+def encode_event(record_type: int, event: AnswerEvent) -> bytes:
+    """Encode an event as a length-prefixed, checksummed binary frame."""
+    user_id = event.user_id.encode('utf-8')
+    username = event.username.encode('utf-8')
+    details = [getattr(event, name).encode('utf-8') for name in _DETAIL_FIELDS]
+    payload = b''.join([
+        _EVENT_HEADER.pack(record_type, event.timestamp, int(event.is_correct), len(user_id), len(username)),
+        user_id,
+        username,
+        _DETAIL_HEADER.pack(*map(len, details)),
+        *details,
+    ])
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_events(data: bytes) -> tuple[list[tuple[int, AnswerEvent]], int]:
+    """
+    Decode frames from a log file.
+
+    Args:
+        data: Raw log file contents
+
+    Returns:
+        Tuple of decoded (record_type, event) pairs and the offset of the end of the last valid frame.
+        Decoding stops at the first truncated or corrupt frame.
+    """
+    events = []
+    offset = 0
+    while offset + _FRAME_HEADER.size <= len(data):
+        length, checksum = _FRAME_HEADER.unpack_from(data, offset)
+        start = offset + _FRAME_HEADER.size
+        payload = data[start : start + length]
+        if len(payload) < length or length < _EVENT_HEADER.size or zlib.crc32(payload) != checksum:
+            break
+        record_type, timestamp, is_correct, user_id_len, username_len = _EVENT_HEADER.unpack_from(payload)
+        pos = _EVENT_HEADER.size
+        user_id = payload[pos : pos + user_id_len].decode('utf-8')
+        pos += user_id_len
+        username = payload[pos : pos + username_len].decode('utf-8')
+        pos += username_len
+        event = AnswerEvent(user_id, bool(is_correct), username, timestamp)
+        if pos + _DETAIL_HEADER.size <= length:
+            lengths = _DETAIL_HEADER.unpack_from(payload, pos)
+            pos += _DETAIL_HEADER.size
+            for name, field_len in zip(_DETAIL_FIELDS, lengths):
+                setattr(event, name, payload[pos : pos + field_len].decode('utf-8'))
+                pos += field_len
+        events.append((record_type, event))
+        offset = start + length
+    return events, offset
+
+
+class EventLogStatsStorage(StatsStorage):
+    """
+    Stores answers in an append-only binary log with group commit.
+
+    Statistics and the daily rollups live in memory and are rebuilt at startup from the latest compacted
+    snapshot plus the log files written after it. Each snapshot starts a new log generation, so a crash
+    at any point of the snapshot procedure never replays an event twice. Compacted log files are kept
+    as the answer history (stats_history.*.bin, readable with decode_events).
+
+    A reset starts a new season by swapping in empty statistics; the finished season is archived
+    to stats_season.<season>.json off the event loop.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        commit_interval: float = 0.05,
+        snapshot_every: int = 10000,
+        snapshot_interval: float = 600.0,
+        read_only: bool = False,
+    ):
+        """
+        Args:
+            data_dir: Directory of the snapshot and log files
+            commit_interval: Seconds a group commit waits for more events
+            snapshot_every: Events between snapshots
+            snapshot_interval: Maximum seconds between snapshots
+            read_only: Only load the statistics, e.g. to export them while the bot is running:
+                the log is neither truncated nor written
+        """
+        self.data_dir = data_dir
+        self.read_only = read_only
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_file = os.path.join(data_dir, _SNAPSHOT_FILE)
+
+        self._stats: dict[str, list] = {}  # user_id -> [total_challenges, correct_answers, username]
+        self._user_ids: list[str] = []  # Sorted, for exports
+        # Running exports: rows as they were when the export started, saved before their first change
+        self._exports: dict[int, dict[str, tuple | None]] = {}
+        self.season = 1
+        self._pending_archives: dict[int, dict[str, list]] = {}  # Finished seasons not written yet
+        # Rollups: user_id -> day -> [answers, correct], and (day, source, detail) -> [answers, correct]
+        self._daily: defaultdict[str, dict[str, list[int]]] = defaultdict(dict)
+        self._illusions: defaultdict[tuple[str, str, str], list[int]] = defaultdict(lambda: [0, 0])
+        self._ranking: list[tuple[int, int, str]] | None = None
+        self._generation = 0
+        self._log_file = None
+        self._pending: list[tuple[int, AnswerEvent, asyncio.Future]] = []
+        self._flushing = False
+        self._events_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+
+        self._load()
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f'{_LOG_PREFIX}{generation:08d}{_LOG_SUFFIX}')
+
+    def _log_generations(self) -> list[int]:
+        generations = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(_LOG_PREFIX) and name.endswith(_LOG_SUFFIX):
+                try:
+                    generations.append(int(name[len(_LOG_PREFIX) : -len(_LOG_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(generations)
+
+    def _load(self) -> None:
+        """Load the latest snapshot and replay the log tail."""
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+            self._stats = {user_id: list(row) for user_id, row in snapshot['users'].items()}
+            self._user_ids = sorted(self._stats)
+            self.season = snapshot.get('season', 1)
+            # Snapshots written before the rollups existed have none
+            for user_id, day, answers, correct in snapshot.get('daily', []):
+                self._daily[user_id][day] = [answers, correct]
+            for day, source, detail, answers, correct in snapshot.get('illusions', []):
+                self._illusions[day, source, detail] = [answers, correct]
+            self._generation = snapshot['log_generation']
+            logger.info(f'[EventLogStatsStorage] Loaded snapshot with {len(self._stats)} users')
+
+        replayed = 0
+        for generation in self._log_generations():
+            if generation < self._generation:
+                continue
+            path = self._log_path(generation)
+            with open(path, 'rb') as file:
+                data = file.read()
+            events, valid_end = decode_events(data)
+            if valid_end < len(data) and not self.read_only:
+                logger.warning(
+                    f'[EventLogStatsStorage] Truncating {len(data) - valid_end} bytes of torn tail in {path}'
+                )
+                with open(path, 'r+b') as file:
+                    file.truncate(valid_end)
+            for record_type, event in events:
+                self._apply(record_type, event)
+            replayed += len(events)
+            self._generation = generation
+
+        self._events_since_snapshot = replayed
+        if not self.read_only:
+            # Seasons finished in the replayed log may not have been archived before a crash
+            self._write_archives(self._take_archives())
+            self._log_file = open(self._log_path(self._generation), 'ab')
+        logger.info(f'[EventLogStatsStorage] Replayed {replayed} events, log generation {self._generation}')
+
+    def _apply(self, record_type: int, event: AnswerEvent) -> None:
+        self._ranking = None
+        if record_type == _RECORD_RESET:
+            self._pending_archives[self.season] = self._stats
+            self._stats = {}
+            self._user_ids = []
+            # Exports of the finished season keep reading its statistics, which do not change any more
+            self._exports = {}
+            self.season += 1
+            return
+        row = self._stats.get(event.user_id)
+        for frozen in self._exports.values():
+            frozen.setdefault(event.user_id, tuple(row) if row else None)
+        if row is None:
+            row = self._stats[event.user_id] = [0, 0, '']
+            bisect.insort(self._user_ids, event.user_id)
+        row[0] += 1
+        if event.is_correct:
+            row[1] += 1
+        if event.username:
+            row[2] = event.username
+        day = event.day
+        user_days = self._daily[event.user_id]
+        for counts in (user_days.setdefault(day, [0, 0]), self._illusions[day, event.source, event.detail]):
+            counts[0] += 1
+            counts[1] += int(event.is_correct)
+
+    def _write_frames(self, frames: list[bytes]) -> None:
+        """Write a batch of frames with a single write and fsync (runs in a worker thread)."""
+        self._log_file.write(b''.join(frames))
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+
+    async def _append(self, record_type: int, event: AnswerEvent) -> None:
+        """
+        Append a record to the log, wait until it is durable and apply it to the in-memory state.
+
+        The first writer to arrive becomes the commit leader: it waits commit_interval so that
+        concurrent writers can join its batch, then writes and fsyncs the whole batch at once.
+        Records are applied only after the fsync, so a failed write leaves the state as it is on disk.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((record_type, event, future))
+
+        if not self._flushing:
+            self._flushing = True
+            try:
+                await asyncio.sleep(self.commit_interval)
+                await self._flush_pending()
+            finally:
+                self._flushing = False
+
+        await future
+
+    async def _flush_pending(self) -> None:
+        """Write pending frames in batches and take a snapshot when one is due."""
+        while True:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    frames = [encode_event(record_type, event) for record_type, event, _ in batch]
+                    await asyncio.to_thread(self._write_frames, frames)
+                except Exception as e:
+                    logger.error(f'[EventLogStatsStorage] Error writing {len(batch)} events: {e}')
+                    for _, _, waiter in batch:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                    continue
+                # Applied in log order before the next snapshot copies the state
+                for record_type, event, waiter in batch:
+                    self._apply(record_type, event)
+                    if not waiter.done():
+                        waiter.set_result(None)
+                self._events_since_snapshot += len(batch)
+                logger.info(f'[EventLogStatsStorage] Group commit of {len(batch)} events')
+
+            # Snapshot only with an empty batch, so the copied state matches what is on disk
+            if not self._snapshot_due():
+                return
+            await self._snapshot()
+
+    def _snapshot_due(self) -> bool:
+        if self._events_since_snapshot == 0:
+            return False
+        if self._events_since_snapshot >= self.snapshot_every:
+            return True
+        return time.monotonic() - self._last_snapshot >= self.snapshot_interval
+
+    def _season_path(self, season: int) -> str:
+        return os.path.join(self.data_dir, f'{_SEASON_PREFIX}{season:08d}{_SEASON_SUFFIX}')
+
+    def _take_archives(self) -> list[tuple[int, dict]]:
+        archives = list(self._pending_archives.items())
+        self._pending_archives.clear()
+        return archives
+
+    def _write_archives(self, archives: list[tuple[int, dict]]) -> None:
+        """Write finished seasons to their archive files (runs in a worker thread)."""
+        for season, users in archives:
+            path = self._season_path(season)
+            with open(path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump({'season': season, 'users': users}, file, ensure_ascii=False)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path + '.tmp', path)
+            logger.info(f'[EventLogStatsStorage] Archived season {season} with {len(users)} users')
+
+    def _write_snapshot(self, snapshot: dict) -> None:
+        """Atomically replace the snapshot file (runs in a worker thread)."""
+        tmp_file = self.snapshot_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+    async def _snapshot(self) -> None:
+        """Start a new log generation and compact everything before it into a snapshot."""
+        old_generation = self._generation
+        self._generation += 1
+        self._log_file.close()
+        self._log_file = open(self._log_path(self._generation), 'ab')
+
+        # Finished seasons are archived first: the log with their reset records is compacted next
+        await asyncio.to_thread(self._write_archives, self._take_archives())
+
+        users = {user_id: list(row) for user_id, row in self._stats.items()}
+        snapshot = {
+            'log_generation': self._generation,
+            'season': self.season,
+            'users': users,
+            'daily': [[user_id, day, *counts] for user_id, days in self._daily.items() for day, counts in days.items()],
+            'illusions': [[*key, *counts] for key, counts in self._illusions.items()],
+        }
+        await asyncio.to_thread(self._write_snapshot, snapshot)
+
+        # Compacted logs are not replayed any more, but kept as the answer history
+        for generation in self._log_generations():
+            if generation <= old_generation:
+                os.replace(
+                    self._log_path(generation),
+                    os.path.join(self.data_dir, f'{_HISTORY_PREFIX}{generation:08d}{_HISTORY_SUFFIX}'),
+                )
+
+        self._events_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+        logger.info(f'[EventLogStatsStorage] Wrote snapshot with {len(users)} users, generation {self._generation}')
+
+    async def close(self) -> None:
+        if self._log_file is None:
+            return
+        while self._flushing:
+            await asyncio.sleep(self.commit_interval)
+        if self._events_since_snapshot:
+            await self._snapshot()
+        self._log_file.close()
+        self._log_file = None
+
+    async def load_user(self, user_id: str) -> StatsRow | None:
+        row = self._stats.get(user_id)
+        return StatsRow(*row) if row else None
+
+    async def record_answer(self, event: AnswerEvent) -> None:
+        await self._append(_RECORD_ANSWER, event)
+
+    async def record_answers(self, events: list[AnswerEvent]) -> None:
+        # All frames join the same group commit, so the batch costs a single fsync
+        await asyncio.gather(*(self._append(_RECORD_ANSWER, event) for event in events))
+
+    def _ranked_keys(self) -> list[tuple[int, int, str]]:
+        """Sorted leaderboard keys, rebuilt lazily after writes."""
+        if self._ranking is None:
+            self._ranking = sorted((-row[1], row[0], user_id) for user_id, row in self._stats.items() if row[0] > 0)
+        return self._ranking
+
+    def _rows(self, keys: list[tuple[int, int, str]]) -> list[tuple]:
+        rows = []
+        for _, _, user_id in keys:
+            total_challenges, correct_answers, username = self._stats[user_id]
+            rows.append((user_id, total_challenges, correct_answers, username))
+        return rows
+
+    async def get_leaderboard_page(
+        self,
+        after: LeaderboardCursor | None = None,
+        before: LeaderboardCursor | None = None,
+        page_size: int = 10,
+    ) -> LeaderboardPage:
+        ranking = self._ranked_keys()
+        if before is not None:
+            end = bisect.bisect_left(ranking, before.key)
+            start = max(0, end - page_size)
+            keys = ranking[start:end]
+            return _build_page(self._rows(keys), before.rank - len(keys), start > 0, True)
+
+        start = bisect.bisect_right(ranking, after.key) if after else 0
+        keys = ranking[start : start + page_size]
+        start_rank = after.rank + 1 if after else 1
+        return _build_page(self._rows(keys), start_rank, start_rank > 1, start + page_size < len(ranking))
+
+    async def get_user_leaderboard_page(self, user_id: str, page_size: int = 10) -> LeaderboardPage | None:
+        row = self._stats.get(user_id)
+        if not row or row[0] == 0:
+            return None
+        ranking = self._ranked_keys()
+        start = bisect.bisect_left(ranking, (-row[1], row[0], user_id)) // page_size * page_size
+        keys = ranking[start : start + page_size]
+        return _build_page(self._rows(keys), start + 1, start > 0, start + page_size < len(ranking))
+
+    async def get_leaderboard(self, user_id: str, limit: int = 10) -> dict:
+        ranking = self._ranked_keys()
+        top_users = [
+            _leaderboard_entry(rank, user_id_row, StatsRow(*self._stats[user_id_row]))
+            for rank, (_, _, user_id_row) in enumerate(ranking[:limit], 1)
+        ]
+
+        user_rank = None
+        row = self._stats.get(user_id) if user_id else None
+        if row and row[0] > 0:
+            # The position in the leaderboard order, as on the leaderboard pages
+            rank = bisect.bisect_left(ranking, (-row[1], row[0], user_id)) + 1
+            user_rank = _leaderboard_entry(rank, user_id, StatsRow(*row))
+
+        return {'top_users': top_users, 'user_rank': user_rank}
+
+    async def iter_users(self, chunk_size: int = 1000) -> AsyncIterator[list[tuple]]:
+        # A consistent snapshot without copying the statistics: answers given during the export save the
+        # row as it was before (copy on write), and users who answer for the first time are left out
+        stats, user_ids, exports = self._stats, self._user_ids, self._exports
+        frozen: dict[str, tuple | None] = {}
+        exports[id(frozen)] = frozen
+        try:
+            start = 0
+            while chunk := user_ids[start : start + chunk_size]:
+                rows = []
+                for user_id in chunk:
+                    row = frozen[user_id] if user_id in frozen else stats[user_id]
+                    if row is not None:
+                        rows.append((user_id, *row))
+                if rows:
+                    yield rows
+                await asyncio.sleep(0)
+                # New users may have been inserted before the position of the next chunk
+                start = bisect.bisect_right(user_ids, chunk[-1])
+        finally:
+            exports.pop(id(frozen), None)
+
+    async def get_daily_stats(self, user_id: str, days: int = 7) -> list[DailyStats]:
+        since = _since(days)
+        days_stats = self._daily.get(user_id, {})
+        return sorted(DailyStats(day, *counts) for day, counts in days_stats.items() if day >= since)
+
+    async def get_illusion_stats(self, days: int | None = None) -> list[IllusionStats]:
+        since = _since(days)
+        totals: defaultdict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0])
+        for (day, source, detail), (answers, correct) in self._illusions.items():
+            if day >= since:
+                totals[source, detail][0] += answers
+                totals[source, detail][1] += correct
+        stats = [IllusionStats(source, detail, *counts) for (source, detail), counts in totals.items()]
+        return sorted(stats, key=lambda row: (-row.answers, row.source, row.detail))
+
+    async def reset(self) -> None:
+        event = AnswerEvent(user_id='', is_correct=False)
+        await self._append(_RECORD_RESET, event)
+        archives = self._take_archives()
+        try:
+            await asyncio.to_thread(self._write_archives, archives)
+        except Exception as e:
+            # Retried with the next snapshot
+            logger.error(f'[EventLogStatsStorage] Error archiving season {self.season - 1}: {e}')
+            self._pending_archives.update(archives)
+
+    async def prune_seasons(self, keep: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        # One archive file per season: batches of files are removed off the event loop, with pauses in between
+        seasons = []
+        for name in os.listdir(self.data_dir):
+            if not (name.startswith(_SEASON_PREFIX) and name.endswith(_SEASON_SUFFIX)):
+                continue
+            try:
+                season = int(name[len(_SEASON_PREFIX) : -len(_SEASON_SUFFIX)])
+            except ValueError:
+                continue
+            if season < self.season - keep:
+                seasons.append(season)
+        seasons.sort()
+        for start in range(0, len(seasons), batch_size):
+            if start:
+                await asyncio.sleep(pause)
+            batch = seasons[start : start + batch_size]
+            await asyncio.to_thread(self._remove_archives, batch)
+            for season in batch:
+                logger.info(f'[EventLogStatsStorage] Pruned season {season}')
+        return len(seasons)
+
+    def _remove_archives(self, seasons: list[int]) -> None:
+        """Remove the archive files of finished seasons (runs in a worker thread)."""
+        for season in seasons:
+            os.remove(self._season_path(season))
+
+    async def prune_rollups(self, days: int, batch_size: int = 500, pause: float = 0.05) -> int:
+        # The rollups are in memory: the next snapshot is written without the pruned days
+        since = _since(days)
+        pruned = 0
+        for key in [key for key in self._illusions if key[0] < since]:
+            del self._illusions[key]
+            pruned += 1
+        user_ids = list(self._daily)
+        for start in range(0, len(user_ids), batch_size):
+            for user_id in user_ids[start : start + batch_size]:
+                user_days = self._daily.get(user_id)
+                if user_days is None:
+                    continue
+                for day in [day for day in user_days if day < since]:
+                    del user_days[day]
+                    pruned += 1
+                if not user_days:
+                    del self._daily[user_id]
+            await asyncio.sleep(pause)
+        logger.info(f'[EventLogStatsStorage] Pruned {pruned} rollup rows before {since}')
+        return pruned
+
+
+STATS_BACKENDS = {
+    'sqlite': SQLiteStatsStorage,
+    'eventlog': EventLogStatsStorage,
+}
+
+
+def create_stats_storage(backend: str, data_dir: str) -> StatsStorage:
+    """
+    Create a statistics storage backend by name.
+
+    Args:
+        backend: Backend name ("sqlite" or "eventlog")
+        data_dir: Directory for database and log files
+
+    Returns:
+        StatsStorage instance
+    """
+    try:
+        storage_class = STATS_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown stats backend: {backend!r}, expected one of {sorted(STATS_BACKENDS)}') from None
+    return storage_class(data_dir)
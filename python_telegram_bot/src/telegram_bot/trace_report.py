@@ -0,0 +1,187 @@
+"""
+Reports on the traces written by the tracer: the slowest traces with their span trees,
+and the latency of every stage (span name) over all traces.
+"""
+
+import glob
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class SpanRecord:
+    """A span read from a trace file."""
+
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start: float
+    ms: float
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+    children: list['SpanRecord'] = field(default_factory=list)
+
+    @property
+    def self_ms(self) -> float:
+        """Time not covered by the children, which may overlap when they run concurrently."""
+        return max(0.0, self.ms - sum(child.ms for child in self.children))
+
+
+@dataclass(slots=True)
+class Trace:
+    """The spans of one trace; the root is the outermost span found."""
+
+    trace_id: str
+    root: SpanRecord
+    spans: list[SpanRecord]
+
+    @property
+    def ms(self) -> float:
+        return self.root.ms
+
+
+@dataclass(slots=True)
+class StageStats:
+    """Latency of the spans of one name, in milliseconds."""
+
+    name: str
+    count: int
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    total_ms: float
+    self_ms: float  # Total time of the stage itself, without its child spans
+    errors: int
+
+
+def trace_files(path: str) -> list[str]:
+    """The trace file and its rotated files, oldest first."""
+    rotated = [name for name in glob.glob(f'{glob.escape(path)}.*') if name.rsplit('.', 1)[-1].isdigit()]
+    rotated.sort(key=lambda name: int(name.rsplit('.', 1)[-1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def load_spans(paths: list[str]) -> list[SpanRecord]:
+    """Read the spans of trace files, skipping malformed lines (e.g. a line cut by a crash)."""
+    spans = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    data = json.loads(line)
+                    spans.append(
+                        SpanRecord(
+                            trace_id=data['trace'],
+                            span_id=data['span'],
+                            parent_id=data.get('parent'),
+                            name=data['name'],
+                            start=data['start'],
+                            ms=data['ms'],
+                            attributes=data.get('attrs', {}),
+                            error=data.get('error'),
+                        )
+                    )
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return spans
+
+
+def build_traces(spans: list[SpanRecord]) -> list[Trace]:
+    """Group spans into traces and link every span to its children."""
+    by_trace: dict[str, list[SpanRecord]] = {}
+    for span in spans:
+        by_trace.setdefault(span.trace_id, []).append(span)
+
+    traces = []
+    for trace_id, trace_spans in by_trace.items():
+        by_id = {span.span_id: span for span in trace_spans}
+        roots = []
+        for span in sorted(trace_spans, key=lambda span: span.start):
+            parent = by_id.get(span.parent_id) if span.parent_id is not None else None
+            if parent is None:
+                roots.append(span)  # The root, or a span whose parent was rotated away
+            else:
+                parent.children.append(span)
+        root = max(roots, key=lambda span: span.ms)
+        traces.append(Trace(trace_id, root, trace_spans))
+    return traces
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def stage_breakdown(traces: list[Trace]) -> list[StageStats]:
+    """Latency per span name over the traces, the stages with the most total time first."""
+    by_name: dict[str, list[SpanRecord]] = {}
+    for trace in traces:
+        for span in trace.spans:
+            by_name.setdefault(span.name, []).append(span)
+
+    stages = []
+    for name, spans in by_name.items():
+        samples = sorted(span.ms for span in spans)
+        stages.append(
+            StageStats(
+                name=name,
+                count=len(samples),
+                p50_ms=_percentile(samples, 0.5),
+                p95_ms=_percentile(samples, 0.95),
+                max_ms=samples[-1],
+                total_ms=sum(samples),
+                self_ms=sum(span.self_ms for span in spans),
+                errors=sum(span.error is not None for span in spans),
+            )
+        )
+    stages.sort(key=lambda stage: stage.total_ms, reverse=True)
+    return stages
+
+
+def _format_span(span: SpanRecord, depth: int, lines: list[str]) -> None:
+    details = ' '.join(f'{key}={value}' for key, value in span.attributes.items())
+    if span.error is not None:
+        details = f'{details} error={span.error}'.strip()
+    lines.append(f'{"  " * depth}{span.ms:10.1f} ms  {span.name}  {details}'.rstrip())
+    for child in span.children:
+        _format_span(child, depth + 1, lines)
+
+
+def format_report(traces: list[Trace], top: int = 10, stage: str | None = None) -> str:
+    """
+    Text report of the slowest traces and the per-stage breakdown.
+
+    Args:
+        traces: Traces to report on
+        top: Number of slowest traces shown with their span trees
+        stage: Only consider traces with a span of this name, e.g. "TelegramBot.handle_illusion"
+    """
+    if stage is not None:
+        traces = [trace for trace in traces if any(span.name == stage for span in trace.spans)]
+    if not traces:
+        return 'No traces found'
+
+    lines = [f'Slowest {min(top, len(traces))} of {len(traces)} traces:']
+    for trace in sorted(traces, key=lambda trace: trace.ms, reverse=True)[:top]:
+        started = datetime.fromtimestamp(trace.root.start).isoformat(sep=' ', timespec='seconds')
+        lines.append(f'\ntrace {trace.trace_id} at {started}')
+        _format_span(trace.root, 1, lines)
+
+    lines.append('\nStages:')
+    lines.append(
+        f'{"stage":<48} {"count":>7} {"p50 ms":>10} {"p95 ms":>10} {"max ms":>10} {"self ms":>12} {"errors":>6}'
+    )
+    for stats in stage_breakdown(traces):
+        lines.append(
+            f'{stats.name:<48} {stats.count:>7} {stats.p50_ms:>10.1f} {stats.p95_ms:>10.1f} {stats.max_ms:>10.1f} '
+            f'{stats.self_ms:>12.1f} {stats.errors:>6}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,238 @@
+"""
+Lightweight tracing of the work done for each update.
+
+Every update gets a trace id, carried in a context variable, so the spans opened while handling it
+(the handler, AI requests, GameLogic queries, Bot API calls, and tasks started from them) share the trace.
+Finished spans are written as JSON lines to a rotating file by a background thread; src/trace_report.py
+prints the slowest traces and a per-stage latency breakdown.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from collections.abc import Awaitable, Callable, Generator
+from typing import Any, ParamSpec, TypeVar
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from .config import Settings
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+# Span being executed in the current context
+current_span: contextvars.ContextVar['Span | None'] = contextvars.ContextVar('current_span', default=None)
+
+
+class _ActiveTracer:
+    """Holder of the tracer of the process, shared by all contexts unlike current_span."""
+
+    __slots__ = ('tracer',)
+
+    def __init__(self):
+        self.tracer: Tracer | None = None  # Tracer exporting the spans, None while tracing is off
+
+
+_active = _ActiveTracer()
+_random = random.Random()
+
+
+class Span:
+    """A timed operation of a trace."""
+
+    __slots__ = ('attributes', 'duration', 'error', 'name', 'parent_id', 'span_id', 'start', 'trace_id', '_started')
+
+    def __init__(self, name: str, parent: 'Span | None', attributes: dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f'{_random.getrandbits(64):016x}'
+        self.span_id = f'{_random.getrandbits(32):08x}'
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.error: str | None = None
+        self.start = time.time()
+        self.duration = 0.0
+        self._started = time.perf_counter()
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    def to_json(self) -> str:
+        record = {
+            'trace': self.trace_id,
+            'span': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'ms': round(self.duration * 1000, 3),
+        }
+        if self.attributes:
+            record['attrs'] = self.attributes
+        if self.error is not None:
+            record['error'] = self.error
+        return json.dumps(record, ensure_ascii=False, default=str)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Generator[Span | None]:
+    """
+    Time the enclosed code as a span of the current trace, or of a new trace if there is none.
+
+    Yields None without measuring anything while tracing is off.
+    """
+    tracer = _active.tracer
+    if tracer is None:
+        yield None
+        return
+    current = Span(name, current_span.get(), attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        current.finish()
+        tracer.export(current)
+
+
+def traced(name: str | None = None) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Decorate a coroutine function to run as a span, named after its qualified name by default."""
+
+    def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if _active.tracer is None:
+                return await func(*args, **kwargs)
+            with span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Add attributes to the current span, if any."""
+    current = current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def current_trace_id() -> str | None:
+    """Trace id of the current context, e.g. to quote it in logs."""
+    current = current_span.get()
+    return current.trace_id if current is not None else None
+
+
+class Tracer:
+    """
+    Exports finished spans as JSON lines to a rotating file.
+
+    Spans are queued and written by a listener thread, so exporting never blocks the event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        """
+        Args:
+            path: Trace file; rotated files get the suffixes .1, .2, ...
+            max_bytes: Size at which the file is rotated
+            backups: Rotated files kept
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.exported = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: logging.handlers.QueueListener | None = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'Tracer | None':
+        """Create a tracer from the TRACE_* settings, or None if TRACING is off."""
+        if not settings.tracing:
+            return None
+        return cls(
+            settings.trace_file,
+            max_bytes=int(settings.trace_file_max_mb * 1024 * 1024),
+            backups=settings.trace_file_backups,
+        )
+
+    def start(self) -> None:
+        """Start writing spans and make this the tracer of the process."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8', delay=True
+        )
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+        _active.tracer = self
+        logger.info(f'[Tracer] Writing traces to {self.path}')
+
+    def export(self, finished: Span) -> None:
+        self._queue.put_nowait(logging.makeLogRecord({'msg': finished.to_json()}))
+        self.exported += 1
+
+    def stop(self) -> None:
+        """Stop tracing and write the queued spans."""
+        if _active.tracer is self:
+            _active.tracer = None
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        logger.info(f'[Tracer] Stopped after {self.exported} spans')
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware of the dispatcher: opens the root span of every update."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        attributes: dict[str, Any] = {'update_id': event.update_id, 'type': event.event_type}
+        user = data.get('event_from_user')
+        if user is not None:
+            attributes['user_id'] = user.id
+        with span('update', **attributes):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Request middleware of the bot session: every Bot API call is a span, including its send queue wait."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        attributes = {}
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is not None:
+            attributes['chat_id'] = chat_id
+        with span(f'bot_api.{type(method).__name__}', **attributes):
+            return await make_request(bot, method)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Print the slowest traces of the Optical Illusion Telegram Bot and a per-stage latency breakdown
+
+Reads the trace file written by the bot (TRACE_FILE, data/traces.jsonl by default) and its rotated files.
+
+Usage:
+    python src/trace_report.py --top 5
+    python src/trace_report.py --stage TelegramBot.handle_illusion
+"""
+
+import argparse
+import sys
+
+from telegram_bot.config import ConfigError, Settings
+from telegram_bot.trace_report import build_traces, format_report, load_spans, trace_files
+
+
+def main():
+    """Main function to print the trace report"""
+    # Read and validate the configuration from the environment and the .env file
+    try:
+        settings = Settings.from_env()
+    except ConfigError as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--file',
+        default=settings.trace_file,
+        help='Trace file (default: TRACE_FILE or data/traces.jsonl)',
+    )
+    parser.add_argument('--top', type=int, default=10, help='Slowest traces shown (default: 10)')
+    parser.add_argument('--stage', help='Only traces with a span of this name, e.g. TelegramBot.handle_illusion')
+    args = parser.parse_args()
+
+    traces = build_traces(load_spans(trace_files(args.file)))
+    print(format_report(traces, top=args.top, stage=args.stage))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Challenge generation worker of the Optical Illusion Telegram Bot
+
+Generates the challenges requested with /illusion when the bot runs with GENERATION_MODE=queue.
+Start as many workers as needed; they share the job queue in the data directory with the bot.
+"""
+
+import asyncio
+import signal
+import sys
+from telegram_bot.ai_service import AIService
+from telegram_bot.challenge_source import create_challenge_source
+from telegram_bot.config import ConfigError, Settings
+from telegram_bot.generation_worker import GenerationWorker
+from telegram_bot.job_queue import JobNotifier, JobQueue
+
+
+async def main():
+    """Main function to run a worker"""
+    try:
+        settings = Settings.from_env()
+    except ConfigError as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    # Replaying recorded AI responses needs no API key
+    if not settings.ai_api_key and settings.ai_cassette != 'replay' and settings.challenge_source != 'local':
+        print('Error: AI_API_KEY not found in environment variables')
+        print('Please set AI_API_KEY in your .env file')
+        sys.exit(1)
+
+    # The local renderer needs no AI service
+    ai_service = None if settings.challenge_source == 'local' else AIService(settings=settings)
+    source = create_challenge_source(settings.challenge_source, ai_service, settings)
+    queue = JobQueue('data', settings.job_lease_seconds, settings.job_max_attempts)
+    notifier = JobNotifier(settings.job_socket)
+    worker = GenerationWorker(
+        queue, source, notifier, concurrency=settings.worker_concurrency, poll_interval=settings.job_poll_interval
+    )
+
+    # Jobs in progress are finished before the worker exits; a killed worker's jobs are retried after their lease
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await source.close()
+        if ai_service is not None:
+            await ai_service.close()
+        await notifier.close()
+        await queue.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test script for the prompt generation requests of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.ai_service import PROMPT_BATCH_INSTRUCTIONS, AIService, answer_mix
+from telegram_bot.prompt_synthesizer import ANSWERS, TEMPLATES, synthesize_prompt
+
+
+class FakeCompletions:
+    """
+    Records requests and answers with fixed prompts; the first request misses the prompt cache.
+
+    Batch responses contain an invalid entry and an entry with an answer that was not requested.
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, messages, model, max_tokens):
+        self.requests.append(messages)
+        cached = 0 if len(self.requests) == 1 else 900
+        if len(self.requests) % 2:
+            usage = SimpleNamespace(
+                prompt_tokens=1000, completion_tokens=50, prompt_tokens_details=SimpleNamespace(cached_tokens=cached)
+            )
+        else:
+            # DeepSeek reports cache hits in its own field
+            usage = SimpleNamespace(
+                prompt_tokens=1000, completion_tokens=50, prompt_tokens_details=None, prompt_cache_hit_tokens=cached
+            )
+        if messages[0]['content'] == PROMPT_BATCH_INSTRUCTIONS:
+            answers = messages[1]['content'].rsplit(': ', 1)[1].rstrip('.').split(', ')
+            entries = [
+                {'answer': answer, 'prompt': f'illusion {i}', 'explanation': 'объяснение'}
+                for i, answer in enumerate(answers)
+            ]
+            entries[1]['prompt'] = ''
+            entries.append({'answer': 'up', 'prompt': 'one more', 'explanation': ''})
+            content = '```json\n' + json.dumps(entries) + '\n```'
+        else:
+            content = json.dumps({'prompt': 'two circles', 'explanation': 'объяснение'})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def _fake_service():
+    service = AIService(api_key='test-key')
+    completions = FakeCompletions()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return service, completions
+
+
+async def _check_prompt_layout():
+    service, completions = _fake_service()
+    service.prompt_batch_size = 1
+    responses = [await service.generate_prompt() for _ in range(4)]
+
+    # The instructions are an identical system message; only the short user message varies
+    system_messages = {json.dumps(messages[0]) for messages in completions.requests}
+    assert len(system_messages) == 1 and completions.requests[0][0]['role'] == 'system'
+    for response, messages in zip(responses, completions.requests):
+        assert response.prompt == 'two circles'
+        assert f': {response.correct_answer} (' in messages[1]['content']
+        assert len(messages[1]['content']) < 100
+
+    usage = service.prompt_usage
+    assert (usage.requests, usage.prompt_tokens, usage.cached_tokens) == (4, 4000, 2700)
+    assert usage.cached_requests == 3 and usage.cache_hit_rate == 2700 / 4000
+
+
+async def _check_prompt_batch():
+    service, completions = _fake_service()
+    assert sorted(answer_mix(6)) == ['equal', 'equal', 'left', 'left', 'right', 'right']
+
+    # One completion serves the first five challenges: the invalid entry and the extra one are dropped
+    first = await asyncio.gather(*(service.generate_prompt() for _ in range(5)))
+    assert len(completions.requests) == 1
+    assert len({prompt.prompt for prompt in first}) == 5 and 'illusion 1' not in {prompt.prompt for prompt in first}
+    requested = completions.requests[0][1]['content'].rsplit(': ', 1)[1].rstrip('.').split(', ')
+    assert sorted(prompt.correct_answer for prompt in first) == sorted(requested[:1] + requested[2:])
+
+    # The sixth one triggers the next batch
+    await service.generate_prompt()
+    assert len(completions.requests) == 2 and len(service.prompt_pool) == 4
+    usage = service.prompt_usage
+    assert (usage.requests, usage.prompts) == (2, 10)
+    assert usage.tokens_per_prompt == 2 * 1050 / 10
+
+
+async def _check_prompt_templates():
+    service, completions = _fake_service()
+    service.prompt_batch_size = 1
+    service.prompt_template_ratio = 0.5
+    responses = [await service.generate_prompt() for _ in range(200)]
+
+    # About half of the prompts are synthesized without a request
+    usage = service.prompt_usage
+    assert usage.synthesized + len(completions.requests) == 200
+    assert 60 < usage.synthesized < 140
+    synthesized = [response for response in responses if response.prompt != 'two circles']
+    assert len(synthesized) == usage.synthesized
+    assert {response.correct_answer for response in synthesized} == set(ANSWERS)
+    # The origin tells template prompts apart from those of the prompt model
+    assert {response.origin for response in responses} == {'template', service.prompt_model}
+    assert all(response.origin == 'template' for response in synthesized)
+
+
+def test_prompt_templates():
+    """Synthesized prompts match their answer and seed, and are mixed with model prompts by ratio"""
+    for seed in range(50):
+        for answer in ANSWERS:
+            prompt = synthesize_prompt(answer, seed)
+            assert prompt == synthesize_prompt(answer, seed)
+            assert prompt.correct_answer == answer and prompt.illusion in TEMPLATES
+            if answer == 'equal':
+                assert 'exactly the same' in prompt.prompt and 'одинакового размера' in prompt.explanation
+            else:
+                assert f'The {answer} ' in prompt.prompt and '% larger' in prompt.prompt
+                assert ('левый' if answer == 'left' else 'правый') in prompt.explanation.rsplit('.', 2)[-2]
+    assert synthesize_prompt('left', 1, ('ponzo',)).illusion == 'ponzo'
+    asyncio.run(_check_prompt_templates())
+
+
+def test_prompt_layout():
+    """Prompt requests share a stable cached prefix, and cached input tokens are counted"""
+    asyncio.run(_check_prompt_layout())
+
+
+def test_prompt_batch():
+    """Prompts are generated in batches of validated entries, and spare prompts are pooled"""
+    asyncio.run(_check_prompt_batch())
+
+
+def main():
+    """Main test function"""
+    print('Running prompt request tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_prompt_layout()
+        test_prompt_batch()
+        test_prompt_templates()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Prompt request tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -47,7 +47,7 @@ async def test_ai_service():
         return False
 
 
-def test_game_logic():
+async def test_game_logic():
     """Test GameLogic functionality"""
     print('Testing GameLogic...')
 
@@ -59,19 +59,25 @@ def test_game_logic():
         chat_id = 'test_chat'
         prompt = 'Test prompt'
         correct_answer = 'first'
+        explanation = 'Test explanation'
         image_data = 'test_image_data'
 
-        game_logic.start_challenge(chat_id, prompt, correct_answer, image_data)
+        await game_logic.start_challenge(chat_id, prompt, correct_answer, explanation, image_data)
 
         # Test checking answer
-        is_correct = game_logic.check_answer(chat_id, 'first')
+        is_correct = await game_logic.check_answer(chat_id, 'first')
         print(f'Correct answer check: {is_correct}')
 
         # Start another challenge for incorrect answer test
-        game_logic.start_challenge(chat_id, prompt, correct_answer, image_data)
-        is_incorrect = game_logic.check_answer(chat_id, 'second')
+        await game_logic.start_challenge(chat_id, prompt, correct_answer, explanation, image_data)
+        is_incorrect = await game_logic.check_answer(chat_id, 'second')
         print(f'Incorrect answer check: {is_incorrect}')
 
+        await game_logic.close()
+        if not is_correct or is_incorrect:
+            print('GameLogic test failed!')
+            return False
+
         print('GameLogic test passed!')
         return True
 
@@ -89,7 +95,7 @@ async def main():
 
     # Run tests
     ai_success = await test_ai_service()
-    game_success = test_game_logic()
+    game_success = await test_game_logic()
 
     if ai_success and game_success:
         print('All tests passed!')
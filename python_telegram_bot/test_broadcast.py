@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the daily illusion broadcast of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendPhoto
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from telegram_bot.broadcast import Broadcaster, BroadcastStore, decode_answer
+from telegram_bot.game_logic import GameLogic
+
+
+KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text='Left', callback_data='left')],
+        [InlineKeyboardButton(text='Right', callback_data='right')],
+    ]
+)
+
+
+class FakeBot:
+    """Records sent photos; one chat has blocked the bot, and the run can be interrupted after a few sends"""
+
+    def __init__(self, blocked=(), crash_after=None):
+        self.blocked = set(blocked)
+        self.crash_after = crash_after
+        self.sent = []
+        self.callback_data = set()
+        self.run_task = None
+
+    async def send_photo(self, chat_id, photo, caption, reply_markup):
+        method = SendPhoto(chat_id=chat_id, photo='file')
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, 'bot was blocked by the user')
+        self.sent.append((chat_id, photo))
+        self.callback_data.update(button.callback_data for row in reply_markup.inline_keyboard for button in row)
+        if len(self.sent) == self.crash_after:
+            self.run_task.cancel()
+        return SimpleNamespace(photo=[SimpleNamespace(file_id='small'), SimpleNamespace(file_id='uploaded')])
+
+
+async def _check_broadcast(data_dir):
+    store = BroadcastStore(data_dir)
+    game_logic = GameLogic(data_dir)
+    chats = [str(chat_id) for chat_id in range(10, 20)]
+    for chat_id in chats:
+        assert await store.subscribe(chat_id) is True
+    assert await store.subscribe(chats[0]) is False
+    assert await store.subscriber_count() == 10
+
+    expires_at = datetime.now() + timedelta(days=1)
+    daily = await store.create_broadcast(
+        '2026-01-01', 'caption', 'prompt', 'left', 'explanation', 'local', b'png', 'png', expires_at
+    )
+    # Subscribing later does not add a delivery to an existing broadcast
+    await store.subscribe('99')
+    # A subscriber is solving a challenge of their own when the broadcast starts
+    await game_logic.start_challenge(chats[1], 'own prompt', 'right', 'own explanation', '')
+
+    # The first run is interrupted after a few deliveries
+    bot = FakeBot(crash_after=5)
+    broadcaster = Broadcaster(bot, store, game_logic, KEYBOARD, batch_size=3)
+    bot.run_task = asyncio.create_task(broadcaster.run(daily))
+    try:
+        await bot.run_task
+        raise AssertionError('broadcast was not interrupted')
+    except asyncio.CancelledError:
+        pass
+    first_chats = [chat_id for chat_id, _ in bot.sent]
+    assert bot.sent[0][1].data == b'png'  # The image is uploaded once...
+    assert all(photo == 'uploaded' for _, photo in bot.sent[1:])  # ...and then sent by file_id
+    await store.close()
+
+    # After a restart the broadcast resumes where it stopped, by file_id
+    store = BroadcastStore(data_dir)
+    (daily,) = await store.unfinished_broadcasts()
+    assert daily.file_id == 'uploaded' and daily.image is None
+    bot = FakeBot(blocked={chats[-1]})
+    broadcaster = Broadcaster(bot, store, game_logic, KEYBOARD, batch_size=3)
+    report = await broadcaster.run(daily)
+    # Sends in flight when the run was interrupted may be repeated, all others are not
+    assert sorted(set(first_chats) | {chat_id for chat_id, _ in bot.sent}) == chats[:-1]
+    assert len(chats) - 1 - len(first_chats) <= report.sent < len(chats) - 1
+    assert (report.failed, report.unsubscribed) == (1, 1)
+    assert await store.unfinished_broadcasts() == []
+    assert await store.delivery_counts(daily.id) == {'sent': 9, 'failed': 1}
+    assert await store.subscriber_count() == 10  # One blocked chat removed, one chat added
+
+    # Every subscriber can answer the broadcast challenge with the buttons that carry the broadcast id
+    assert {decode_answer(data) for data in bot.callback_data} == {(daily.id, 'left'), (daily.id, 'right')}
+    challenge = await game_logic.take_broadcast_challenge(daily.id, chats[0])
+    assert (challenge.correct_answer, challenge.source, challenge.expires_at) == ('left', 'local', expires_at)
+    # The challenge in progress is kept next to the broadcast challenge
+    challenge = await game_logic.take_active_challenge(chats[1])
+    assert (challenge.prompt, challenge.correct_answer) == ('own prompt', 'right')
+    challenge = await game_logic.take_broadcast_challenge(daily.id, chats[1])
+    assert (challenge.prompt, challenge.correct_answer) == ('prompt', 'left')
+    assert await game_logic.take_active_challenge(chats[0]) is None
+    await store.close()
+    await game_logic.close()
+
+
+def test_broadcast():
+    """A broadcast is delivered once per subscriber, survives restarts, unsubscribes blocked chats, keeps own challenges"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_broadcast(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running broadcast test for Optical Illusion Telegram Bot...')
+
+    try:
+        test_broadcast()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Broadcast test passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the record/replay cassette of the AI service of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from openai.types.chat import ChatCompletion
+
+from telegram_bot.ai_service import AIService
+from telegram_bot.cassette import Cassette, CassetteClient
+from telegram_bot.config import Settings
+
+
+class FakeOpenAI:
+    """Live API stand-in: every response differs, so replays can be told apart from new requests"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.images = SimpleNamespace(with_raw_response=SimpleNamespace(generate=self._generate))
+
+    async def _create(self, messages, model, max_tokens):
+        self.calls += 1
+        content = json.dumps({'prompt': f'prompt {self.calls}', 'explanation': 'объяснение'}, ensure_ascii=False)
+        return ChatCompletion.model_validate({
+            'id': str(self.calls),
+            'object': 'chat.completion',
+            'created': 0,
+            'model': model,
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 1000, 'completion_tokens': 50, 'total_tokens': 1050},
+        })
+
+    async def _generate(self, **kwargs):
+        self.calls += 1
+        image = f'image {self.calls} of {kwargs["prompt"]}'.encode()
+        return SimpleNamespace(content=json.dumps({'data': [{'b64_json': base64.b64encode(image).decode()}]}).encode())
+
+
+def _service(cassette, client):
+    service = AIService(api_key='test-key', settings=Settings(ai_cassette=cassette.mode, prompt_batch_size=1))
+    service.cassette = cassette
+    service.client = CassetteClient(client, cassette)
+    return service
+
+
+async def _run(service):
+    results = []
+    for _ in range(3):
+        prompt = await service.generate_prompt()
+        image = await service.generate_image_result(prompt.prompt)
+        results.append((prompt.prompt, prompt.correct_answer, image.image_bytes))
+    await service.close()
+    return results
+
+
+async def _check_record_replay(data_dir):
+    path = os.path.join(data_dir, 'cassette.db')
+    live = FakeOpenAI()
+    recorded = await _run(_service(Cassette(path, 'record'), live))
+    assert live.calls == 6
+
+    # Replay: no live client, same results, synthetic latency
+    cassette = Cassette(path, 'replay', latency=0.05)
+    start = time.monotonic()
+    replayed = await _run(_service(cassette, None))
+    assert replayed == recorded
+    assert time.monotonic() - start >= 6 * 0.05
+    assert (cassette.hits, cassette.misses) == (6, 0)
+
+    # Requests that were not recorded get recorded responses of the same kind
+    cassette = Cassette(path, 'replay', latency=0)
+    service = _service(cassette, None)
+    image = await service.generate_image_result('a prompt that was never recorded')
+    assert image.image_bytes == recorded[0][2] and cassette.misses == 1
+    await service.close()
+
+
+def test_record_replay():
+    """Recorded AI responses are replayed offline, deterministically and with synthetic latency"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_record_replay(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running cassette test for Optical Illusion Telegram Bot...')
+
+    try:
+        test_record_replay()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Cassette test passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent active challenge store of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.challenge_store import Challenge, ChallengeStore, monotonic_ns
+
+
+class _ErrorLog(logging.Handler):
+    """Collects the logged errors"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _challenge(chat_id, answer='left', created_at=None):
+    return Challenge(chat_id, 'prompt', answer, 'explanation', 'aW1hZ2U=', monotonic_ns(created_at or datetime.now()))
+
+
+async def _check_store(data_dir):
+    store = ChallengeStore(data_dir, hot_capacity=2)
+    for chat_id in ('1', '2', '3'):
+        await store.put(chat_id, _challenge(chat_id))
+    await store.put('old', _challenge('old', created_at=datetime.now() - timedelta(hours=1)))
+
+    # Only the most recent challenges stay in memory, and without images
+    assert list(store._hot) == ['3', 'old']
+    assert all(not challenge.image_base64 for challenge in store._hot.values())
+
+    # Concurrent answers: only one caller gets the challenge, both from memory and from disk
+    errors = _ErrorLog()
+    logging.getLogger('telegram_bot.challenge_store').addHandler(errors)
+    for chat_id in ('3', '1'):
+        results = await asyncio.gather(store.take(chat_id), store.take(chat_id))
+        assert sum(result is not None for result in results) == 1
+    assert await store.get('3') is None
+
+    # The background delete of a challenge taken from memory does not collide with other statements
+    await store._wait_for_delete('3')
+    logging.getLogger('telegram_bot.challenge_store').removeHandler(errors)
+    assert not store._taken
+    other = ChallengeStore(data_dir)
+    assert await other.get('3') is None and await other.get('1') is None
+    await other.close()
+
+    assert await store.delete_older_than(datetime.now() - timedelta(minutes=10)) == 1
+    await store.close()
+    assert not errors.messages, errors.messages
+
+    # Challenges survive a restart
+    store = ChallengeStore(data_dir)
+    challenge = await store.get('2')
+    assert challenge is not None and challenge.correct_answer == 'left'
+    assert await store.get('1') is None
+    assert await store.get('old') is None
+    await store.close()
+
+
+def test_challenge_store():
+    """Challenges are persisted, bounded in memory and taken exactly once"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_store(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_compact_challenge():
+    """Challenges have no per-instance dict and keep their times on the monotonic clock"""
+    created_at = datetime.now() - timedelta(minutes=5)
+    challenge = Challenge('1', 'prompt', 'left', 'explanation', '', monotonic_ns(created_at))
+    assert not hasattr(challenge, '__dict__')
+    assert abs(time.monotonic_ns() - challenge.created_ns - 300e9) < 1e9
+    assert challenge.created_at == created_at and challenge.expires_at is None
+
+
+def main():
+    """Main test function"""
+    print('Running challenge store test for Optical Illusion Telegram Bot...')
+
+    try:
+        test_challenge_store()
+        test_compact_challenge()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Challenge store test passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
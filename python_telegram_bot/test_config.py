@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script for the typed configuration and its reload of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import datetime
+import os
+import shutil
+import signal
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.config import ConfigError, RuntimeConfig, Settings
+from telegram_bot.game_logic import GameLogic
+from telegram_bot.send_scheduler import SendScheduler
+
+
+def test_parse_settings():
+    """Values are parsed by the type of their field, and unset or empty ones keep the defaults"""
+    settings = Settings.from_env({
+        'PROMPT_BATCH_SIZE': '3',
+        'IMAGE_ADAPTIVE': 'off',
+        'SEND_CHAT_RATE': '0.5',
+        'LOCAL_ILLUSIONS': 'ebbinghaus, ponzo',
+        'DAILY_BROADCAST_TIME': '08:30',
+        'SEASONS_KEPT': '',
+    })
+    assert settings.prompt_batch_size == 3
+    assert settings.image_adaptive is False
+    assert settings.send_chat_rate == 0.5
+    assert settings.local_illusions == ('ebbinghaus', 'ponzo')
+    assert settings.daily_broadcast_time == datetime.time(8, 30)
+    assert settings.seasons_kept is None
+    assert settings.challenge_timeout_minutes == 10.0 and settings.leaderboard_size == 10
+
+
+def test_invalid_settings():
+    """Every invalid value is reported at once, without revealing secrets"""
+    try:
+        Settings.from_env({
+            'PROMPT_BATCH_SIZE': 'many',
+            'IMAGE_QUALITY': 'ultra',
+            'LOCAL_ILLUSIONS': 'ebbinghaus,unknown',
+            'TELEGRAM_BOT_TOKEN': 'secret-token',
+            'SEND_GLOBAL_RATE': '0',
+        })
+        raise AssertionError('Invalid settings were accepted')
+    except ConfigError as e:
+        message = str(e)
+    for name in ('PROMPT_BATCH_SIZE', 'IMAGE_QUALITY', 'LOCAL_ILLUSIONS', 'SEND_GLOBAL_RATE'):
+        assert name in message, name
+    assert 'secret-token' not in message
+
+
+def test_apply_reloadable_settings():
+    """A reload changes the reloadable settings in place and keeps the ones that need a restart"""
+    environ = {'SEND_CHAT_RATE': '1', 'CHALLENGE_SOURCE': 'local'}
+    runtime_config = RuntimeConfig(Settings.from_env(environ), environ={})
+    scheduler = SendScheduler.from_settings(runtime_config.settings)
+    scheduler._chat_limiter(42)
+    runtime_config.subscribe(scheduler.apply_settings)
+
+    changed = runtime_config.apply({'SEND_CHAT_RATE': '2', 'CHALLENGE_SOURCE': 'ai', 'SEND_GLOBAL_RATE': '10'})
+    assert sorted(changed) == ['send_chat_rate', 'send_global_rate']
+    assert runtime_config.settings.send_chat_rate == 2.0
+    assert runtime_config.settings.challenge_source == 'local'
+    assert scheduler.chat_rate == 2.0 and scheduler._chat_limiter(42).rate == 2.0
+    # The bulk rate never exceeds the global rate
+    assert scheduler._global.rate == 10.0 and scheduler._bulk.rate == 10.0
+
+    # Invalid values are rejected as a whole
+    assert runtime_config.apply({'SEND_CHAT_RATE': '3', 'SEND_GLOBAL_RATE': 'fast'}) == []
+    assert runtime_config.settings.send_chat_rate == 2.0
+    assert runtime_config.reloads == 1
+
+
+def test_game_settings():
+    """The challenge timeout and the leaderboard size come from the settings and follow reloads"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        game_logic = GameLogic(data_dir, settings=Settings(challenge_timeout_minutes=5, leaderboard_size=3))
+        assert game_logic.challenge_timeout == datetime.timedelta(minutes=5)
+        assert game_logic.leaderboard_size == 3
+        game_logic.apply_settings(Settings(challenge_timeout_minutes=1, leaderboard_size=20))
+        assert game_logic.challenge_timeout == datetime.timedelta(minutes=1)
+        assert game_logic.leaderboard_size == 20
+        asyncio.run(game_logic.close())
+    finally:
+        shutil.rmtree(data_dir)
+
+
+async def _reload_on_sighup(env_file):
+    runtime_config = RuntimeConfig.load(env_file)
+    reloaded = asyncio.Event()
+    runtime_config.subscribe(lambda settings: reloaded.set())
+    assert runtime_config.install_signal_handler()
+    try:
+        with open(env_file, 'w', encoding='utf-8') as file:
+            file.write('LEADERBOARD_SIZE=25\n')
+        os.kill(os.getpid(), signal.SIGHUP)
+        await asyncio.wait_for(reloaded.wait(), 5)
+    finally:
+        runtime_config.remove_signal_handler()
+    return runtime_config.settings
+
+
+def test_reload_on_sighup():
+    """SIGHUP reads the .env file again"""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+    data_dir = tempfile.mkdtemp()
+    env_file = os.path.join(data_dir, '.env')
+    try:
+        with open(env_file, 'w', encoding='utf-8') as file:
+            file.write('LEADERBOARD_SIZE=15\n')
+        settings = asyncio.run(_reload_on_sighup(env_file))
+        assert settings.leaderboard_size == 25
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running configuration tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_parse_settings()
+        test_invalid_settings()
+        test_apply_reloadable_settings()
+        test_game_settings()
+        test_reload_on_sighup()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Configuration tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the CPU executor and event loop lag monitor of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.executor import CPUExecutor, decode_image_response, decode_image_variants
+from telegram_bot.loop_monitor import LoopLagMonitor
+
+
+def test_decode_image_response():
+    """Raw images API responses are parsed and decoded"""
+    image = os.urandom(1000)
+    content = json.dumps({'data': [{'b64_json': base64.b64encode(image).decode()}]}).encode()
+    assert decode_image_response(content) == (base64.b64encode(image).decode(), image)
+    assert decode_image_response(b'{"data": []}') == ('', b'')
+
+    images = [os.urandom(100) for _ in range(3)]
+    usage = {'input_tokens': 50, 'output_tokens': 600}
+    data = [{'b64_json': base64.b64encode(image).decode()} for image in images]
+    content = json.dumps({'data': data[:2] + [{}] + data[2:], 'usage': usage}).encode()
+    variants, parsed_usage = decode_image_variants(content)
+    assert [image for _, image in variants] == images and parsed_usage == usage
+
+
+async def _check_executors():
+    payload = base64.b64encode(os.urandom(100_000))
+    for kind in ('inline', 'thread', 'process'):
+        executor = CPUExecutor(kind, workers=1)
+        assert await executor.run(base64.b64decode, payload) == base64.b64decode(payload)
+        await executor.close()
+
+
+def test_executors():
+    """Every executor kind runs work and returns its result"""
+    asyncio.run(_check_executors())
+
+
+async def _check_lag_monitor():
+    monitor = LoopLagMonitor(threshold=0.1, interval=0.02)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    assert monitor.stalls == 0
+
+    # Blocking the loop is detected and its duration measured
+    time.sleep(0.3)
+    await asyncio.sleep(0.1)
+    monitor.stop()
+    assert monitor.stalls == 1
+    assert monitor.max_lag >= 0.25
+    assert monitor.summary()['samples'] > 5
+
+
+def test_lag_monitor():
+    """The lag monitor reports a blocked event loop"""
+    asyncio.run(_check_lag_monitor())
+
+
+def main():
+    """Main test function"""
+    print('Running executor tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_decode_image_response()
+        test_executors()
+        test_lag_monitor()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Executor tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming statistics export of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.export import StatsExport
+from telegram_bot.storage import AnswerEvent, create_stats_storage
+
+
+USERS = 250
+
+
+async def _fill(backend, data_dir):
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    await storage.record_answers([AnswerEvent(f'user_{i:03d}', i % 3 == 0, f'имя {i}') for i in range(USERS)])
+    return storage
+
+
+async def _check_export(backend, data_dir):
+    storage = await _fill(backend, data_dir)
+
+    # CSV in chunks of 40 users, with a write made while the export is in progress
+    stats_export = StatsExport(storage, 'csv', chunk_size=40)
+    chunks = []
+    async for data in stats_export:
+        chunks.append(data)
+        if len(chunks) == 2:
+            # The export does not hold the write lock, so answers can be recorded meanwhile
+            await asyncio.wait_for(
+                storage.record_answer(AnswerEvent('user_new', True, 'new')),
+                timeout=5,
+            )
+    rows = list(csv.reader(io.StringIO(gzip.decompress(b''.join(chunks)).decode('utf-8'))))
+    assert rows[0] == ['user_id', 'username', 'total_challenges', 'correct_answers', 'accuracy']
+    assert [row[0] for row in rows[1 : USERS + 1]] == [f'user_{i:03d}' for i in range(USERS)]
+    assert rows[4] == ['user_003', 'имя 3', '1', '1', '100.0']
+    assert rows[5] == ['user_004', 'имя 4', '1', '0', '0.0']
+    assert stats_export.rows == len(rows) - 1
+
+    # NDJSON written to a file
+    path = os.path.join(data_dir, 'export.ndjson.gz')
+    with open(path, 'wb') as file:
+        count = await StatsExport(storage, 'ndjson', chunk_size=100).write_to(file)
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+    assert count == len(records) == USERS + 1
+    assert records[-1] == {
+        'user_id': 'user_new',
+        'username': 'new',
+        'total_challenges': 1,
+        'correct_answers': 1,
+        'accuracy': 100.0,
+    }
+    await storage.close()
+
+
+def test_export():
+    """Both backends stream a complete gzip export in chunks without blocking writers"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_export(backend, data_dir))
+        finally:
+            shutil.rmtree(data_dir)
+
+
+async def _check_snapshot(backend, data_dir):
+    storage = await _fill(backend, data_dir)
+    exported = []
+    async for rows in storage.iter_users(chunk_size=40):
+        if not exported:
+            # An exported user, a user not exported yet and a new user answer during the export
+            await storage.record_answers([
+                AnswerEvent('user_001', True, 'new'),
+                AnswerEvent('user_200', True, 'new'),
+                AnswerEvent('user_new', True, 'new'),
+            ])
+        exported.extend(rows)
+    assert [row[0] for row in exported] == [f'user_{i:03d}' for i in range(USERS)]
+    assert exported[1] == ('user_001', 1, 0, 'имя 1')
+    assert exported[200] == ('user_200', 1, 0, 'имя 200')
+
+    # The answers are in the next export
+    exported = [row async for rows in storage.iter_users(chunk_size=40) for row in rows]
+    assert len(exported) == USERS + 1 and exported[200] == ('user_200', 2, 1, 'new')
+    await storage.close()
+
+
+def test_export_snapshot():
+    """An export reads the statistics as they were when it started, with both backends"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_snapshot(backend, data_dir))
+        finally:
+            shutil.rmtree(data_dir)
+
+
+def test_export_cli():
+    """The command line export reads the statistics of a running bot"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = asyncio.run(_fill('eventlog', data_dir))
+        result = subprocess.run(
+            [
+                sys.executable,
+                os.path.join(os.path.dirname(__file__), 'src', 'export_stats.py'),
+                '--backend',
+                'eventlog',
+                '--data-dir',
+                data_dir,
+            ],
+            capture_output=True,
+            check=True,
+        )
+        lines = gzip.decompress(result.stdout).decode('utf-8').splitlines()
+        assert len(lines) == USERS + 1
+        assert f'Exported {USERS} users' in result.stderr.decode()
+        asyncio.run(storage.close())
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_export_after_reset():
+    """The command line export reads the current season, not the archived ones"""
+    data_dir = tempfile.mkdtemp()
+    try:
+
+        async def reset_and_answer():
+            storage = await _fill('sqlite', data_dir)
+            await storage.reset()
+            await storage.record_answer(AnswerEvent('user_new', True, 'new'))
+            await storage.close()
+
+        asyncio.run(reset_and_answer())
+        result = subprocess.run(
+            [sys.executable, os.path.join(os.path.dirname(__file__), 'src', 'export_stats.py'), '--data-dir', data_dir],
+            capture_output=True,
+            check=True,
+        )
+        rows = list(csv.reader(io.StringIO(gzip.decompress(result.stdout).decode('utf-8'))))
+        assert rows[1:] == [['user_new', 'new', '1', '1', '100.0']]
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running statistics export tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_export()
+        test_export_snapshot()
+        test_export_cli()
+        test_export_after_reset()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Statistics export tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the group chat mode of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.game_logic import GameLogic
+
+
+async def _check_group_round(data_dir, backend):
+    game_logic = GameLogic(data_dir, stats_backend=backend)
+    await game_logic.storage.open()
+    # A user with statistics from before a restart
+    await game_logic.record_answers([('3', True, 'carol')])
+    game_logic.user_stats.clear()
+
+    await game_logic.start_challenge('-100', 'prompt', 'left', 'explanation', 'aW1hZ2U=', 'local')
+    game_logic.start_group_round('-100', message_id=7)
+    assert game_logic.add_group_answer('-100', 1, 'left', 'alice') is True
+    assert game_logic.add_group_answer('-100', 1, 'right', 'alice') is False  # Only the first answer counts
+    assert game_logic.add_group_answer('-100', 2, 'equal', 'bob') is True
+    assert game_logic.add_group_answer('-100', 3, 'left', 'carol') is True
+    assert game_logic.add_group_answer('-200', 1, 'left') is None
+
+    version = game_logic.stats_version
+    result = await game_logic.close_group_round('-100')
+    assert result.message_id == 7
+    assert (result.correct_users, result.total_users) == (2, 3)
+    assert result.answers == {'left': ['alice', 'carol'], 'right': [], 'equal': ['bob']}
+    assert game_logic.stats_version == version + 1  # One batch write
+    assert await game_logic.close_group_round('-100') is None
+    assert await game_logic.get_active_challenge('-100') is None
+    await game_logic.close()
+
+    # All answers were persisted, and earlier totals were kept
+    game_logic = GameLogic(data_dir, stats_backend=backend)
+    await game_logic.storage.open()
+    alice = await game_logic.get_user_stats('1')
+    bob = await game_logic.get_user_stats('2')
+    carol = await game_logic.get_user_stats('3')
+    assert (alice.total_challenges, alice.correct_answers) == (1, 1)
+    assert (bob.total_challenges, bob.correct_answers) == (1, 0)
+    assert (carol.total_challenges, carol.correct_answers, carol.username) == (2, 2, 'carol')
+    await game_logic.close()
+
+
+def test_group_round():
+    """Everyone in a group answers one challenge, and the answers are recorded in one batch"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_group_round(data_dir, backend))
+        finally:
+            shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running group round test for Optical Illusion Telegram Bot...')
+
+    try:
+        test_group_round()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Group round test passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
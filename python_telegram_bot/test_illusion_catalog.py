@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for the random illusion catalog of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.illusion_catalog import IllusionCatalog, parse_catalog, shuffled_index
+
+
+def _write(path, urls, mtime):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(urls) + '\n')
+    # Explicit modification times, so the test does not depend on the file system's timestamp resolution
+    os.utime(path, (mtime, mtime))
+
+
+def test_shuffled_index():
+    """Every seed gives a permutation of the whole range"""
+    for size in (1, 2, 7, 24, 1000, 4097):
+        for seed in (0, 1, 2**63 + 12345):
+            assert sorted(shuffled_index(position, size, seed) for position in range(size)) == list(range(size))
+    orders = {tuple(shuffled_index(position, 24, seed) for position in range(24)) for seed in range(20)}
+    assert len(orders) == 20
+
+
+def test_parse_catalog():
+    """Plain and JSON lines are parsed; comments, invalid lines and repeated URLs are skipped"""
+    entries = parse_catalog(
+        '# comment\n'
+        '\n'
+        'https://example.com/1.jpg|Описание\n'
+        'https://example.com/2.jpg\n'
+        '{"url": "https://example.com/3.jpg", "title": "Café wall", "author": "R. Gregory", "tags": ["lines"],'
+        ' "year": 1979}\n'
+        '{"description": "no url"}\n'
+        '{not json\n'
+        'https://example.com/1.jpg|Повтор\n'
+    )
+    assert [entry.url for entry in entries] == [f'https://example.com/{i}.jpg' for i in (1, 2, 3)]
+    assert entries[0].description == 'Описание'
+    assert entries[1].description == ''
+    assert (entries[2].title, entries[2].author, entries[2].tags) == ('Café wall', 'R. Gregory', ('lines',))
+    assert entries[2].meta == {'year': 1979}
+
+
+async def _check_draws(path):
+    urls = [f'https://example.com/{i}.jpg' for i in range(10)]
+    _write(path, urls, 1_000_000_000)
+    catalog = IllusionCatalog(path, check_interval=0)
+    assert len(catalog.entries) == 10
+
+    # Every illusion is shown once before any repeats, and never twice in a row
+    drawn = [(await catalog.draw('user')).url for _ in range(50)]
+    for epoch in range(5):
+        assert sorted(drawn[epoch * 10 : epoch * 10 + 10]) == sorted(urls)
+    assert all(first != second for first, second in itertools.pairwise(drawn))
+
+    # Users have orders of their own
+    other = [(await catalog.draw('other')).url for _ in range(10)]
+    assert sorted(other) == sorted(urls)
+
+    # The file is reloaded when it changes, and the next draws cover the new catalog
+    _write(path, urls + ['https://example.com/new.jpg'], 1_000_000_100)
+    drawn = [(await catalog.draw('user')).url for _ in range(11)]
+    assert catalog.version == 2
+    assert sorted(drawn) == sorted(urls + ['https://example.com/new.jpg'])
+
+    # A missing file keeps the loaded catalog
+    os.remove(path)
+    assert await catalog.draw('user') is not None
+    assert len(catalog.entries) == 11
+
+    # Cursors of the least recently drawing users are forgotten
+    catalog.max_users = 3
+    for user in range(5):
+        await catalog.draw(f'user_{user}')
+    assert list(catalog._cursors) == ['user_2', 'user_3', 'user_4']
+
+
+async def _check_empty(path):
+    catalog = IllusionCatalog(path)
+    assert catalog.entries == ()
+    assert await catalog.draw('user') is None
+
+
+def test_catalog_draws():
+    """Draws follow a per-user order without repeats, and the file is reloaded when it changes"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_draws(os.path.join(data_dir, 'illusion_urls.txt')))
+        asyncio.run(_check_empty(os.path.join(data_dir, 'missing.txt')))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running illusion catalog tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_shuffled_index()
+        test_parse_catalog()
+        test_catalog_draws()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Illusion catalog tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the local illusion renderer and challenge sources of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import base64
+import io
+import os
+import sys
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from PIL import Image
+
+from telegram_bot.challenge_source import (
+    ChallengeGenerationError,
+    ChallengeSource,
+    FallbackChallengeSource,
+    LocalChallengeSource,
+)
+from telegram_bot.executor import CPUExecutor
+from telegram_bot.illusion_renderer import ANSWERS, ILLUSIONS, render_illusion
+
+
+def test_render_matches_answer():
+    """Every illusion is rendered with true sizes matching the requested answer"""
+    for illusion in ILLUSIONS:
+        for answer in ANSWERS:
+            rendered = render_illusion(illusion, answer, seed=42, size=256)
+            if answer == 'equal':
+                assert rendered.left_size == rendered.right_size
+            elif answer == 'left':
+                assert rendered.left_size > rendered.right_size * 1.05
+            else:
+                assert rendered.right_size > rendered.left_size * 1.05
+            image = Image.open(io.BytesIO(rendered.image_png))
+            assert image.size == (256, 256)
+            assert rendered.explanation
+
+    # The same seed renders the same image
+    assert render_illusion('ponzo', 'left', 7).image_png == render_illusion('ponzo', 'left', 7).image_png
+
+
+class FailingSource(ChallengeSource):
+    name = 'failing'
+
+    async def generate(self, on_progress=None):
+        raise ChallengeGenerationError('unavailable')
+
+
+async def _check_sources():
+    local = LocalChallengeSource(CPUExecutor('inline'), illusions=('ebbinghaus',), image_size=128)
+    challenge = await local.generate()
+    assert challenge.source == 'local' and challenge.detail == 'ebbinghaus'
+    assert challenge.correct_answer in ANSWERS
+    assert challenge.image_bytes.startswith(b'\x89PNG')
+    assert base64.b64decode(challenge.image_base64) == challenge.image_bytes
+
+    # The fallback source serves a local challenge when the primary source fails
+    challenge = await FallbackChallengeSource(FailingSource(), local).generate()
+    assert challenge.source == 'local'
+    await local.close()
+
+
+def test_challenge_sources():
+    """The local source renders challenges and backs up a failing source"""
+    asyncio.run(_check_sources())
+
+
+def main():
+    """Main test function"""
+    print('Running illusion renderer tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_render_matches_answer()
+        test_challenge_sources()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Illusion renderer tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
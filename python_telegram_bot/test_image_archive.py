@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the prompt similarity image archive of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.ai_service import GeneratedImage, PromptResponse
+from telegram_bot.challenge_source import AIChallengeSource
+from telegram_bot.image_archive import ImageArchive, minhash
+
+
+PROMPT = (
+    'Two circles side by side. The left circle is 20% larger in diameter when measured. The left circle is '
+    'surrounded by very large circles (2x its size) making it appear smaller. The right circle is surrounded by '
+    'tiny circles (0.3x its size) making it appear larger. Clean white background.'
+)
+SIMILAR_PROMPT = PROMPT.replace('20%', '15%').replace('Clean white', 'Plain white')
+OTHER_PROMPT = (
+    'Two horizontal rectangles. The right rectangle is 15% longer when measured. Apply Ponzo illusion: draw '
+    'converging lines in the background creating forced perspective.'
+)
+
+
+def test_similarity():
+    """Signatures estimate the similarity of prompts independently of case and punctuation"""
+    assert (minhash(PROMPT) == minhash(PROMPT.upper().replace('.', ' '))).all()
+    assert (minhash(PROMPT) == minhash(SIMILAR_PROMPT)).mean() > 0.6
+    assert (minhash(PROMPT) == minhash(OTHER_PROMPT)).mean() < 0.2
+
+
+async def _check_archive(data_dir):
+    archive = ImageArchive(data_dir, threshold=0.6, max_images=2)
+    assert await archive.find(PROMPT, 'left') is None
+    await archive.add(PROMPT, 'left', 'объяснение', b'\x89PNG left', 'png', 'full')
+
+    # Only similar prompts with the same answer get the image, with the archived prompt and explanation
+    image = await archive.find(SIMILAR_PROMPT, 'left')
+    assert image.image_bytes == b'\x89PNG left' and image.prompt == PROMPT and image.explanation == 'объяснение'
+    assert image.similarity > 0.6
+    assert await archive.find(SIMILAR_PROMPT, 'right') is None
+    assert await archive.find(OTHER_PROMPT, 'left') is None
+    archive.threshold = 1.0
+    assert await archive.find(SIMILAR_PROMPT, 'left') is None
+    assert (archive.stats.lookups, archive.stats.hits) == (5, 1) and archive.stats.hit_rate == 0.2
+
+    # Another process sees the archived images, and evictions by it
+    other = ImageArchive(data_dir, threshold=0.6, max_images=2)
+    assert (await other.find(SIMILAR_PROMPT, 'left')).image_bytes == b'\x89PNG left'
+    await other.add(OTHER_PROMPT, 'right', '', b'\x89PNG right', 'png', 'full')
+    await other.add(OTHER_PROMPT + ' Dark background.', 'right', '', b'\x89PNG dark', 'png', 'full')
+    archive.threshold = 0.6
+    assert await archive.find(SIMILAR_PROMPT, 'left') is None
+    assert (await archive.find(OTHER_PROMPT, 'right')).image_bytes in (b'\x89PNG right', b'\x89PNG dark')
+    await other.close()
+    await archive.close()
+
+
+def test_archive():
+    """Archived images are found by similar prompts with the same answer, across processes"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_archive(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+class FakeAIService:
+    """Returns the given prompts in turn and counts image requests"""
+
+    prompt_model = 'fake-model'
+
+    def __init__(self, prompts):
+        self.prompts = list(prompts)
+        self.image_requests = 0
+
+    async def generate_prompt(self):
+        return PromptResponse(self.prompts.pop(0), 'left', f'explanation {len(self.prompts)}')
+
+    async def generate_image_result(self, prompt):
+        self.image_requests += 1
+        return GeneratedImage('aW1hZ2U=', b'image', 'full', 'png', 1.0)
+
+
+async def _check_reuse(data_dir):
+    service = FakeAIService([PROMPT, SIMILAR_PROMPT, OTHER_PROMPT])
+    source = AIChallengeSource(service, archive=ImageArchive(data_dir, threshold=0.6))
+    first = await source.generate()
+    reused = await source.generate()
+    assert service.image_requests == 1
+    assert (reused.prompt, reused.explanation, reused.image_base64) == (first.prompt, first.explanation, 'aW1hZ2U=')
+    assert reused.detail == 'full' and reused.source == 'ai'
+    await source.generate()
+    assert service.image_requests == 2
+    assert source.archive.stats.stored == 2
+    await source.close()
+
+
+def test_reuse():
+    """The AI source serves archived images to similar prompts instead of requesting new ones"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_reuse(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running image archive tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_similarity()
+        test_archive()
+        test_reuse()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Image archive tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the adaptive image quality policy of the Optical Illusion Telegram Bot
+"""
+
+import os
+import sys
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.image_policy import AdaptiveImagePolicy, ImageSettings, build_tiers
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_build_tiers():
+    """Tiers step down from the configured settings and skip no-op steps"""
+    tiers = build_tiers(ImageSettings(quality='high', size='1536x1024', output_format='png'))
+    assert [tier.name for tier in tiers] == ['full', 'reduced', 'economy', 'minimal']
+    assert tiers[1].settings.quality == 'medium' and tiers[1].settings.size == '1024x1024'
+    assert tiers[2].settings.quality == 'low' and tiers[2].settings.output_format == 'jpeg'
+    assert (tiers[2].settings.output_compression, tiers[3].settings.output_compression) == (75, 50)
+
+    # The default settings still step down, by compression
+    tiers = build_tiers(ImageSettings())
+    assert [tier.name for tier in tiers] == ['full', 'economy', 'minimal']
+
+    tiers = build_tiers(ImageSettings(quality='low', size='1024x1024', output_format='jpeg', output_compression=50))
+    assert [tier.name for tier in tiers] == ['full']
+
+
+def test_policy_steps_down_and_up():
+    """The policy steps down under load and back up when idle, respecting the cooldown"""
+    clock = FakeClock()
+    policy = AdaptiveImagePolicy(
+        build_tiers(ImageSettings(quality='high')),
+        overload_queue_depth=3,
+        overload_latency=40,
+        cooldown=10,
+        clock=clock,
+    )
+
+    assert policy.acquire().name == 'full'
+    assert policy.acquire().name == 'full'
+    assert policy.acquire().name == 'reduced'  # Three requests in flight
+    assert policy.acquire().name == 'reduced'  # Cooldown not over yet
+    clock.now += 10
+    assert policy.acquire().name == 'economy'
+    for _ in range(5):
+        policy.release(50.0)
+    assert policy.in_flight == 0
+
+    # Still slow: stays at the cheapest tier
+    clock.now += 1
+    assert policy.acquire().name == 'economy'
+    policy.release(10.0)
+
+    # After an idle period the old latency is forgotten and the policy steps back up
+    clock.now += 60
+    assert policy.acquire().name == 'reduced'
+    policy.release(5.0)
+    clock.now += 10
+    assert policy.acquire().name == 'full'
+    policy.release(5.0)
+
+
+def test_policy_disabled():
+    """A disabled policy always serves the configured settings"""
+    policy = AdaptiveImagePolicy(build_tiers(ImageSettings(quality='high')), overload_queue_depth=1, enabled=False)
+    assert all(policy.acquire().name == 'full' for _ in range(5))
+
+
+def main():
+    """Main test function"""
+    print('Running adaptive image policy tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_build_tiers()
+        test_policy_steps_down_and_up()
+        test_policy_disabled()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Adaptive image policy tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
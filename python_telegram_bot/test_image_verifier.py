@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the ground-truth image verification of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import sys
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.ai_service import GeneratedImage, PromptResponse
+from telegram_bot.challenge_source import AIChallengeSource, ChallengeGenerationError
+from telegram_bot.executor import CPUExecutor
+from telegram_bot.illusion_renderer import ANSWERS, ILLUSIONS, render_illusion
+from telegram_bot.image_verifier import ImageVerifier, measure_image
+
+
+def test_measure_rendered_illusions():
+    """The measured answer of locally rendered illusions matches their true answer"""
+    for illusion in ILLUSIONS:
+        for answer in ANSWERS:
+            measurement = measure_image(render_illusion(illusion, answer, seed=1).image_png)
+            assert measurement.answer == answer, (illusion, answer, measurement)
+
+
+class FakeAIService:
+    """Returns a rendered image whose true answer differs from the prompt's answer"""
+
+    prompt_model = 'fake-model'
+
+    def __init__(self, prompt_answer, image_answer, origin=prompt_model):
+        self.prompt_answer = prompt_answer
+        self.origin = origin
+        self.image = render_illusion('ebbinghaus', image_answer, seed=3).image_png
+
+    async def generate_prompt(self):
+        return PromptResponse('prompt', self.prompt_answer, 'explanation', self.origin)
+
+    async def generate_image_result(self, prompt):
+        return GeneratedImage('aW1hZ2U=', self.image, 'full', 'png', 1.0)
+
+
+async def _check_modes():
+    executor = CPUExecutor('inline')
+
+    verifier = ImageVerifier(executor, 'reject')
+    source = AIChallengeSource(FakeAIService('left', 'left'), verifier)
+    assert (await source.generate()).correct_answer == 'left'
+    source = AIChallengeSource(FakeAIService('left', 'right'), verifier)
+    try:
+        await source.generate()
+        raise AssertionError('mismatching image was not rejected')
+    except ChallengeGenerationError:
+        pass
+    counts = verifier.counts['fake-model']
+    assert (counts.passed, counts.failed) == (1, 1) and counts.pass_rate == 0.5
+    # Template prompts are counted apart from the prompt model
+    source = AIChallengeSource(FakeAIService('left', 'left', 'template'), verifier)
+    await source.generate()
+    assert verifier.counts['template'].passed == 1 and verifier.counts['fake-model'].passed == 1
+
+    source = AIChallengeSource(FakeAIService('equal', 'right'), ImageVerifier(executor, 'relabel'))
+    challenge = await source.generate()
+    assert challenge.correct_answer == 'right' and challenge.explanation != 'explanation'
+
+    source = AIChallengeSource(FakeAIService('equal', 'right'), ImageVerifier(executor, 'log'))
+    assert (await source.generate()).correct_answer == 'equal'
+
+
+class FakeVariantsAIService(FakeAIService):
+    """Returns several images per request: two match the prompt's answer, one does not"""
+
+    def __init__(self):
+        super().__init__('left', 'left')
+        self.image_requests = 0
+        self.variants = [
+            render_illusion('ebbinghaus', answer, seed=4).image_png for answer in ('right', 'left', 'left')
+        ]
+
+    async def generate_image_variants(self, prompt, n):
+        self.image_requests += 1
+        return [GeneratedImage(f'aW1hZ2U{i}', image, 'full', 'png', 3.0) for i, image in enumerate(self.variants[:n])]
+
+
+async def _check_variants():
+    service = FakeVariantsAIService()
+    source = AIChallengeSource(service, ImageVerifier(CPUExecutor('inline'), 'reject'), variants=3)
+    first = await source.generate()
+    assert first.image_bytes == service.variants[1] and len(source.ready) == 1
+    # The other usable variant is served without a request, with the prompt's answer and explanation
+    second = await source.generate()
+    assert second.image_bytes == service.variants[2] and service.image_requests == 1
+    assert (second.correct_answer, second.explanation) == ('left', 'explanation')
+    await source.generate()
+    assert service.image_requests == 2
+
+
+def test_verification_modes():
+    """Mismatching images are rejected, relabeled or only logged, and counted per prompt origin"""
+    asyncio.run(_check_modes())
+
+
+def test_image_variants():
+    """Extra image variants of a prompt are verified and kept as ready challenges"""
+    asyncio.run(_check_variants())
+
+
+def main():
+    """Main test function"""
+    print('Running image verification tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_measure_rendered_illusions()
+        test_verification_modes()
+        test_image_variants()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Image verification tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
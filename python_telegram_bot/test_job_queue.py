@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for the generation job queue and workers of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.challenge_source import ChallengeGenerationError, ChallengeSource, GeneratedChallenge
+from telegram_bot.generation_worker import GenerationWorker
+from telegram_bot.job_queue import FAILED, INTERRUPTED_ERROR, READY, JobEvents, JobNotifier, JobQueue
+
+
+def _challenge(detail='ebbinghaus'):
+    return GeneratedChallenge('prompt', 'left', 'explanation', '', b'\x89PNG image', 'png', 'local', detail)
+
+
+class ScriptedSource(ChallengeSource):
+    """Raises the given errors in turn, None generates a challenge"""
+
+    name = 'local'
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+
+    async def generate(self, on_progress=None):
+        if on_progress is not None:
+            await on_progress('image')
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return _challenge()
+
+
+async def _check_leases(data_dir):
+    queue = JobQueue(data_dir, lease_seconds=0.2, max_attempts=2)
+    job_id = await queue.enqueue('42', status_message_id=7)
+    assert await queue.has_open_job('42')
+
+    # A leased job is not leased again while the lease holds
+    job, _ = await queue.lease('a')
+    assert job.id == job_id and job.attempts == 1 and job.status_message_id == 7
+    assert (await queue.lease('b'))[0] is None
+
+    # Another worker takes over an expired lease, and the first worker's result is discarded
+    await asyncio.sleep(0.3)
+    job, _ = await queue.lease('b')
+    assert job.id == job_id and job.attempts == 2
+    assert not await queue.complete(job_id, 'a', _challenge())
+
+    # After the last attempt expires, the job fails
+    await asyncio.sleep(0.3)
+    job, expired = await queue.lease('c')
+    assert job is None and expired == [job_id]
+    [failed] = await queue.undelivered()
+    assert failed.status == FAILED and failed.error == INTERRUPTED_ERROR and failed.challenge is None
+    assert not await queue.has_open_job('42')
+
+    # A failed attempt is retried after a delay
+    job_id = await queue.enqueue('43')
+    job, _ = await queue.lease('a')
+    assert not await queue.fail(job.id, 'a', 'error')
+    assert (await queue.lease('a'))[0] is None
+    assert await queue.pending_count() == 1
+
+    # Delivered jobs are not delivered again, and purged later
+    await queue.mark_delivered(failed.id)
+    assert await queue.undelivered() == []
+    assert await queue.purge_delivered(older_than=0) == 1
+    await queue.close()
+
+
+def test_leases():
+    """Jobs are leased by one worker at a time, taken over after the lease expires and fail after the last attempt"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_leases(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+async def _check_worker(data_dir):
+    events = []
+    finished = asyncio.Event()
+
+    async def on_event(event):
+        events.append(event)
+        if event['event'] == 'finished':
+            finished.set()
+
+    server = JobEvents(os.path.join(data_dir, 'jobs.sock'), on_event)
+    await server.start()
+    queue = JobQueue(data_dir, max_attempts=2)
+    notifier = JobNotifier(server.path)
+    source = ScriptedSource([
+        RuntimeError('timeout'),
+        ChallengeGenerationError('no image'),
+        None,
+        RuntimeError('timeout'),
+    ])
+    worker = GenerationWorker(queue, source, notifier, concurrency=1, poll_interval=0.05, name='w')
+
+    # The first job succeeds on its retry, the second one fails for good
+    first = await queue.enqueue('42', status_message_id=7)
+    await asyncio.sleep(0.01)
+    second = await queue.enqueue('43')
+    job, _ = await queue.lease('w')
+    await worker.process(job)
+    job, _ = await queue.lease('w')
+    await worker.process(job)
+    assert not finished.is_set()
+
+    # Retries wait for their delay; the worker picks them up by itself
+    queue_db = await queue._connection()
+    await queue_db.execute("UPDATE jobs SET available_at = 0 WHERE status = 'pending'")
+    await queue_db.commit()
+    task = asyncio.create_task(worker.run())
+    while len(await queue.undelivered()) < 2:
+        await asyncio.sleep(0.05)
+    worker.stop()
+    await asyncio.wait_for(task, 5)
+
+    jobs = {job.id: job for job in await queue.undelivered()}
+    assert jobs[first].status == READY and jobs[first].challenge.image_bytes == b'\x89PNG image'
+    assert jobs[first].challenge.detail == 'ebbinghaus' and jobs[first].attempts == 2
+    assert jobs[second].status == FAILED and jobs[second].error.startswith('Извините')
+    assert worker.completed == 1 and worker.failed == 1
+    assert await queue.pending_count() == 0
+
+    await asyncio.sleep(0.1)
+    assert finished.is_set()
+    assert {'job': first, 'event': 'progress', 'stage': 'image', 'chat_id': '42', 'message_id': 7} in events
+    assert {event['job'] for event in events if event['event'] == 'finished'} == {first, second}
+
+    await notifier.close()
+    await server.stop()
+    assert not os.path.exists(server.path)
+    # Without the bot, notifications fail quietly
+    assert not await notifier.notify(first, 'finished')
+    await queue.close()
+
+
+def test_worker():
+    """Workers retry failed jobs, store the results and notify the bot"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_worker(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running job queue tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_leases()
+        test_worker()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Job queue tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
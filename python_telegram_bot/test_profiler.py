@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the on-demand profiler of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.profiler import Profiler
+
+
+def busy_handler():
+    """Blocks the event loop, like CPU-bound work done on it by mistake"""
+    deadline = time.perf_counter() + 0.02
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _workload(stop, leak):
+    while not stop.is_set():
+        busy_handler()
+        leak.append(bytearray(10000))
+        await asyncio.sleep(0.005)
+
+
+async def _profile(profiler, seconds, mode, memory=False):
+    stop = asyncio.Event()
+    leak = []
+    workload = asyncio.create_task(_workload(stop, leak))
+    try:
+        return await profiler.run(seconds, mode, memory)
+    finally:
+        stop.set()
+        await workload
+
+
+async def _check_profiles(data_dir):
+    profiler = Profiler(data_dir, sample_interval=0.002)
+
+    result = await _profile(profiler, 0.5, 'cprofile')
+    assert result.path.endswith('.prof') and os.path.dirname(result.path) == os.path.join(data_dir, 'profiles')
+    assert 'busy_handler (test_profiler.py' in result.summary
+    assert 'busy_handler' in str(pstats.Stats(result.path).stats)
+    assert not profiler.running
+
+    # A stopped profile ends early; only one profile runs at a time
+    task = asyncio.create_task(_profile(profiler, 60, 'sample', memory=True))
+    await asyncio.sleep(0.5)
+    assert profiler.running
+    try:
+        await profiler.run(1)
+        raise AssertionError('A second profile was started')
+    except RuntimeError:
+        pass
+    assert profiler.stop()
+    result = await asyncio.wait_for(task, 10)
+    assert result.seconds < 5
+    assert 'busy_handler (test_profiler.py' in result.summary.splitlines()[2]
+    with open(result.path, encoding='utf-8') as file:
+        assert any('busy_handler' in line for line in file)
+
+    # The growth is attributed to the line appending to the list
+    assert result.memory_path.endswith('.tracemalloc') and os.path.exists(result.memory_path)
+    assert 'test_profiler.py:' in result.memory_summary.splitlines()[2]
+    assert not profiler.stop()
+
+
+def test_profiler():
+    """cProfile and sampling profiles name the function blocking the loop, and memory growth is located"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_profiles(data_dir))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running profiler test for Optical Illusion Telegram Bot...')
+
+    try:
+        test_profiler()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Profiler test passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the outbound send scheduler of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from telegram_bot.send_scheduler import SendScheduler, bulk_sends
+
+
+class FakeSession:
+    """Records the requests that reach Telegram; can ask for a flood-control wait on the first one"""
+
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+        self.requests = []
+
+    async def make_request(self, bot, method):
+        if self.retry_after is not None:
+            retry_after, self.retry_after = self.retry_after, None
+            raise TelegramRetryAfter(method, 'Too Many Requests', retry_after=retry_after)
+        self.requests.append((time.monotonic(), getattr(method, 'text', None)))
+        return True
+
+
+def _send(scheduler, session, chat_id, text):
+    return scheduler(session.make_request, None, SendMessage(chat_id=chat_id, text=text))
+
+
+async def _check_rates():
+    scheduler = SendScheduler(global_rate=1000, chat_rate=20, chat_burst=1)
+    session = FakeSession()
+    start = time.monotonic()
+    await asyncio.gather(*(_send(scheduler, session, 1, str(i)) for i in range(3)))
+    # One chat: 20 per second, one at a time
+    assert time.monotonic() - start >= 0.09
+    assert [text for _, text in session.requests] == ['0', '1', '2']
+
+    start = time.monotonic()
+    await asyncio.gather(*(_send(scheduler, session, chat_id, 'x') for chat_id in range(10, 20)))
+    # Different chats are only limited by the global rate
+    assert time.monotonic() - start < 0.09
+    # Requests without a chat are not scheduled
+    await scheduler(session.make_request, None, AnswerCallbackQuery(callback_query_id='1'))
+    assert scheduler.sent == {0: 13, 1: 0}
+    await scheduler.close()
+
+
+async def _check_priority():
+    scheduler = SendScheduler(global_rate=50, bulk_rate=50)
+    session = FakeSession()
+    with bulk_sends():
+        bulk = [asyncio.create_task(_send(scheduler, session, chat_id, 'bulk')) for chat_id in range(10)]
+    await asyncio.sleep(0.05)
+    await _send(scheduler, session, 100, 'reply')
+    await asyncio.gather(*bulk)
+    texts = [text for _, text in session.requests]
+    # The reply overtakes the bulk sends still queued
+    assert texts.index('reply') < 6, texts
+    summary = scheduler.summary()
+    assert summary['bulk']['sent'] == 10 and summary['interactive']['sent'] == 1
+    assert summary['bulk']['max_ms'] > summary['interactive']['max_ms']
+    await scheduler.close()
+
+
+async def _check_retry_after():
+    scheduler = SendScheduler(global_rate=1000)
+    session = FakeSession(retry_after=1)
+    start = time.monotonic()
+    assert await _send(scheduler, session, 1, 'hello') is True
+    # Retried once, exactly after the requested wait
+    assert [text for _, text in session.requests] == ['hello']
+    assert 1.0 <= session.requests[0][0] - start < 1.5
+    assert scheduler.retries == 1
+    # Other chats were not paused
+    await _send(scheduler, session, 2, 'other')
+    await scheduler.close()
+
+
+def test_send_rates():
+    """Sends to one chat are spaced, sends to different chats are not"""
+    asyncio.run(_check_rates())
+
+
+def test_send_priority():
+    """Interactive sends are served before queued bulk sends"""
+    asyncio.run(_check_priority())
+
+
+def test_retry_after():
+    """Flood-control errors pause the chat for the requested time and the request is retried"""
+    asyncio.run(_check_retry_after())
+
+
+def main():
+    """Main test function"""
+    print('Running send scheduler tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_send_rates()
+        test_send_priority()
+        test_retry_after()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Send scheduler tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Test script for the statistics storage backends of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from datetime import date
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from telegram_bot.storage import (
+    AnswerEvent,
+    DailyStats,
+    EventLogStatsStorage,
+    IllusionStats,
+    StatsRow,
+    create_stats_storage,
+    decode_events,
+)
+
+
+async def _record(storage, user_id, is_correct, username=''):
+    await storage.record_answer(AnswerEvent(user_id, is_correct, username))
+
+
+async def _check_backend(backend, data_dir):
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+
+    await asyncio.gather(
+        _record(storage, 'user_1', True, 'alice'),
+        _record(storage, 'user_2', False, 'bob'),
+    )
+    await _record(storage, 'user_1', True)
+    await _record(storage, 'user_2', True)
+    await _record(storage, 'user_1', False)
+    await storage.close()
+
+    # Reopen and check that everything survived
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    assert await storage.load_user('user_1') == StatsRow(3, 2, 'alice')
+    assert await storage.load_user('user_2') == StatsRow(2, 1, 'bob')
+    assert await storage.load_user('missing') is None
+
+    leaderboard = await storage.get_leaderboard('user_2', limit=1)
+    assert [entry[1] for entry in leaderboard['top_users']] == ['user_1']
+    assert leaderboard['user_rank'][0] == 2
+
+    await storage.reset()
+    assert await storage.load_user('user_1') is None
+    await storage.close()
+
+
+def test_backends():
+    """Both backends implement the same behaviour"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_backend(backend, data_dir))
+        finally:
+            shutil.rmtree(data_dir)
+
+
+async def _check_pagination(backend, data_dir):
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    # 25 users, several with equal scores, ranked by (correct desc, total asc, user_id asc)
+    for i in range(25):
+        for answer in range(i % 7 + 1):
+            await _record(storage, f'user_{i:02d}', answer % 2 == 0)
+    expected = sorted(
+        (f'user_{i:02d}' for i in range(25)),
+        key=lambda uid: (-((int(uid[5:]) % 7) // 2 + 1), int(uid[5:]) % 7 + 1, uid),
+    )
+
+    seen = []
+    page = await storage.get_leaderboard_page(page_size=10)
+    pages = [page]
+    while page.has_next:
+        page = await storage.get_leaderboard_page(after=page.last, page_size=10)
+        pages.append(page)
+    for page in pages:
+        seen.extend(entry[1] for entry in page.entries)
+    assert seen == expected
+    assert [entry[0] for page in pages for entry in page.entries] == list(range(1, 26))
+
+    # Walking back from the last page returns the same pages
+    previous = await storage.get_leaderboard_page(before=pages[-1].first, page_size=10)
+    assert previous.entries == pages[1].entries and previous.has_prev
+
+    # The user's own page is aligned with regular browsing
+    user_page = await storage.get_user_leaderboard_page(expected[14], page_size=10)
+    assert user_page.entries == pages[1].entries
+    assert await storage.get_user_leaderboard_page('missing') is None
+
+    # The user's rank is the one shown on the pages, also for users with equal scores
+    for rank, user_id in enumerate(expected, 1):
+        assert (await storage.get_leaderboard(user_id, limit=0))['user_rank'][0] == rank
+    await storage.close()
+
+
+def test_leaderboard_pagination():
+    """Keyset pagination walks the whole leaderboard in order with both backends"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_pagination(backend, data_dir))
+        finally:
+            shutil.rmtree(data_dir)
+
+
+async def _check_rollups(backend, data_dir):
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    today = date.today().isoformat()
+    week_ago = time.time() - 7 * 86400
+    events = [
+        AnswerEvent(
+            'user_1',
+            True,
+            'alice',
+            chat_id='-1',
+            answer='left',
+            correct_answer='left',
+            source='local',
+            detail='ebbinghaus',
+        ),
+        AnswerEvent(
+            'user_2',
+            False,
+            'bob',
+            chat_id='-1',
+            answer='right',
+            correct_answer='left',
+            source='local',
+            detail='ebbinghaus',
+        ),
+        AnswerEvent('user_1', False, 'alice', week_ago, '1', 'equal', 'left', 'ai', 'high'),
+    ]
+    # A group round: one transaction for totals, history and rollups
+    await storage.record_answers(events[:2])
+    await storage.record_answer(events[2])
+    await storage.close()
+
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    assert await storage.get_daily_stats('user_1') == [DailyStats(today, 1, 1)]
+    assert len(await storage.get_daily_stats('user_1', days=30)) == 2
+    assert await storage.get_illusion_stats(days=1) == [IllusionStats('local', 'ebbinghaus', 2, 1)]
+    all_time = await storage.get_illusion_stats()
+    assert all_time == [IllusionStats('local', 'ebbinghaus', 2, 1), IllusionStats('ai', 'high', 1, 0)]
+    assert all_time[0].accuracy == 50.0
+
+    # A new season keeps the rollups
+    await storage.reset()
+    assert await storage.get_daily_stats('user_1') == [DailyStats(today, 1, 1)]
+    assert len(await storage.get_illusion_stats()) == 2
+
+    # Days before the retention window are pruned from both rollups, also after a restart
+    assert await storage.prune_rollups(days=7, batch_size=1, pause=0) == 2
+    await storage.close()
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    assert await storage.get_daily_stats('user_1', days=30) == [DailyStats(today, 1, 1)]
+    assert await storage.get_illusion_stats() == [IllusionStats('local', 'ebbinghaus', 2, 1)]
+    assert await storage.prune_rollups(days=7) == 0
+    await storage.close()
+
+
+def test_answer_rollups():
+    """Answers update the daily user and illusion rollups in both backends, and survive restarts"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_rollups(backend, data_dir))
+            if backend == 'sqlite':
+                with sqlite3.connect(os.path.join(data_dir, 'user_stats.db')) as db:
+                    rows = db.execute('SELECT user_id, chat_id, answer, correct_answer, detail FROM answer_history')
+                    assert rows.fetchall()[1] == ('user_2', '-1', 'right', 'left', 'ebbinghaus')
+            else:
+                # Compacted logs are kept as the history
+                history = [name for name in os.listdir(data_dir) if name.startswith('stats_history.')]
+                with open(os.path.join(data_dir, history[0]), 'rb') as file:
+                    events, _ = decode_events(file.read())
+                assert events[1][1].answer == 'right' and events[1][1].detail == 'ebbinghaus'
+        finally:
+            shutil.rmtree(data_dir)
+
+
+async def _check_seasons(backend, data_dir):
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    assert storage.season == 1
+    for i in range(30):
+        await _record(storage, f'user_{i:02d}', True, f'name {i}')
+    await storage.reset()
+    assert storage.season == 2
+    assert await storage.load_user('user_01') is None
+    assert (await storage.get_leaderboard('user_01'))['top_users'] == []
+    await _record(storage, 'user_01', False)
+    await storage.reset()
+    await _record(storage, 'user_02', True)
+    await storage.close()
+
+    # The season survives restarts, and only its users are ranked
+    storage = create_stats_storage(backend, data_dir)
+    await storage.open()
+    assert storage.season == 3
+    assert await storage.load_user('user_02') == StatsRow(1, 1, '')
+    leaderboard = await storage.get_leaderboard('user_01')
+    assert [entry[1] for entry in leaderboard['top_users']] == ['user_02'] and leaderboard['user_rank'] is None
+    assert [len(rows) async for rows in storage.iter_users()] == [1]
+
+    # Keep the last finished season, prune the first one in small batches
+    assert await storage.prune_seasons(keep=1, batch_size=7, pause=0) == 1
+    assert await storage.prune_seasons(keep=1, batch_size=7, pause=0) == 0
+    await storage.close()
+
+
+def test_seasons():
+    """A reset starts a new season, old seasons are archived and can be pruned"""
+    for backend in ('sqlite', 'eventlog'):
+        data_dir = tempfile.mkdtemp()
+        try:
+            asyncio.run(_check_seasons(backend, data_dir))
+            if backend == 'sqlite':
+                with sqlite3.connect(os.path.join(data_dir, 'user_stats.db')) as db:
+                    seasons = db.execute('SELECT season, COUNT(*) FROM user_stats GROUP BY season').fetchall()
+                assert seasons == [(2, 1), (3, 1)]
+            else:
+                archives = sorted(name for name in os.listdir(data_dir) if name.startswith('stats_season.'))
+                assert archives == ['stats_season.00000002.json']
+        finally:
+            shutil.rmtree(data_dir)
+
+
+def test_sqlite_season_migration():
+    """Statistics stored before seasons existed become the first season"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        with sqlite3.connect(os.path.join(data_dir, 'user_stats.db')) as db:
+            db.execute(
+                'CREATE TABLE user_stats (user_id TEXT PRIMARY KEY, total_challenges INTEGER DEFAULT 0, '
+                'correct_answers INTEGER DEFAULT 0)'
+            )
+            db.execute("INSERT INTO user_stats VALUES ('user_1', 5, 3)")
+
+        async def check():
+            storage = create_stats_storage('sqlite', data_dir)
+            await storage.open()
+            assert storage.season == 1
+            assert await storage.load_user('user_1') == StatsRow(5, 3, '')
+            assert (await storage.get_leaderboard('user_1'))['user_rank'][0] == 1
+            await storage.close()
+
+        asyncio.run(check())
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_event_log_old_frames():
+    """Frames written before the answer metadata existed still decode"""
+    user_id, username = b'user_1', b'alice'
+    payload = struct.pack('<BdBHH', 1, 1.0, 1, len(user_id), len(username)) + user_id + username
+    frame = struct.pack('<II', len(payload), zlib.crc32(payload)) + payload
+    events, offset = decode_events(frame)
+    assert offset == len(frame)
+    assert events[0][1] == AnswerEvent('user_1', True, 'alice', 1.0)
+
+
+def test_event_log_recovery():
+    """Snapshots are loaded, the log tail is replayed and a torn record is dropped"""
+    data_dir = tempfile.mkdtemp()
+
+    async def write():
+        storage = EventLogStatsStorage(data_dir, commit_interval=0, snapshot_every=3)
+        for _ in range(5):
+            await _record(storage, 'user_1', True, 'alice')
+        # Simulate a crash: no close(), so the last events are only in the log
+        storage._log_file.close()
+
+    try:
+        asyncio.run(write())
+        log_files = sorted(name for name in os.listdir(data_dir) if name.endswith('.log'))
+        assert os.path.exists(os.path.join(data_dir, 'stats_snapshot.json'))
+        assert len(log_files) == 1
+
+        # Append half of a record to simulate a crash in the middle of a write
+        with open(os.path.join(data_dir, log_files[0]), 'ab') as file:
+            file.write(b'\x10\x00\x00')
+
+        storage = EventLogStatsStorage(data_dir)
+        assert asyncio.run(storage.load_user('user_1')) == StatsRow(5, 5, 'alice')
+        asyncio.run(storage.close())
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_event_log_failed_write():
+    """Answers and resets whose log write fails leave the statistics unchanged"""
+    data_dir = tempfile.mkdtemp()
+
+    def fail(_frames):
+        raise OSError('disk full')
+
+    async def check():
+        storage = EventLogStatsStorage(data_dir, commit_interval=0)
+        await _record(storage, 'user_1', True, 'alice')
+        storage._write_frames = fail
+        for write in (
+            storage.record_answer(AnswerEvent('user_1', True, 'alice')),
+            storage.record_answers([AnswerEvent('user_1', True), AnswerEvent('user_2', False)]),
+            storage.reset(),
+        ):
+            try:
+                await write
+            except OSError:
+                pass
+            else:
+                raise AssertionError('the failed write was not reported')
+        assert storage.season == 1
+        assert await storage.load_user('user_1') == StatsRow(1, 1, 'alice')
+        assert await storage.load_user('user_2') is None
+        del storage._write_frames
+        await storage.close()
+
+    try:
+        asyncio.run(check())
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running statistics storage tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_backends()
+        test_leaderboard_pagination()
+        test_answer_rollups()
+        test_seasons()
+        test_sqlite_season_migration()
+        test_event_log_old_frames()
+        test_event_log_recovery()
+        test_event_log_failed_write()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Statistics storage tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
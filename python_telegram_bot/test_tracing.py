@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-update tracing of the Optical Illusion Telegram Bot
+"""
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aiogram.methods import SendMessage
+from aiogram.types import Update, User
+
+from telegram_bot import tracing
+from telegram_bot.trace_report import build_traces, format_report, load_spans, stage_breakdown, trace_files
+
+
+class Service:
+    """Stand-in for the traced services"""
+
+    @tracing.traced()
+    async def generate_prompt(self):
+        await asyncio.sleep(0.02)
+        tracing.set_attributes(model='test')
+        return 'prompt'
+
+    @tracing.traced()
+    async def query(self, fail=False):
+        await asyncio.sleep(0.001)
+        if fail:
+            raise ValueError('no rows')
+        return 1
+
+
+async def _handle_update(update_id, service):
+    async def handler(event, data):
+        await service.generate_prompt()
+        # Spans of concurrent tasks started by the handler belong to the same trace
+        await asyncio.gather(service.query(), service.query())
+        try:
+            await service.query(fail=True)
+        except ValueError:
+            pass
+
+        async def make_request(bot, method):
+            await asyncio.sleep(0.005)
+            return 'ok'
+
+        return await tracing.TracingRequestMiddleware()(make_request, None, SendMessage(chat_id=42, text='hi'))
+
+    message = {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': 'private'}, 'text': '/illusion'}
+    update = Update.model_validate({'update_id': update_id, 'message': message})
+    user = User(id=7, is_bot=False, first_name='Тест')
+    return await tracing.TracingMiddleware()(handler, update, {'event_from_user': user})
+
+
+async def _check_tracing(path):
+    service = Service()
+    # Nothing is measured while tracing is off
+    with tracing.span('ignored') as span:
+        assert span is None
+    assert await service.query() == 1
+
+    tracer = tracing.Tracer(path)
+    tracer.start()
+    try:
+        results = await asyncio.gather(*(_handle_update(update_id, service) for update_id in range(5)))
+        assert results == ['ok'] * 5
+        with tracing.span('background') as span:
+            assert tracing.current_trace_id() == span.trace_id
+    finally:
+        tracer.stop()
+    assert tracing.current_trace_id() is None
+    assert tracer.exported == 5 * 6 + 1
+
+    traces = build_traces(load_spans(trace_files(path)))
+    assert len(traces) == 6
+    for trace in (trace for trace in traces if trace.root.name == 'update'):
+        assert [child.name for child in trace.root.children] == [
+            'Service.generate_prompt',
+            'Service.query',
+            'Service.query',
+            'Service.query',
+            'bot_api.SendMessage',
+        ]
+        assert trace.root.children[0].attributes == {'model': 'test'}
+        assert trace.root.children[3].error == 'ValueError'
+        assert trace.root.children[4].attributes == {'chat_id': 42}
+        assert trace.ms >= 25
+        assert trace.root.attributes == {
+            'update_id': trace.root.attributes['update_id'],
+            'type': 'message',
+            'user_id': 7,
+        }
+
+    stages = {stage.name: stage for stage in stage_breakdown(traces)}
+    assert stages['Service.query'].count == 15
+    assert stages['Service.query'].errors == 5
+    assert stages['update'].self_ms < stages['update'].total_ms
+
+    report = format_report(traces, top=2, stage='bot_api.SendMessage')
+    assert 'Slowest 2 of 5 traces' in report
+    assert 'Service.generate_prompt' in report
+
+
+def test_tracing():
+    """Spans of an update share a trace, are written to the trace file, and are reported per stage"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        asyncio.run(_check_tracing(os.path.join(data_dir, 'traces.jsonl')))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_trace_rotation():
+    """The trace file is rotated, and the report reads the rotated files too"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(data_dir, 'traces.jsonl')
+        tracer = tracing.Tracer(path, max_bytes=2000, backups=50)
+        tracer.start()
+        try:
+            for i in range(100):
+                with tracing.span('update', update_id=i):
+                    with tracing.span('query'):
+                        pass
+        finally:
+            tracer.stop()
+        files = trace_files(path)
+        assert len(files) > 2 and files[-1] == path
+        assert len(build_traces(load_spans(files))) == 100
+
+        # Command line report
+        result = subprocess.run(
+            [sys.executable, os.path.join(os.path.dirname(__file__), 'src', 'trace_report.py'), '--file', path],
+            capture_output=True,
+            check=True,
+        )
+        assert 'Slowest 10 of 100 traces' in result.stdout.decode()
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    """Main test function"""
+    print('Running tracing tests for Optical Illusion Telegram Bot...')
+
+    try:
+        test_tracing()
+        test_trace_rotation()
+    except Exception as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+    print('Tracing tests passed!')
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()